@@ -1,66 +1,176 @@
-from flask import Flask, render_template, request, jsonify
+from flask import (Flask, Response, abort, before_render_template, g, render_template, request,
+                   jsonify, template_rendered, url_for)
 # Updated for production deployment
-import xml.etree.ElementTree as ET
+import hashlib
+import ipaddress
 import math
 import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from boat_polars import PolarStore, leg_speeds, leg_times
+from course_search import CourseSearch
+from geodesy import GEODESY_MODES, calculate_bearing, calculate_distance  # noqa: F401
+from http_cache import LAZY_BROTLI_QUALITY, EncodedPayload, LRUCache, held_not_modified
+from metrics import MetricsRegistry
+from profiling import RequestProfiler
+from snapshot import load_marks
+from tides import TIDE_FILE, TideModel
+from wind import BEAT, BEAT_ANGLE, POINTS_OF_SAIL, REACH, RUN, RUN_ANGLE, true_wind_angles, wind_sweep
+# load_gpx_marks and the zone helpers are re-exported for existing callers
+from marks import (  # noqa: F401
+    GPX_FILE,
+    MarkRegistry,
+    get_available_zones,
+    get_marks_by_zone,
+    load_gpx_marks,
+)
 
 app = Flask(__name__)
 
-def load_gpx_marks():
-    """Load marks from the GPX file"""
-    tree = ET.parse('2025scra.gpx')
-    root = tree.getroot()
-    
-    # Define the namespace
-    ns = {'gpx': 'http://www.topografix.com/GPX/1/1'}
-    
-    marks = []
-    for wpt in root.findall('.//gpx:wpt', ns):
-        lat_str = wpt.get('lat')
-        lon_str = wpt.get('lon')
-        
-        if lat_str is None or lon_str is None:
-            continue
-            
-        lat = float(lat_str)
-        lon = float(lon_str)
-        
-        name_elem = wpt.find('gpx:name', ns)
-        desc_elem = wpt.find('gpx:desc', ns)
-        sym_elem = wpt.find('gpx:sym', ns)
-        
-        name = name_elem.text.strip() if name_elem is not None and name_elem.text is not None else ''
-        desc = desc_elem.text.strip() if desc_elem is not None and desc_elem.text is not None else ''
-        symbol = sym_elem.text.strip() if sym_elem is not None and sym_elem.text is not None else ''
-        
-        marks.append({
-            'name': name,
-            'description': desc,
-            'symbol': symbol,
-            'lat': lat,
-            'lon': lon
-        })
-    
-    return marks
+# Opt-in request profiling (PROFILE_SAMPLE_RATE / PROFILE_SECRET); registers
+# no hooks at all unless enabled. See profiling.py.
+PROFILER = RequestProfiler.from_env()
+PROFILER.install(app)
+
+# Client networks allowed to read /metrics (comma-separated). The default is
+# the loopback and private ranges nginx allows, so Gunicorn's directly
+# published port doesn't hand metrics to the internet.
+app.config['METRICS_ALLOW'] = [
+    ipaddress.ip_network(network.strip())
+    for network in os.environ.get(
+        'METRICS_ALLOW', '127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16').split(',')
+    if network.strip()
+]
+
+# Upper bound on pairs per /lookup/calculate/batch request, so one request
+# can't hold a sync worker for long
+app.config['LOOKUP_BATCH_MAX_PAIRS'] = int(os.environ.get('LOOKUP_BATCH_MAX_PAIRS', '200'))
+
+# Upper bound on k for /marks/nearest
+app.config['NEAREST_MAX_K'] = int(os.environ.get('NEAREST_MAX_K', '50'))
+
+# Most marks /marks/bbox returns for one viewport; zoomed-out maps of big
+# datasets get the first ones and a truncated flag
+app.config['BBOX_MAX_MARKS'] = int(os.environ.get('BBOX_MAX_MARKS', '2000'))
+
+# Seconds browsers and proxies may reuse /marks before revalidating; after
+# that a matching ETag gets a 304 until the mark dataset changes
+app.config['MARKS_MAX_AGE'] = int(os.environ.get('MARKS_MAX_AGE', '300'))
+
+# Ready-to-send /marks payloads (JSON bytes plus gzip/brotli variants) per
+# canonical zone set, filled lazily and emptied when the dataset changes. The
+# default holds every zone set of an eight-zone dataset (255) plus all marks.
+MARKS_PAYLOADS = LRUCache(maxsize=int(os.environ.get('MARKS_CACHE_SIZE', '256')))
+
+# Rendered HTML pages, keyed on the template and everything it is rendered
+# from (dataset version, analytics settings). Pages always revalidate.
+app.config['PAGE_MAX_AGE'] = int(os.environ.get('PAGE_MAX_AGE', '0'))
+HTML_PAGES = LRUCache(maxsize=16)
+
+# Serialised /course responses, keyed on the dataset version, geodesy mode and
+# the course's (mark name, rounding) sequence: a course broadcast to a fleet
+# is computed once
+COURSE_RESPONSES = LRUCache(maxsize=int(os.environ.get('COURSE_CACHE_SIZE', '256')))
+
+# Uploaded boat polars, stored as text in POLAR_DIR (shared by every worker)
+# and parsed into interpolation grids once per worker. At most
+# POLAR_MAX_STORED tables (64 KB each at most) are kept on disk.
+POLARS = PolarStore(os.environ.get('POLAR_DIR', '/tmp/solent-polars'),
+                    maxsize=int(os.environ.get('POLAR_CACHE_SIZE', '64')),
+                    max_stored=int(os.environ.get('POLAR_MAX_STORED', '1000')))
+
+def load_tides(path):
+    """The TideModel in ``path``, or None (logged) if there is none or it won't load"""
+    if path is None:
+        app.logger.info('TIDE_FILE is not set; the /course/tide endpoints are disabled')
+        return None
+    try:
+        tides = TideModel.from_csv(path)
+    except (OSError, ValueError) as e:
+        app.logger.error('Tidal diamonds not loaded from %s, /course/tide endpoints disabled: %s', path, e)
+        return None
+    if tides.synthetic:
+        app.logger.warning('%s is synthetic tidal data, not for navigation', path)
+    return tides
 
-def get_available_zones(marks):
-    """Get list of available zones (first character of mark names)"""
-    zones = set()
-    for mark in marks:
-        if mark['name']:
-            zones.add(mark['name'][0])
-    return sorted(list(zones))
+# Tidal diamonds for /course/tide, by hour relative to HW Portsmouth. Opt-in:
+# without a loadable TIDE_FILE the tide endpoints answer 503. Responses from
+# synthetic data (such as the bundled example file) say so.
+TIDES = load_tides(TIDE_FILE)
+TIDES_ERROR = 'Tidal stream data is not available (set TIDE_FILE)'
 
-def get_marks_by_zone(marks, zones):
-    """Filter marks by zone (first character of mark name)"""
+# Wall-clock budget of one /course/search request, and its largest courses
+app.config['COURSE_SEARCH_BUDGET_SECONDS'] = float(os.environ.get('COURSE_SEARCH_BUDGET_SECONDS', '0.25'))
+app.config['COURSE_SEARCH_MAX_LEGS'] = int(os.environ.get('COURSE_SEARCH_MAX_LEGS', '10'))
+app.config['COURSE_SEARCH_MAX_RESULTS'] = int(os.environ.get('COURSE_SEARCH_MAX_RESULTS', '20'))
+
+# Most start times one /course/tide/sweep request evaluates
+app.config['TIDE_SWEEP_MAX_STARTS'] = int(os.environ.get('TIDE_SWEEP_MAX_STARTS', '1000'))
+
+# Longest interval between swept start times: a day
+SWEEP_MAX_INTERVAL_MINUTES = 24 * 60
+
+# Upper bound on boats x wind directions x wind speeds x legs per /course/times
+# request
+app.config['COURSE_TIMES_MAX_CELLS'] = int(os.environ.get('COURSE_TIMES_MAX_CELLS', '500000'))
+
+# Loaded (from the compiled snapshot, rebuilt if the GPX file changed) and
+# indexed once at import. With preload_app = True Gunicorn does this in the
+# master before forking, so every worker shares the same pages (see the
+# pre_fork hook in gunicorn.conf.py, which freezes them out of GC tracking).
+_load_started = time.perf_counter()
+with PROFILER.profile_block('dataset-load'):
+    REGISTRY = MarkRegistry(load_marks(GPX_FILE), last_modified=os.path.getmtime(GPX_FILE))
+DATASET_LOAD_SECONDS = time.perf_counter() - _load_started
+
+def requested_geodesy(value):
+    """Geodesy mode a request asked for: the deployment default if absent, None if unknown"""
+    if value is None:
+        return REGISTRY.geodesy_mode
+    return value if isinstance(value, str) and value in GEODESY_MODES else None
+
+GEODESY_ERROR = f"geodesy must be one of {', '.join(GEODESY_MODES)}"
+
+def canonical_zones(zones):
+    """Cache key for a zone selection: None for all marks, else the sorted known zones
+
+    Unknown zones match no marks, so they're dropped rather than giving the
+    same payload a different key.
+    """
     if not zones:
-        return []
+        return None
+    return tuple(zone for zone in REGISTRY.zones if zone in set(zones))
+
+def marks_etag(zone_key):
+    """Base ETag of the /marks payload for a canonical zone key"""
+    if zone_key is None:
+        return f'{REGISTRY.version}-all'
+    return f'{REGISTRY.version}-{hashlib.sha256(",".join(zone_key).encode("utf-8")).hexdigest()[:12]}'
+
+def marks_payload(zone_key):
+    """Build the cached /marks payload for a canonical zone key"""
+    if zone_key is None:
+        filtered_marks = list(REGISTRY.marks)  # Return all marks when no zones specified
+    else:
+        filtered_marks = REGISTRY.marks_in_zones(zone_key)
     
-    filtered_marks = []
-    for mark in marks:
-        if mark['name'] and mark['name'][0] in zones:
-            filtered_marks.append(mark)
-    return filtered_marks
+    body = app.json.response({
+        'marks': filtered_marks,
+        'zones': REGISTRY.zones
+    }).get_data()
+    return EncodedPayload(body, 'application/json', marks_etag(zone_key), REGISTRY.last_modified,
+                          brotli_quality=LAZY_BROTLI_QUALITY)
+
+def cached_marks_payload(zone_key):
+    """The /marks payload for a canonical zone key, from cache when possible"""
+    MARKS_PAYLOADS.check_version(REGISTRY.version)
+    payload = MARKS_PAYLOADS.get(zone_key)
+    if payload is None:
+        payload = MARKS_PAYLOADS.put(zone_key, marks_payload(zone_key))
+    return payload
 
 @app.route('/marks')
 def get_marks():
@@ -68,19 +178,111 @@ def get_marks():
     zones_param = request.args.get('zones', '')
     zones = [z.strip() for z in zones_param.split(',') if z.strip()]
     
-    all_marks = load_gpx_marks()
-    available_zones = get_available_zones(all_marks)
+    # Validators depend only on the dataset version and zone set, so a
+    # revalidation is answered without building (or finding) the payload
+    zone_key = canonical_zones(zones)
+    response = held_not_modified(request, marks_etag(zone_key), REGISTRY.last_modified,
+                                 app.config['MARKS_MAX_AGE'])
+    if response is not None:
+        return response
+
+    # Payloads are serialised and compressed once per dataset version and
+    # zone set; a hit costs a dict lookup
+    payload = cached_marks_payload(zone_key)
+    return payload.response(request, app.config['MARKS_MAX_AGE'])
+
+@app.route('/marks/nearest')
+def nearest_marks():
+    """The k marks closest to a position, with the bearing and distance to each"""
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        k = int(request.args.get('k', '5'))
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Numeric lat and lon are required, and k must be an integer'}), 400
     
-    if zones:
-        filtered_marks = get_marks_by_zone(all_marks, zones)
-    else:
-        filtered_marks = all_marks  # Return all marks when no zones specified
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({'error': 'lat must be within -90..90 and lon within -180..180'}), 400
+    max_k = app.config['NEAREST_MAX_K']
+    if not 1 <= k <= max_k:
+        return jsonify({'error': f'k must be between 1 and {max_k}'}), 400
+    mode = requested_geodesy(request.args.get('geodesy'))
+    if mode is None:
+        return jsonify({'error': GEODESY_ERROR}), 400
+    
+    marks = []
+    for mark, bearing, distance in REGISTRY.nearest(lat, lon, k, mode):
+        marks.append(dict(mark, bearing=bearing, distance=distance))
+    
+    return jsonify({'lat': lat, 'lon': lon, 'marks': marks})
+
+# Columns of each mark row in the compact /marks/bbox form
+BBOX_FIELDS = ('name', 'lat', 'lon', 'symbol', 'description')
+
+@app.route('/marks/bbox')
+def marks_in_bbox():
+    """Marks inside a map viewport, as compact rows
     
+    ``west`` greater than ``east`` means the box crosses the antimeridian.
+    """
+    try:
+        south, west, north, east = (float(request.args[name])
+                                    for name in ('south', 'west', 'north', 'east'))
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Numeric south, west, north and east are required'}), 400
+    
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        return jsonify({'error': 'Need -90 <= south <= north <= 90 and longitudes within -180..180'}), 400
+    
+    zones_param = request.args.get('zones', '')
+    zones = [z.strip() for z in zones_param.split(',') if z.strip()] or None
+    
+    marks = REGISTRY.marks_in_bbox(south, west, north, east, zones)
+    max_marks = app.config['BBOX_MAX_MARKS']
     return jsonify({
-        'marks': filtered_marks,
-        'zones': available_zones
+        'version': REGISTRY.version,
+        'fields': BBOX_FIELDS,
+        'marks': [[mark[field] for field in BBOX_FIELDS] for mark in marks[:max_marks]],
+        'truncated': len(marks) > max_marks,
     })
 
+@app.route('/static/marks.<version>.json')
+def marks_bundle(version):
+    """Content-addressed bundle of every mark, cacheable forever
+    
+    Pages reference it by dataset version and filter zones in the browser.
+    Only the current version exists, so a URL never changes meaning.
+    """
+    if version != REGISTRY.version:
+        abort(404)
+    payload = cached_marks_payload(None)
+    return payload.response(request, app.config['MARKS_MAX_AGE'], immutable=True)
+
+def render_page(template_name, **context):
+    """Render a page once per dataset version and context, then serve it from cache
+    
+    The context must hold everything the output depends on besides the
+    dataset. In debug mode pages are rendered fresh so template edits show.
+    """
+    dataset_context = {
+        'zones': REGISTRY.zones,
+        'marks_bundle_url': url_for('marks_bundle', version=REGISTRY.version),
+    }
+    if app.debug:
+        return render_template(template_name, **dataset_context, **context)
+    
+    key = (template_name, tuple(sorted(context.items())))
+    HTML_PAGES.check_version(REGISTRY.version)
+    payload = HTML_PAGES.get(key)
+    if payload is None:
+        body = render_template(template_name, **dataset_context, **context).encode('utf-8')
+        etag = f'{REGISTRY.version}-{hashlib.sha256(body).hexdigest()[:12]}'
+        template_mtime = os.path.getmtime(app.jinja_env.get_template(template_name).filename)
+        last_modified = max(REGISTRY.last_modified,
+                            datetime.fromtimestamp(int(template_mtime), tz=timezone.utc))
+        payload = HTML_PAGES.put(key, EncodedPayload(body, 'text/html', etag, last_modified))
+    return payload.response(request, app.config['PAGE_MAX_AGE'])
+
 @app.route('/')
 def index():
     """Redirect to lookup page (new homepage)"""
@@ -90,27 +292,21 @@ def index():
 @app.route('/course')
 def course_page():
     """Course calculator page (old homepage)"""
-    marks = load_gpx_marks()
-    zones = get_available_zones(marks)
-    return render_template('index.html', marks=marks, zones=zones)
+    return render_page('index.html')
 
 
 @app.route('/privacy')
 def privacy():
     """Privacy policy page"""
-    return render_template('privacy.html')
+    return render_page('privacy.html')
 
 @app.route('/lookup')
 def lookup():
     """Lookup page - simple bearing and distance calculator"""
-    marks = load_gpx_marks()
-    zones = get_available_zones(marks)
     umami_website_id = os.environ.get('UMAMI_WEBSITE_ID')
     umami_script_url = os.environ.get('UMAMI_SCRIPT_URL')
-    return render_template(
+    return render_page(
         'lookup.html',
-        marks=marks,
-        zones=zones,
         umami_website_id=umami_website_id,
         umami_script_url=umami_script_url,
     )
@@ -127,24 +323,64 @@ def lookup_calculate():
     if not from_mark_name or not to_mark_name:
         return jsonify({'error': 'Both from_mark and to_mark are required'}), 400
     
-    marks = load_gpx_marks()
-    
     # Find the selected marks
-    from_mark = next((m for m in marks if m['name'] == from_mark_name), None)
-    to_mark = next((m for m in marks if m['name'] == to_mark_name), None)
+    from_mark = REGISTRY.get(from_mark_name)
+    to_mark = REGISTRY.get(to_mark_name)
     
     if not from_mark or not to_mark:
         return jsonify({'error': 'One or both marks not found'}), 400
     
-    # Calculate bearing and distance
-    bearing = calculate_bearing(from_mark, to_mark)
-    distance = calculate_distance(from_mark, to_mark)
+    mode = requested_geodesy(data.get('geodesy'))
+    if mode is None:
+        return jsonify({'error': GEODESY_ERROR}), 400
+    
+    # Bearing and distance come precomputed from the registry
+    bearing, distance = REGISTRY.measure(from_mark_name, to_mark_name, mode)
     
     return jsonify({
         'bearing': bearing,
         'distance': distance
     })
 
+@app.route('/lookup/calculate/batch', methods=['POST'])
+def lookup_calculate_batch():
+    """Calculate bearing and distance for many mark pairs in one request"""
+    data = request.get_json(silent=True)
+    pairs = data.get('pairs') if isinstance(data, dict) else None
+    if not isinstance(pairs, list) or not pairs:
+        return jsonify({'error': 'A non-empty list of pairs is required'}), 400
+    
+    max_pairs = app.config['LOOKUP_BATCH_MAX_PAIRS']
+    if len(pairs) > max_pairs:
+        return jsonify({'error': f'At most {max_pairs} pairs are allowed per request'}), 413
+    
+    mode = requested_geodesy(data.get('geodesy'))
+    if mode is None:
+        return jsonify({'error': GEODESY_ERROR}), 400
+    
+    names = []
+    for item in pairs:
+        if isinstance(item, dict):
+            names.append((item.get('from_mark'), item.get('to_mark')))
+        else:
+            names.append((None, None))
+    
+    # Resolve every pair in a single pass over the registry
+    measurements = REGISTRY.measure_many(names, mode)
+    
+    results = []
+    for (from_mark_name, to_mark_name), measurement in zip(names, measurements):
+        result = {'from_mark': from_mark_name, 'to_mark': to_mark_name}
+        if not from_mark_name or not to_mark_name:
+            result['error'] = 'Both from_mark and to_mark are required'
+        elif measurement is None:
+            result['error'] = 'One or both marks not found'
+        else:
+            result['bearing'], result['distance'] = measurement
+        results.append(result)
+    
+    return jsonify({'results': results})
+
 @app.route('/calculate', methods=['POST'])
 def calculate():
     """Calculate bearing and distance between two marks"""
@@ -152,18 +388,19 @@ def calculate():
     mark1_name = data.get('mark1')
     mark2_name = data.get('mark2')
     
-    marks = load_gpx_marks()
-    
     # Find the selected marks
-    mark1 = next((m for m in marks if m['name'] == mark1_name), None)
-    mark2 = next((m for m in marks if m['name'] == mark2_name), None)
+    mark1 = REGISTRY.get(mark1_name)
+    mark2 = REGISTRY.get(mark2_name)
     
     if not mark1 or not mark2:
         return jsonify({'error': 'One or both marks not found'}), 400
     
-    # Calculate bearing and distance
-    bearing = calculate_bearing(mark1, mark2)
-    distance = calculate_distance(mark1, mark2)
+    mode = requested_geodesy(data.get('geodesy'))
+    if mode is None:
+        return jsonify({'error': GEODESY_ERROR}), 400
+    
+    # Bearing and distance come precomputed from the registry
+    bearing, distance = REGISTRY.measure(mark1_name, mark2_name, mode)
     
     return jsonify({
         'bearing': bearing,
@@ -172,40 +409,23 @@ def calculate():
         'mark2': mark2
     })
 
-@app.route('/course', methods=['POST'])
-def course():
-    """Calculate bearings and distances for a sequence of marks (race course)"""
-    data = request.get_json()
-    course_data = data.get('course', [])  # Changed from 'marks' to 'course' to include rounding info
-    if not course_data or not isinstance(course_data, list) or len(course_data) < 2:
-        return jsonify({'error': 'At least two marks must be provided'}), 400
-
-    marks = load_gpx_marks()
-    name_to_mark = {m['name']: m for m in marks}
+def build_legs(course_marks, registry=None, mode=None):
+    """Legs between consecutive course marks, each with its bearing and distance
+    
+    ``course_marks`` are mark dicts carrying a ``rounding``. Measurements come
+    from ``registry`` (the loaded dataset by default), in geodesy ``mode``
+    (the registry's default if None).
+    """
+    if registry is None:
+        registry = REGISTRY
+    
+    # Every leg measured in one call: one vectorised evaluation when the
+    # pair matrix doesn't cover ``mode``
+    measurements = registry.measure_many(
+        [(m1['name'], m2['name']) for m1, m2 in zip(course_marks, course_marks[1:])], mode)
     
-    try:
-        # Extract mark names and rounding directions
-        course_marks = []
-        for item in course_data:
-            if isinstance(item, dict):
-                mark_name = item.get('name')
-                rounding = item.get('rounding', 'S')  # Default to Starboard if not specified
-            else:
-                # Backward compatibility: if item is just a string, treat as mark name with default rounding
-                mark_name = item
-                rounding = 'S'
-            
-            if mark_name not in name_to_mark:
-                return jsonify({'error': f'Mark {mark_name} not found'}), 400
-            
-            mark = name_to_mark[mark_name].copy()
-            mark['rounding'] = rounding
-            course_marks.append(mark)
-    except Exception as e:
-        return jsonify({'error': f'Invalid course data: {str(e)}'}), 400
-
     legs = []
-    for i in range(len(course_marks) - 1):
+    for i, (bearing, distance) in enumerate(measurements):
         m1 = course_marks[i]
         m2 = course_marks[i+1]
         
@@ -229,50 +449,503 @@ def course():
                 'rounding': m2['rounding'],
                 'tag': to_tag
             },
-            'bearing': calculate_bearing(m1, m2),
-            'distance': calculate_distance(m1, m2)
+            'bearing': bearing,
+            'distance': distance
         })
-    return jsonify({'legs': legs})
+    return legs
+
+def course_signature(course_data):
+    """(mark name, rounding) pairs of a request's course list"""
+    signature = []
+    for item in course_data:
+        if isinstance(item, dict):
+            mark_name = item.get('name')
+            rounding = item.get('rounding', 'S')  # Default to Starboard if not specified
+        else:
+            # Backward compatibility: if item is just a string, treat as mark name with default rounding
+            mark_name = item
+            rounding = 'S'
+        signature.append((mark_name, rounding))
+    return signature
+
+def resolve_course(signature):
+    """Return (course_marks, error): mark dicts carrying their rounding, or an error message"""
+    try:
+        course_marks = []
+        for mark_name, rounding in signature:
+            if mark_name not in REGISTRY:
+                return None, f'Mark {mark_name} not found'
+            
+            mark = REGISTRY.get(mark_name).copy()
+            mark['rounding'] = rounding
+            course_marks.append(mark)
+    except Exception as e:
+        return None, f'Invalid course data: {str(e)}'
+    return course_marks, None
 
-def calculate_bearing(mark1, mark2):
-    """Calculate compass bearing from mark1 to mark2 in degrees"""
-    lat1 = math.radians(mark1['lat'])
-    lon1 = math.radians(mark1['lon'])
-    lat2 = math.radians(mark2['lat'])
-    lon2 = math.radians(mark2['lon'])
+@app.route('/course', methods=['POST'])
+def course():
+    """Calculate bearings and distances for a sequence of marks (race course)"""
+    data = request.get_json()
+    course_data = data.get('course', [])  # Changed from 'marks' to 'course' to include rounding info
+    if not course_data or not isinstance(course_data, list) or len(course_data) < 2:
+        return jsonify({'error': 'At least two marks must be provided'}), 400
     
-    d_lon = lon2 - lon1
+    mode = requested_geodesy(data.get('geodesy'))
+    if mode is None:
+        return jsonify({'error': GEODESY_ERROR}), 400
+
+    # Extract mark names and rounding directions
+    signature = course_signature(course_data)
     
-    y = math.sin(d_lon) * math.cos(lat2)
-    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(d_lon)
+    key = None
+    if all(isinstance(value, str) for pair in signature for value in pair):
+        # Only plain strings: other JSON values could be unhashable, or
+        # compare equal while serialising differently (1, 1.0, true)
+        key = (REGISTRY.version, mode, tuple(signature))
     
-    bearing = math.degrees(math.atan2(y, x))
+    COURSE_RESPONSES.check_version(REGISTRY.version)
+    body = COURSE_RESPONSES.get(key) if key is not None else None
+    if body is None:
+        course_marks, error = resolve_course(signature)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        body = app.json.response({'legs': build_legs(course_marks, mode=mode)}).get_data()
+        if key is not None:
+            COURSE_RESPONSES.put(key, body)
+    
+    return app.response_class(body, mimetype='application/json')
+
+@app.route('/course/wind-sweep', methods=['POST'])
+def course_wind_sweep():
+    """True wind angle and point of sail of every leg, for every wind direction 0-359
     
-    # Convert to compass bearing (0-360 degrees)
-    bearing = (bearing + 360) % 360
+    Takes the same body as /course, plus optional ``beat_angle`` and
+    ``run_angle`` (true wind angles, in degrees, bounding beats and runs).
+    """
+    data = request.get_json()
+    course_data = data.get('course', [])
+    if not course_data or not isinstance(course_data, list) or len(course_data) < 2:
+        return jsonify({'error': 'At least two marks must be provided'}), 400
     
-    return round(bearing)
+    mode = requested_geodesy(data.get('geodesy'))
+    if mode is None:
+        return jsonify({'error': GEODESY_ERROR}), 400
+    
+    beat_angle = data.get('beat_angle', BEAT_ANGLE)
+    run_angle = data.get('run_angle', RUN_ANGLE)
+    if not all(isinstance(angle, (int, float)) and not isinstance(angle, bool)
+               for angle in (beat_angle, run_angle)) or not 0 <= beat_angle < run_angle <= 180:
+        return jsonify({'error': 'Need numeric 0 <= beat_angle < run_angle <= 180'}), 400
+    
+    course_marks, error = resolve_course(course_signature(course_data))
+    if error:
+        return jsonify({'error': error}), 400
+    
+    legs = build_legs(course_marks, mode=mode)
+    angles, codes, totals = wind_sweep([leg['bearing'] for leg in legs],
+                                       [leg['distance'] for leg in legs],
+                                       beat_angle=beat_angle, run_angle=run_angle)
+    return jsonify({
+        'legs': legs,
+        'wind_directions': list(range(360)),
+        # One row per wind direction, one column per leg
+        'true_wind_angles': angles.astype(int).tolist(),
+        'points_of_sail': [[POINTS_OF_SAIL[code] for code in row] for row in codes.tolist()],
+        # Distance sailed upwind (beating), reaching and downwind (running), per direction
+        'upwind': totals[:, BEAT].tolist(),
+        'reach': totals[:, REACH].tolist(),
+        'downwind': totals[:, RUN].tolist(),
+    })
 
-def calculate_distance(mark1, mark2):
-    """Calculate distance between two marks in nautical miles"""
-    lat1 = math.radians(mark1['lat'])
-    lon1 = math.radians(mark1['lon'])
-    lat2 = math.radians(mark2['lat'])
-    lon2 = math.radians(mark2['lon'])
+@app.route('/polars', methods=['POST'])
+def upload_polar():
+    """Store a boat polar table sent as the request body, returning its id"""
+    try:
+        polar_id, polar = POLARS.add(request.get_data(as_text=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(polar.summary(), id=polar_id)), 201
+
+@app.route('/polars/<polar_id>')
+def get_polar(polar_id):
+    """Summary of a stored polar"""
+    try:
+        polar = POLARS.get(polar_id)
+    except KeyError:
+        return jsonify({'error': f'Polar {polar_id} not found'}), 404
+    return jsonify(dict(polar.summary(), id=polar_id))
+
+def number_list(value):
+    """``value`` as a list of finite floats, or None if it isn't a non-empty list of numbers"""
+    if not isinstance(value, list) or not value:
+        return None
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in value):
+        return None
+    return [float(v) for v in value]
+
+def whole_seconds(times):
+    """Nested lists of whole seconds, with None for legs that can't be sailed"""
+    finite = np.isfinite(times)
+    seconds = np.rint(np.where(finite, times, 0)).astype(np.int64).astype(object)
+    seconds[~finite] = None
+    return seconds.tolist()
+
+@app.route('/course/times', methods=['POST'])
+def course_times():
+    """Estimated elapsed time per leg and for the course, per boat polar and wind
+    
+    Takes the same body as /course plus ``polars`` (polar ids),
+    ``wind_speeds`` (knots) and optional ``wind_directions`` (degrees the wind
+    blows from; every whole degree 0-359 by default). Times are evaluated for
+    every direction and speed.
+    """
+    data = request.get_json()
+    course_data = data.get('course', [])
+    if not course_data or not isinstance(course_data, list) or len(course_data) < 2:
+        return jsonify({'error': 'At least two marks must be provided'}), 400
+    
+    mode = requested_geodesy(data.get('geodesy'))
+    if mode is None:
+        return jsonify({'error': GEODESY_ERROR}), 400
     
-    # Haversine formula
-    d_lat = lat2 - lat1
-    d_lon = lon2 - lon1
+    polar_ids = data.get('polars')
+    if not isinstance(polar_ids, list) or not polar_ids:
+        return jsonify({'error': 'polars must be a non-empty list of polar ids'}), 400
+    polars = []
+    for polar_id in polar_ids:
+        try:
+            polars.append(POLARS.get(polar_id))
+        except (KeyError, TypeError):
+            return jsonify({'error': f'Polar {polar_id} not found'}), 400
+    
+    wind_speeds = number_list(data.get('wind_speeds'))
+    if wind_speeds is None or min(wind_speeds) < 0:
+        return jsonify({'error': 'wind_speeds must be a non-empty list of non-negative numbers'}), 400
+    wind_directions = data.get('wind_directions')
+    wind_directions = list(range(360)) if wind_directions is None else number_list(wind_directions)
+    if wind_directions is None:
+        return jsonify({'error': 'wind_directions must be a non-empty list of numbers'}), 400
+    
+    cells = len(polars) * len(wind_directions) * len(wind_speeds) * (len(course_data) - 1)
+    max_cells = app.config['COURSE_TIMES_MAX_CELLS']
+    if cells > max_cells:
+        return jsonify({'error': f'At most {max_cells} boat x direction x speed x leg times per request'}), 400
+    
+    course_marks, error = resolve_course(course_signature(course_data))
+    if error:
+        return jsonify({'error': error}), 400
+    
+    legs = build_legs(course_marks, mode=mode)
+    angles = true_wind_angles([leg['bearing'] for leg in legs], wind_directions)
+    times = leg_times(polars, angles, wind_speeds, [leg['distance'] for leg in legs])
+    totals = times.sum(axis=-1)
+    return jsonify({
+        'legs': legs,
+        'wind_directions': wind_directions,
+        'wind_speeds': wind_speeds,
+        # Per boat, indexed [direction][speed][leg] and [direction][speed]
+        'boats': [{'polar': polar_id, 'leg_seconds': whole_seconds(times[k]),
+                   'total_seconds': whole_seconds(totals[k])}
+                  for k, polar_id in enumerate(polar_ids)],
+    })
+
+def parse_time(value):
+    """An ISO 8601 date and time, or None if ``value`` isn't one"""
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+def tidal_course(data):
+    """Return (legs, speeds, plan, error) for a /course/tide style request body
+    
+    ``legs`` are build_legs() legs, ``speeds`` the boat's speed through the
+    water on each and ``plan`` the course's TidalCourse, or ``error`` is an
+    error message.
+    """
+    course_data = data.get('course', [])
+    if not course_data or not isinstance(course_data, list) or len(course_data) < 2:
+        return None, None, None, 'At least two marks must be provided'
     
-    a = math.sin(d_lat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(d_lon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
+    mode = requested_geodesy(data.get('geodesy'))
+    if mode is None:
+        return None, None, None, GEODESY_ERROR
     
-    # Earth's radius in nautical miles
-    r = 3440.065  # nautical miles
+    springs = number_list([data.get('springs', 0.5)])
+    if springs is None or not 0 <= springs[0] <= 1:
+        return None, None, None, 'springs must be a number from 0 (neaps) to 1 (springs)'
     
-    distance = r * c
+    course_marks, error = resolve_course(course_signature(course_data))
+    if error:
+        return None, None, None, error
+    legs = build_legs(course_marks, mode=mode)
+    bearings = [leg['bearing'] for leg in legs]
     
-    return round(distance, 2)
+    if 'polar' in data:
+        try:
+            polar = POLARS.get(data['polar'])
+        except (KeyError, TypeError):
+            return None, None, None, f"Polar {data['polar']} not found"
+        wind = number_list([data.get('wind_direction'), data.get('wind_speed')])
+        if wind is None or wind[1] < 0:
+            return None, None, None, 'A polar needs a numeric wind_direction and non-negative wind_speed'
+        speeds = leg_speeds(polar, true_wind_angles(bearings, [wind[0]])[0], wind[1])
+    else:
+        boat_speed = number_list([data.get('boat_speed')])
+        if boat_speed is None or boat_speed[0] <= 0:
+            return None, None, None, 'Give a positive boat_speed, or a polar with the wind'
+        speeds = np.full(len(legs), boat_speed[0])
+    
+    plan = TIDES.plan([mark['lat'] for mark in course_marks], [mark['lon'] for mark in course_marks],
+                      bearings, [leg['distance'] for leg in legs], springs[0])
+    return legs, speeds, plan, None
+
+TIME_ERROR = 'start and high_water must be ISO 8601 times, both with a UTC offset or both without'
+
+@app.route('/course/tide', methods=['POST'])
+def course_tide():
+    """Tide-adjusted time and speed made good per leg, from a start time
+    
+    Takes the same body as /course plus ``start`` and ``high_water`` (ISO
+    8601 times of the start and of a HW Portsmouth near it), optional
+    ``springs`` (0 at neaps to 1 at springs, default 0.5) and the boat's
+    speed through the water: either ``boat_speed`` in knots, or a
+    ``polar`` id with ``wind_direction`` and ``wind_speed``.
+    """
+    if TIDES is None:
+        return jsonify({'error': TIDES_ERROR}), 503
+    data = request.get_json()
+    start = parse_time(data.get('start'))
+    high_water = parse_time(data.get('high_water'))
+    if start is None or high_water is None or (start.tzinfo is None) != (high_water.tzinfo is None):
+        return jsonify({'error': TIME_ERROR}), 400
+    
+    legs, speeds, plan, error = tidal_course(data)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    start_hours = (start - high_water).total_seconds() / 3600
+    times = plan.leg_times(speeds, [start_hours])[0]
+    
+    elapsed = 0.0
+    for leg, seconds in zip(legs, times.tolist()):
+        leg['start_seconds'] = round(elapsed) if math.isfinite(elapsed) else None
+        leg['seconds'] = round(seconds) if math.isfinite(seconds) else None
+        made_good = leg['distance'] / seconds * 3600 if 0 < seconds < math.inf else None
+        leg['speed_made_good'] = round(made_good, 2) if made_good is not None else None
+        elapsed += seconds
+    
+    finish = None
+    if math.isfinite(elapsed):
+        try:
+            finish = (start + timedelta(seconds=round(elapsed))).isoformat()
+        except OverflowError:  # After year 9999
+            pass
+    return jsonify({
+        'legs': legs,
+        'start': start.isoformat(),
+        'high_water': high_water.isoformat(),
+        'springs': data.get('springs', 0.5),
+        'synthetic': TIDES.synthetic,
+        'total_seconds': round(elapsed) if math.isfinite(elapsed) else None,
+        'finish': finish,
+    })
+
+SWEEP_RANGE_ERROR = 'Start times must fall within the years 1 to 9999'
+
+@app.route('/course/tide/sweep', methods=['POST'])
+def course_tide_sweep():
+    """Total time and worst tide-affected leg for every start time in a window
+    
+    Takes the /course/tide body, with ``first_start`` and ``last_start``
+    (ISO 8601; six hours either side of ``high_water`` by default) and
+    ``interval_minutes`` (default 5) in place of ``start``. The course is
+    planned once and every start time is evaluated in one vectorised pass.
+    """
+    if TIDES is None:
+        return jsonify({'error': TIDES_ERROR}), 503
+    data = request.get_json()
+    high_water = parse_time(data.get('high_water'))
+    if high_water is None:
+        return jsonify({'error': 'high_water must be an ISO 8601 time'}), 400
+    first = data.get('first_start')
+    last = data.get('last_start')
+    try:
+        first = high_water - timedelta(hours=6) if first is None else parse_time(first)
+        last = high_water + timedelta(hours=6) if last is None else parse_time(last)
+    except OverflowError:
+        return jsonify({'error': SWEEP_RANGE_ERROR}), 400
+    if (first is None or last is None
+            or not (first.tzinfo is None) == (last.tzinfo is None) == (high_water.tzinfo is None)):
+        return jsonify({'error': 'first_start and last_start must be ISO 8601 times, '
+                                 'both with a UTC offset if high_water has one'}), 400
+    if last < first:
+        return jsonify({'error': 'last_start must not be before first_start'}), 400
+    
+    interval = number_list([data.get('interval_minutes', 5)])
+    if interval is None or not 1 / 60 <= interval[0] <= SWEEP_MAX_INTERVAL_MINUTES:
+        return jsonify({'error': 'interval_minutes must be a number from 1/60 (one second) '
+                                 f'to {SWEEP_MAX_INTERVAL_MINUTES}'}), 400
+    # Counted in float seconds, before any timedelta arithmetic
+    count = int((last - first).total_seconds() // (interval[0] * 60)) + 1
+    max_starts = app.config['TIDE_SWEEP_MAX_STARTS']
+    if count > max_starts:
+        return jsonify({'error': f'At most {max_starts} start times per sweep'}), 400
+    interval = timedelta(minutes=interval[0])
+    try:
+        starts = [(first + k * interval).isoformat() for k in range(count)]
+    except OverflowError:
+        return jsonify({'error': SWEEP_RANGE_ERROR}), 400
+    
+    legs, speeds, plan, error = tidal_course(data)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    first_hours = (first - high_water).total_seconds() / 3600
+    start_hours = first_hours + np.arange(count) * (interval.total_seconds() / 3600)
+    times = plan.leg_times(speeds, start_hours)
+    totals = times.sum(axis=1)
+    # Seconds each leg loses to the tide against sailing it in still water
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delays = times - np.array([leg['distance'] for leg in legs]) / speeds * 3600
+    worst = np.argmax(delays, axis=1)
+    
+    finite = np.isfinite(totals)
+    best = int(np.argmin(np.where(finite, totals, np.inf))) if finite.any() else None
+    return jsonify({
+        'legs': legs,
+        'high_water': high_water.isoformat(),
+        'synthetic': TIDES.synthetic,
+        'starts': starts,
+        'total_seconds': whole_seconds(totals),
+        'worst_leg': (worst + 1).tolist(),
+        'worst_leg_delay_seconds': whole_seconds(delays[np.arange(count), worst]),
+        'best': None if best is None else {'start': starts[best], 'total_seconds': round(float(totals[best]))},
+    })
+
+@app.route('/course/search', methods=['POST'])
+def course_search():
+    """Mark sequences making courses closest to a target length
+    
+    Takes ``start`` and optional ``finish`` (mark names; the finish defaults
+    to the start), ``target`` in nm, optional ``zones`` to draw marks from
+    (the start mark's zone by default), a leg length band ``min_leg`` and
+    ``max_leg`` in nm (0.5 and half the target by default), ``min_legs`` and
+    ``max_legs`` (2 and 6), ``top`` (5) and ``geodesy``. The search stops at
+    COURSE_SEARCH_BUDGET_SECONDS; ``complete`` says whether it finished.
+    """
+    data = request.get_json()
+    start = data.get('start')
+    finish = data.get('finish', start)
+    for name in (start, finish):
+        if not isinstance(name, str) or name not in REGISTRY:
+            return jsonify({'error': f'Mark {name} not found'}), 400
+    
+    mode = requested_geodesy(data.get('geodesy'))
+    if mode is None:
+        return jsonify({'error': GEODESY_ERROR}), 400
+    
+    target = number_list([data.get('target')])
+    if target is None or target[0] <= 0:
+        return jsonify({'error': 'target must be a positive distance in nm'}), 400
+    target = target[0]
+    band = number_list([data.get('min_leg', 0.5), data.get('max_leg', target / 2)])
+    if band is None or not 0 <= band[0] <= band[1]:
+        return jsonify({'error': 'Need numeric 0 <= min_leg <= max_leg'}), 400
+    
+    max_legs_limit = app.config['COURSE_SEARCH_MAX_LEGS']
+    max_results = app.config['COURSE_SEARCH_MAX_RESULTS']
+    counts = [data.get('min_legs', 2), data.get('max_legs', min(6, max_legs_limit)), data.get('top', 5)]
+    if not all(isinstance(count, int) and not isinstance(count, bool) for count in counts):
+        return jsonify({'error': 'min_legs, max_legs and top must be integers'}), 400
+    min_legs, max_legs, top = counts
+    if not 1 <= min_legs <= max_legs <= max_legs_limit:
+        return jsonify({'error': f'Need 1 <= min_legs <= max_legs <= {max_legs_limit}'}), 400
+    if not 1 <= top <= max_results:
+        return jsonify({'error': f'top must be between 1 and {max_results}'}), 400
+    
+    zones = data.get('zones', [start[0]])
+    if not isinstance(zones, list) or not all(isinstance(zone, str) for zone in zones):
+        return jsonify({'error': 'zones must be a list of zone strings'}), 400
+    
+    # Candidate marks: the zones' marks plus the start and finish, each once
+    names = list(dict.fromkeys([start, finish] + [mark['name'] for mark in REGISTRY.marks_in_zones(zones)]))
+    distances = REGISTRY.distance_hundredths([REGISTRY.position(name) for name in names], mode)
+    search = CourseSearch(distances, 0, names.index(finish), round(target * 100),
+                          round(band[0] * 100), round(band[1] * 100), min_legs, max_legs, top)
+    found = search.run(app.config['COURSE_SEARCH_BUDGET_SECONDS'])
+    
+    courses = []
+    for length, path in found:
+        course_marks, _ = resolve_course([(names[index], 'S') for index in path])
+        courses.append({
+            'marks': [names[index] for index in path],
+            'distance': length / 100,
+            'deviation': round(abs(length / 100 - target), 2),
+            'legs': build_legs(course_marks, mode=mode),
+        })
+    return jsonify({
+        'target': target,
+        'complete': search.complete,
+        'expanded': search.expanded,
+        'courses': courses,
+    })
+
+def metrics_allowed(address):
+    """Whether a client address is in one of the METRICS_ALLOW networks"""
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:  # Unix sockets and the like have no usable address
+        return False
+    return any(address in network for network in app.config['METRICS_ALLOW'])
+
+@app.route('/metrics')
+def metrics():
+    """Request, template and dataset metrics for every worker, in Prometheus text format"""
+    if not metrics_allowed(request.remote_addr):
+        return jsonify({'error': 'Forbidden'}), 403
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.endpoint if request.url_rule is not None else None
+        # Streamed responses have no length up front and are left out of the size histogram
+        size = None if response.is_streamed else response.calculate_content_length()
+        METRICS.observe_request(endpoint, response.status_code,
+                                time.perf_counter() - started, size)
+    return response
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+    g.setdefault('render_started', []).append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def record_render_metrics(sender, template, context, **extra):
+    started = g.get('render_started')
+    if started:
+        METRICS.observe_render(template.name, time.perf_counter() - started.pop())
+
+# Allocated once every route is registered; with preload_app = True this is
+# shared memory that all forked workers write to (see metrics.py)
+CACHES = {'marks': MARKS_PAYLOADS, 'pages': HTML_PAGES, 'course': COURSE_RESPONSES,
+          'polars': POLARS.cache}
+METRICS = MetricsRegistry.for_app(app, caches=CACHES)
+for _name, _cache in CACHES.items():
+    _cache.on_event = METRICS.cache_event_counter(_name)
+METRICS.set_gauge('dataset_load_seconds', DATASET_LOAD_SECONDS)
+METRICS.set_gauge('dataset_marks', len(REGISTRY))
+if REGISTRY.pair_matrix is not None:
+    METRICS.set_gauge('pair_matrix_build_seconds', REGISTRY.pair_matrix.build_seconds)
 
 if __name__ == '__main__':
     app.run(debug=True) 
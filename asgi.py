@@ -0,0 +1,140 @@
+"""ASGI entry point for the async serving mode
+
+Serves the same Flask app (and the same preloaded, read-only mark dataset)
+behind an asyncio event loop, so slow clients cost a socket rather than a
+whole worker:
+
+    gunicorn --config gunicorn-asgi.conf.py asgi:application
+
+The event loop reads each request in full before the app sees it and writes
+the response back at the client's pace. The WSGI app itself runs on a single
+thread per worker, so the app's in-process caches are never touched
+concurrently. See docs/PERFORMANCE.md.
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+
+# Request bodies are small JSON documents; anything bigger is refused
+# before it reaches the app
+MAX_BODY_SIZE = 1024 * 1024
+
+class WSGIAdapter:
+    """Run a WSGI app as an ASGI application on a dedicated thread"""
+
+    def __init__(self, wsgi_app, max_body_size=MAX_BODY_SIZE):
+        self.wsgi_app = wsgi_app
+        self.max_body_size = max_body_size
+        # Created on first use, i.e. in the worker after Gunicorn forks
+        self._executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if len(body) > self.max_body_size:
+                await self._send(send, '413 Request Entity Too Large',
+                                 [('Content-Type', 'text/plain')], [b'Request body too large'])
+                return
+            if not message.get('more_body', False):
+                break
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='wsgi')
+        environ = build_environ(scope, bytes(body))
+        loop = asyncio.get_running_loop()
+        status, headers, chunks = await loop.run_in_executor(self._executor, self._run, environ)
+        await self._send(send, status, headers, chunks)
+
+    def _run(self, environ):
+        """Call the WSGI app and collect its whole response"""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = headers
+            return lambda data: response.setdefault('written', []).append(data)
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            chunks = response.get('written', []) + list(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], chunks
+
+    @staticmethod
+    async def _send(send, status, headers, chunks):
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in headers],
+        })
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+def build_environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP scope and its complete body"""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI "native strings" carry the raw bytes decoded as latin-1
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            continue
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+application = WSGIAdapter(app)
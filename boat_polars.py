@@ -0,0 +1,255 @@
+"""Boat polars: speed by true wind speed and angle, and elapsed times over legs
+
+A polar table is parsed once into a dense grid of speed made good along a
+leg, by whole degree of true wind angle (0-180) and half knot of true wind
+speed (0-MAX_TWS). Legs closer to the wind than the boat's best upwind VMG
+angle are sailed as two tacks at that angle, and legs deeper than its best
+downwind VMG angle as two gybes, so the grid holds the effective speed along
+the leg in every case. Evaluating a course for many winds is then a
+bilinear lookup in that grid over whole arrays.
+
+Tables are the usual tab/space/comma/semicolon separated text (``.pol``)
+layout: a header row of a label then true wind speeds in knots, then one
+row per true wind angle of the angle followed by the boat speed in knots at
+each wind speed. Lines starting with ``#`` are ignored.
+"""
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from http_cache import LRUCache
+
+# Resolution and extent of the parsed grids
+TWA_STEP = 1.0
+TWS_STEP = 0.5
+MAX_TWS = 60.0
+GRID_TWA = np.arange(0.0, 180.0 + TWA_STEP, TWA_STEP)
+GRID_TWS = np.arange(0.0, MAX_TWS + TWS_STEP, TWS_STEP)
+
+# Largest polar table accepted, in bytes of text
+MAX_POLAR_BYTES = 64 * 1024
+
+_SEPARATORS = re.compile(r'[\s,;]+')
+_POLAR_ID = re.compile(r'^[0-9a-f]{16}$')
+
+class Polar:
+    """A boat's polar table and its grid of speeds along a leg
+
+    ``twa`` and ``tws`` are the table's true wind angles and speeds, both
+    increasing, and ``speeds`` its boat speeds with one row per angle. Below
+    the table's lowest wind speed, boat speed falls linearly to zero at
+    0 knots; above its highest it stays at the last column. Outside the
+    table's angles the boat is taken not to sail at all, so those legs are
+    tacked or gybed.
+    """
+
+    def __init__(self, twa, tws, speeds):
+        self.twa = np.asarray(twa, dtype=np.float64)
+        self.tws = np.asarray(tws, dtype=np.float64)
+        self.speeds = np.asarray(speeds, dtype=np.float64)
+        if self.twa.ndim != 1 or len(self.twa) < 2 or self.tws.ndim != 1 or len(self.tws) < 1:
+            raise ValueError('A polar needs at least two wind angles and one wind speed')
+        if self.speeds.shape != (len(self.twa), len(self.tws)):
+            raise ValueError('Every wind angle row needs one boat speed per wind speed')
+        if not (np.all(np.diff(self.twa) > 0) and 0 <= self.twa[0] < 90 < self.twa[-1] <= 180):
+            raise ValueError('Wind angles must increase within 0..180, either side of 90')
+        if not (np.all(np.diff(self.tws) > 0) and 0 < self.tws[0] and self.tws[-1] <= MAX_TWS):
+            raise ValueError(f'Wind speeds must increase within 0..{MAX_TWS:g} knots')
+        if not (np.all(np.isfinite(self.speeds)) and np.all(self.speeds >= 0)):
+            raise ValueError('Boat speeds must be non-negative numbers')
+
+        self.boat_speeds = self._boat_speed_grid()
+        self.grid, self.beat_angles, self.run_angles = self._course_speed_grid(self.boat_speeds)
+
+    def _boat_speed_grid(self):
+        """Table speeds interpolated to every GRID_TWA x GRID_TWS point"""
+        # Along wind speed first, with a zero column at 0 knots
+        tws = np.concatenate([[0.0], self.tws])
+        speeds = np.concatenate([np.zeros((len(self.twa), 1)), self.speeds], axis=1)
+        by_tws = np.array([np.interp(GRID_TWS, tws, row) for row in speeds])
+        return np.array([np.interp(GRID_TWA, self.twa, column, left=0.0, right=0.0)
+                         for column in by_tws.T]).T
+
+    @staticmethod
+    def _course_speed_grid(boat_speeds):
+        """Speed along a leg at every grid point, with the best VMG angles per wind speed"""
+        cos_twa = np.cos(np.radians(GRID_TWA))[:, None]
+        upwind = boat_speeds * cos_twa
+        beat = np.argmax(upwind, axis=0)
+        run = np.argmax(-upwind, axis=0)
+        columns = np.arange(len(GRID_TWS))
+        angle = np.arange(len(GRID_TWA))[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tacked = upwind[beat, columns] / cos_twa
+            # Both negative past 90 degrees; abs() also keeps a zero column at +0
+            gybed = np.abs(upwind[run, columns] / cos_twa)
+        grid = np.where(angle < beat, tacked, np.where(angle > run, gybed, boat_speeds))
+        return grid, GRID_TWA[beat], GRID_TWA[run]
+
+    def summary(self):
+        """The table's wind angles and speeds, with the best VMG angle at each wind speed"""
+        columns = np.rint(self.tws / TWS_STEP).astype(int)
+        return {
+            'twa': self.twa.tolist(),
+            'tws': self.tws.tolist(),
+            'beat_angles': self.beat_angles[columns].tolist(),
+            'run_angles': self.run_angles[columns].tolist(),
+        }
+
+def parse_polar(text):
+    """Parse a polar table's text into a Polar; raises ValueError if malformed"""
+    rows = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            rows.append(_SEPARATORS.split(line))
+    if len(rows) < 3:
+        raise ValueError('A polar needs a header row and at least two wind angle rows')
+    try:
+        tws = [float(value) for value in rows[0][1:]]
+        table = [[float(value) for value in row] for row in rows[1:]]
+    except ValueError:
+        raise ValueError('Polar values must be numbers') from None
+    if any(len(row) != len(tws) + 1 for row in table):
+        raise ValueError('Every wind angle row needs one boat speed per wind speed')
+    table = np.array(table)
+    return Polar(table[:, 0], tws, table[:, 1:])
+
+def polar_id(text):
+    """Content id of a polar table: the same table always gets the same id"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+class PolarStore:
+    """Uploaded polar tables, kept as text in ``directory`` and parsed on first use
+
+    Tables are stored under their content id, so every worker process can
+    load a table another worker accepted. At most ``max_stored`` tables are
+    kept on disk: storing one more deletes the least recently uploaded.
+    Parsed polars are kept in an LRU of ``maxsize`` entries per process.
+    """
+
+    def __init__(self, directory, maxsize=64, max_stored=1000):
+        self.directory = directory
+        self.max_stored = max_stored
+        self.cache = LRUCache(maxsize)
+
+    def _path(self, polar_id):
+        return os.path.join(self.directory, f'{polar_id}.pol')
+
+    def add(self, text):
+        """Parse and store a polar table, returning (id, Polar); raises ValueError if malformed"""
+        if len(text.encode('utf-8')) > MAX_POLAR_BYTES:
+            raise ValueError(f'Polar tables are limited to {MAX_POLAR_BYTES} bytes')
+        key = polar_id(text)
+        polar = self.cache.get(key)
+        if polar is None:
+            polar = self.cache.put(key, parse_polar(text))
+        self._store(key, text)
+        return key, polar
+
+    def _store(self, key, text):
+        path = self._path(key)
+        try:
+            # Uploading a table again makes it the newest
+            os.utime(path)
+            return
+        except FileNotFoundError:
+            pass
+        os.makedirs(self.directory, exist_ok=True)
+        # Written aside and renamed, so no worker ever reads half a table
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temporary, path)
+        self._prune()
+
+    def _prune(self):
+        """Delete the oldest tables beyond ``max_stored``"""
+        stored = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.pol'):
+                    try:
+                        stored.append((entry.stat().st_mtime_ns, entry.path))
+                    except FileNotFoundError:  # Pruned by another worker
+                        continue
+        stored.sort()
+        for _, path in stored[:max(0, len(stored) - self.max_stored)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, polar_id):
+        """The Polar stored under an id; raises KeyError if there is none"""
+        polar = self.cache.get(polar_id)
+        if polar is not None:
+            return polar
+        if not isinstance(polar_id, str) or not _POLAR_ID.match(polar_id):
+            raise KeyError(polar_id)
+        try:
+            with open(self._path(polar_id), encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            raise KeyError(polar_id) from None
+        return self.cache.put(polar_id, parse_polar(text))
+
+def _grid_terms(angles, wind_speeds):
+    """Flat grid indexes and weights of the bilinear interpolation at each point
+
+    Terms whose weight is zero everywhere (whole-degree angles, wind speeds on
+    the half knot) are left out. The same terms serve every polar.
+    """
+    a = np.clip(np.asarray(angles, dtype=np.float64) / TWA_STEP, 0, len(GRID_TWA) - 1)
+    s = np.clip(np.asarray(wind_speeds, dtype=np.float64) / TWS_STEP, 0, len(GRID_TWS) - 1)
+    a0 = np.minimum(a.astype(np.intp), len(GRID_TWA) - 2)
+    s0 = np.minimum(s.astype(np.intp), len(GRID_TWS) - 2)
+    fa, fs = a - a0, s - s0
+    base = a0 * len(GRID_TWS) + s0
+    terms = []
+    for a_step, a_weight in ((0, 1 - fa), (len(GRID_TWS), fa)):
+        for s_step, s_weight in ((0, 1 - fs), (1, fs)):
+            if np.any(a_weight) and np.any(s_weight):
+                terms.append((base + (a_step + s_step), a_weight * s_weight))
+    return terms
+
+def _interpolate(grid, terms):
+    flat = grid.ravel()
+    index, weight = terms[0]
+    result = flat[index] * weight
+    for index, weight in terms[1:]:
+        result += flat[index] * weight
+    return result
+
+def leg_speeds(polar, angles, wind_speeds):
+    """Speeds along legs (knots) by bilinear interpolation in a polar's grid
+
+    ``angles`` are true wind angles in degrees and ``wind_speeds`` true wind
+    speeds in knots; they are broadcast against each other.
+    """
+    return _interpolate(polar.grid, _grid_terms(angles, wind_speeds))
+
+def leg_times(polars, angles, wind_speeds, distances):
+    """Elapsed seconds over each leg for each polar
+
+    ``angles`` has shape (directions, legs) (see wind.true_wind_angles()),
+    ``wind_speeds`` shape (speeds,) and ``distances`` shape (legs,), in
+    nautical miles. Returns an array of shape (polars, directions, speeds,
+    legs); legs a boat can't sail at all (no wind) take infinitely long,
+    and zero-length legs no time.
+    """
+    angles = np.asarray(angles, dtype=np.float64)[:, None, :]
+    wind_speeds = np.asarray(wind_speeds, dtype=np.float64)[None, :, None]
+    # Broadcast up front so every term has the full shape
+    angles, wind_speeds = np.broadcast_arrays(angles, wind_speeds)
+    terms = _grid_terms(angles, wind_speeds)
+    # Knots are nautical miles per hour
+    distances = np.asarray(distances, dtype=np.float64) * 3600
+    times = np.empty((len(polars),) + angles.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k, polar in enumerate(polars):
+            np.divide(distances, _interpolate(polar.grid, terms), out=times[k])
+    times[..., distances == 0] = 0.0
+    return times
@@ -0,0 +1,109 @@
+"""Search for mark sequences that make a course of a target length"""
+import heapq
+import time
+
+# Expansions between checks of the time budget
+_CLOCK_INTERVAL = 256
+
+class CourseSearch:
+    """Depth-first branch-and-bound search over mark sequences
+
+    ``distances`` is a square matrix of integer distances between candidate
+    marks (any unit; MarkRegistry.distance_hundredths() gives hundredths of
+    a nautical mile), and ``start``/``finish`` are indexes into it. A course
+    runs from ``start`` to ``finish`` in ``min_legs`` to ``max_legs`` legs,
+    each from ``min_leg`` to ``max_leg`` long and between two different
+    marks. Other marks may be used more than once (windward-leeward courses
+    do).
+
+    The ``top`` courses closest to ``target`` are kept; between equally
+    close courses the one with fewer legs wins. A branch is pruned unless it
+    could still beat the worst course kept: going straight to the finish
+    must not overshoot the target by that much, and its remaining legs at
+    their longest must be able to get that close. Children are tried most
+    promising first, so good courses are found early and tighten the bound.
+    """
+
+    def __init__(self, distances, start, finish, target, min_leg, max_leg, min_legs=2, max_legs=6,
+                 top=5):
+        self.distances = [list(map(int, row)) for row in distances]
+        self.start = start
+        self.finish = finish
+        self.target = target
+        self.min_leg = min_leg
+        self.max_leg = max_leg
+        self.min_legs = min_legs
+        self.max_legs = max_legs
+        self.top = top
+        self.expanded = 0
+        self.complete = False
+        # Legs allowed from each mark, as (next mark, length)
+        self._legs = [[(j, d) for j, d in enumerate(row) if j != i and min_leg <= d <= max_leg]
+                      for i, row in enumerate(self.distances)]
+        self._results = []
+
+    def _bound(self):
+        """Error a course must beat to be kept"""
+        if len(self._results) < self.top:
+            return float('inf')
+        return -self._results[0][0]
+
+    def _keep(self, length, path):
+        entry = (-abs(length - self.target), -len(path), path)
+        if len(self._results) < self.top:
+            heapq.heappush(self._results, entry)
+        elif entry > self._results[0]:
+            heapq.heapreplace(self._results, entry)
+
+    def run(self, budget_seconds):
+        """Search until done or ``budget_seconds`` have passed; return the courses found
+
+        Courses come as (length, mark indexes) pairs, closest to the target
+        first. ``complete`` records whether the search finished.
+        """
+        deadline = time.perf_counter() + budget_seconds
+        to_finish = [row[self.finish] for row in self.distances]
+        finish, target, max_leg = self.finish, self.target, self.max_leg
+        min_leg = self.min_leg
+
+        stack = [(self.start, 0, (self.start,))]
+        while stack:
+            self.expanded += 1
+            if self.expanded % _CLOCK_INTERVAL == 0 and time.perf_counter() > deadline:
+                return self.results()
+            node, length, path = stack.pop()
+            legs = len(path) - 1
+            bound = self._bound()
+
+            # Close the course from here
+            last = to_finish[node]
+            if legs + 1 >= self.min_legs and node != finish and min_leg <= last <= max_leg:
+                self._keep(length + last, path + (finish,))
+                bound = self._bound()
+
+            # Or sail on to another mark, leaving at least the final leg
+            remaining = self.max_legs - legs - 1
+            if remaining < 1:
+                continue
+            children = []
+            for child, d in self._legs[node]:
+                sailed = length + d
+                # Shortest finish is straight there; longest is every leg at max_leg
+                least_error = max(0, sailed + to_finish[child] - target,
+                                  target - (sailed + remaining * max_leg))
+                if least_error >= bound:
+                    continue
+                children.append((abs(sailed + to_finish[child] - target), child, sailed))
+            # Most promising popped first
+            children.sort(reverse=True)
+            for _, child, sailed in children:
+                stack.append((child, sailed, path + (child,)))
+
+        self.complete = True
+        return self.results()
+
+    def results(self):
+        """Courses kept so far, as (length, mark indexes), closest to the target first"""
+        ordered = sorted(self._results, key=lambda entry: (-entry[0], -entry[1], entry[2]))
+        return [(sum(self.distances[a][b] for a, b in zip(path, path[1:])), list(path))
+                for _, _, path in ordered]
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Cost of the spherical and WGS-84 geodesy modes.
+
+For each mode, times one bearing + distance for a single mark pair (the
+scalar functions for spherical, a one-pair engine call for WGS-84), a
+10,000-pair vectorised engine batch, a pair matrix lookup, and building
+the pair matrix over the real marks. Also reports how far apart the two
+modes' distances are over all pairs of the real marks.
+
+Usage: python3 dev/benchmarks/geodesy_modes.py [--batch 10000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+sys.path.insert(0, ROOT)
+
+from geodesy import GEODESY_MODES, GeodesyEngine, PairMatrix, calculate_bearing, calculate_distance  # noqa: E402
+from marks import load_gpx_marks  # noqa: E402
+
+def best_time(func, repeat):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch', type=int, default=10000, help='pairs per vectorised batch')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    marks = load_gpx_marks()
+    engine = GeodesyEngine.from_marks(marks)
+    rng = random.Random(0)
+    rows = np.array([rng.randrange(len(marks)) for _ in range(args.batch)])
+    cols = np.array([rng.randrange(len(marks)) for _ in range(args.batch)])
+    mark1, mark2 = marks[rows[0]], marks[cols[0]]
+    i, j = [int(rows[0])], [int(cols[0])]
+
+    print(f"{'mode':<10} {'pair (us)':>10} {f'{args.batch} pairs (ms)':>16} {'matrix lookup (us)':>19} "
+          f"{f'matrix build {len(marks)} (ms)':>22}")
+    for mode in GEODESY_MODES:
+        if mode == 'spherical':
+            single = best_time(lambda: (calculate_bearing(mark1, mark2), calculate_distance(mark1, mark2)),
+                               args.repeat)
+        else:
+            single = best_time(lambda: engine.pairs(i, j, mode), args.repeat)
+        batch = best_time(lambda: engine.pairs(rows, cols, mode), args.repeat)
+        matrix = PairMatrix(marks, engine, mode)
+        lookup = best_time(lambda: (matrix.bearing(i[0], j[0]), matrix.distance(i[0], j[0])), args.repeat)
+        build = best_time(lambda: PairMatrix(marks, engine, mode), args.repeat)
+        print(f"{mode:<10} {single * 1e6:>10.2f} {batch * 1e3:>16.3f} {lookup * 1e6:>19.3f} {build * 1e3:>22.2f}")
+
+    everything = np.arange(len(marks))
+    spherical = engine.raw_distances(everything[:, None], everything)
+    wgs84 = engine.raw_wgs84(everything[:, None], everything)[1]
+    offset = wgs84 - spherical
+    relative = np.abs(offset[spherical > 0]) / spherical[spherical > 0]
+    print(f'\nWGS-84 minus spherical over {len(marks) ** 2} pairs: '
+          f'{offset.min():+.3f} to {offset.max():+.3f} nm, '
+          f'median |relative| {np.median(relative) * 100:.2f}%, max {relative.max() * 100:.2f}%')
+
+if __name__ == "__main__":
+    main()
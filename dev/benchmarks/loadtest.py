@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the app with configurable traffic mixes.
+
+Drives the real WSGI app either in-process through the Flask test client
+(app cost only, no network or server) or over HTTP against a Gunicorn it
+starts locally (or any running server given by URL), and reports throughput,
+p50/p95/p99 latency and error rates overall and per request kind.
+
+Request kinds, generated from the real mark dataset:
+
+    lookup     GET /lookup
+    marks      GET /marks?zones=... with a random zone selection
+    calculate  POST /lookup/calculate between two random marks
+    course     POST /course over 3-8 random marks
+
+Traffic comes either from a mix of those kinds (a preset or weights such as
+``lookup=1,marks=4,calculate=4,course=1``) or from an nginx access log in the
+default "combined" format used by nginx-docker.conf. Logs don't record POST
+bodies, so replayed POSTs to /lookup/calculate and /course get generated
+ones. With --speed a replay keeps the log's own timing (scaled); otherwise
+requests are sent back to back by each client.
+
+Usage: python3 dev/benchmarks/loadtest.py [--target testclient|gunicorn|URL]
+       [--mix browse] [--clients 8] [--duration 10] [--requests N]
+       [--workers 3] [--config gunicorn.conf.py] [--replay access.log]
+       [--speed 1.0] [--seed 0] [--json results.json]
+
+Runs are reproducible for a given seed, client count and request budget.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+sys.path.insert(0, ROOT)
+
+from slow_clients import free_port, percentile  # noqa: E402
+
+MIXES = {
+    # Someone on the water flicking between zones and checking bearings
+    'browse': {'lookup': 1, 'marks': 4, 'calculate': 4, 'course': 1},
+    # Race officers setting courses before the start
+    'planning': {'lookup': 1, 'marks': 2, 'calculate': 2, 'course': 5},
+    # Cold visitors loading the page and its data
+    'pages': {'lookup': 5, 'marks': 5, 'calculate': 0, 'course': 0},
+}
+
+# nginx "combined": $remote_addr - $remote_user [$time_local] "$request"
+# $status $body_bytes_sent "$http_referer" "$http_user_agent"
+COMBINED_LOG = re.compile(r'^\S+ \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+) [^"]*" ')
+
+class Traffic:
+    """Generates requests of each kind from the loaded mark dataset"""
+
+    def __init__(self, marks, zones):
+        self.names = [mark['name'] for mark in marks if mark['name']]
+        self.zones = zones
+
+    def request(self, kind, rng):
+        """(method, path, json body or None) for one request of ``kind``"""
+        if kind == 'lookup':
+            return 'GET', '/lookup', None
+        if kind == 'marks':
+            zones = rng.sample(self.zones, rng.randint(1, min(3, len(self.zones))))
+            return 'GET', f"/marks?zones={','.join(sorted(zones))}", None
+        if kind == 'calculate':
+            from_mark, to_mark = rng.sample(self.names, 2)
+            return 'POST', '/lookup/calculate', {'from_mark': from_mark, 'to_mark': to_mark}
+        if kind == 'course':
+            course = [{'name': name, 'rounding': rng.choice('PS')}
+                      for name in rng.sample(self.names, rng.randint(3, 8))]
+            return 'POST', '/course', {'course': course}
+        raise ValueError(f'unknown request kind {kind!r}')
+
+    def body_for(self, path, rng):
+        """Generated body for a replayed POST, or None"""
+        route = path.split('?', 1)[0]
+        if route == '/lookup/calculate':
+            return self.request('calculate', rng)[2]
+        if route == '/course':
+            return self.request('course', rng)[2]
+        return None
+
+def parse_mix(text):
+    """A preset name or ``kind=weight,...`` into a {kind: weight} dict"""
+    if text in MIXES:
+        return MIXES[text]
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        mix[kind.strip()] = float(weight)
+    return mix
+
+def read_access_log(path):
+    """(seconds since first request, method, path) for each request in a combined log"""
+    entries = []
+    first = None
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = COMBINED_LOG.match(line)
+            if not match:
+                continue
+            when = datetime.strptime(match['time'], '%d/%b/%Y:%H:%M:%S %z').timestamp()
+            if first is None:
+                first = when
+            entries.append((when - first, match['method'], match['path']))
+    return entries
+
+def kind_of(method, path):
+    """Label used to group a request in the report"""
+    route = path.split('?', 1)[0]
+    return {
+        ('GET', '/lookup'): 'lookup',
+        ('GET', '/marks'): 'marks',
+        ('POST', '/lookup/calculate'): 'calculate',
+        ('POST', '/course'): 'course',
+    }.get((method, route), f'{method} {route}')
+
+class TestClientSender:
+    """Sends requests in-process through the Flask test client"""
+
+    def __init__(self):
+        from app import app
+        app.config['TESTING'] = True
+        self.app = app
+
+    def connect(self):
+        client = self.app.test_client()
+
+        def send(method, path, body):
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+            return response.status_code
+        return send, lambda: None
+
+class HTTPSender:
+    """Sends requests over keep-alive HTTP connections, one per client"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    def connect(self):
+        state = {'connection': http.client.HTTPConnection(self.host, self.port, timeout=30)}
+
+        def send(method, path, body):
+            headers = {'Accept-Encoding': 'gzip, br'}
+            data = None
+            if body is not None:
+                data = json.dumps(body).encode('utf-8')
+                headers['Content-Type'] = 'application/json'
+            try:
+                state['connection'].request(method, path, body=data, headers=headers)
+                response = state['connection'].getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                state['connection'].close()
+                state['connection'] = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                raise
+        return send, lambda: state['connection'].close()
+
+def start_gunicorn(config, workers):
+    """Start Gunicorn on a free local port, returning (process, port)"""
+    port = free_port()
+    target = 'asgi:application' if 'asgi' in os.path.basename(config) else 'app:app'
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', config, '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--access-logfile', '/dev/null', '--log-level', 'warning',
+         # Worker recycling would drop the load test's keep-alive connections
+         '--max-requests', '0', target],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/lookup')
+            connection.getresponse().read()
+            connection.close()
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('gunicorn did not start')
+
+def run_clients(sender, schedule, clients, duration):
+    """Run ``clients`` threads pulling from ``schedule`` until it or the time runs out
+
+    ``schedule(client_index)`` returns an iterator of (due, method, path,
+    body), where ``due`` is seconds after the start, or None for "now".
+    Returns ({kind: [latency seconds]}, {kind: {status or error: count}}, elapsed).
+    """
+    latencies = defaultdict(list)
+    outcomes = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    def client(index):
+        send, close = sender.connect()
+        try:
+            for due, method, path, body in schedule(index):
+                now = time.perf_counter()
+                if deadline is not None and now >= deadline:
+                    return
+                if due is not None and start + due > now:
+                    time.sleep(start + due - now)
+                kind = kind_of(method, path)
+                began = time.perf_counter()
+                try:
+                    outcome = send(method, path, body)
+                except (OSError, http.client.HTTPException) as e:
+                    outcome = type(e).__name__
+                elapsed = time.perf_counter() - began
+                with lock:
+                    outcomes[kind][outcome] += 1
+                    if isinstance(outcome, int) and outcome < 500:
+                        latencies[kind].append(elapsed)
+        finally:
+            close()
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, outcomes, time.perf_counter() - start
+
+def mix_schedule(traffic, mix, seed, requests, clients):
+    """Per-client schedule of generated requests, ``requests`` in total (None = unbounded)"""
+    kinds = [kind for kind, weight in mix.items() if weight > 0]
+    weights = [mix[kind] for kind in kinds]
+
+    def schedule(index):
+        rng = random.Random(seed * 1000 + index)
+        count = 0
+        share = None if requests is None else requests // clients + (index < requests % clients)
+        while share is None or count < share:
+            kind = rng.choices(kinds, weights)[0]
+            method, path, body = traffic.request(kind, rng)
+            yield None, method, path, body
+            count += 1
+    return schedule
+
+def replay_schedule(traffic, entries, seed, clients, speed):
+    """Per-client schedule replaying log entries round-robin across clients"""
+    def schedule(index):
+        rng = random.Random(seed * 1000 + index)
+        for offset, method, path in entries[index::clients]:
+            due = offset / speed if speed else None
+            body = traffic.body_for(path, rng) if method == 'POST' else None
+            yield due, method, path, body
+    return schedule
+
+def summarise(latencies, outcomes, elapsed):
+    """Report rows per kind plus an overall row"""
+    rows = []
+    all_latencies = []
+    totals = defaultdict(int)
+    for kind in sorted(outcomes):
+        counts = outcomes[kind]
+        rows.append(_row(kind, latencies[kind], counts, elapsed))
+        all_latencies += latencies[kind]
+        for outcome, count in counts.items():
+            totals[outcome] += count
+    rows.append(_row('all', all_latencies, totals, elapsed))
+    return rows
+
+def _row(kind, latencies, counts, elapsed):
+    total = sum(counts.values())
+    client_errors = sum(n for outcome, n in counts.items() if isinstance(outcome, int) and 400 <= outcome < 500)
+    errors = sum(n for outcome, n in counts.items() if not isinstance(outcome, int) or outcome >= 500)
+    return {
+        'kind': kind,
+        'requests': total,
+        'rps': total / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'client_error_rate': client_errors / total if total else 0.0,
+        'error_rate': errors / total if total else 0.0,
+        'error_kinds': sorted(str(outcome) for outcome in counts
+                              if not isinstance(outcome, int) or outcome >= 500),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', default='testclient',
+                        help="'testclient', 'gunicorn' (started locally) or a base URL")
+    parser.add_argument('--mix', default='browse',
+                        help=f"preset ({', '.join(MIXES)}) or weights like lookup=1,marks=4")
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--duration', type=float,
+                        help='seconds to run, 0 for no limit (default: 10, or no limit '
+                             'with --requests or --replay)')
+    parser.add_argument('--requests', type=int, help='total requests to send (default: until --duration)')
+    parser.add_argument('--workers', type=int, default=3, help='Gunicorn workers for --target gunicorn')
+    parser.add_argument('--config', default='gunicorn.conf.py', help='Gunicorn config for --target gunicorn')
+    parser.add_argument('--replay', help='nginx access log (combined format) to replay instead of a mix')
+    parser.add_argument('--speed', type=float,
+                        help='replay at the log\'s own pace times this factor (default: back to back)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the report rows to this file')
+    args = parser.parse_args()
+
+    from app import REGISTRY
+    traffic = Traffic(REGISTRY.marks, REGISTRY.zones)
+
+    if args.replay:
+        entries = read_access_log(args.replay)
+        if args.requests is not None:
+            entries = entries[:args.requests]
+        schedule = replay_schedule(traffic, entries, args.seed, args.clients, args.speed)
+        source = f'replay of {args.replay} ({len(entries)} requests)'
+    else:
+        mix = parse_mix(args.mix)
+        schedule = mix_schedule(traffic, mix, args.seed, args.requests, args.clients)
+        source = f'mix {mix}'
+    duration = args.duration
+    if duration is None:
+        duration = 0 if args.requests is not None or args.replay else 10
+
+    process = None
+    try:
+        if args.target == 'testclient':
+            sender = TestClientSender()
+        elif args.target == 'gunicorn':
+            process, port = start_gunicorn(args.config, args.workers)
+            sender = HTTPSender('127.0.0.1', port)
+        else:
+            url = urlsplit(args.target)
+            sender = HTTPSender(url.hostname, url.port or 80)
+
+        print(f'{args.target}: {source}, {args.clients} clients')
+        latencies, outcomes, elapsed = run_clients(sender, schedule, args.clients, duration)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    rows = summarise(latencies, outcomes, elapsed)
+    print(f"{'kind':<24} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'4xx %':>7} {'err %':>7}")
+    for r in rows:
+        print(f"{r['kind']:<24} {r['requests']:>9} {r['rps']:>9.1f} {r['p50_ms']:>9.1f} "
+              f"{r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['client_error_rate'] * 100:>7.2f} "
+              f"{r['error_rate'] * 100:>7.2f} {' '.join(r['error_kinds'])}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'target': args.target, 'source': source, 'clients': args.clients,
+                       'elapsed': elapsed, 'rows': rows}, f, indent=2)
+            f.write('\n')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for mark loading, zone filtering, geodesy and course legs.
+
+Generates synthetic GPX files of each size (Solent-like coordinates, zone
+prefixes 1-9), then times:
+
+    load_gpx_marks        parse the whole file
+    get_available_zones   over all marks
+    get_marks_by_zone     two zones out of nine
+    calculate_bearing     1,000 calls over random mark pairs
+    calculate_distance    1,000 calls over random mark pairs
+    build_legs            a 40-mark course through a MarkRegistry
+    nearest               MarkRegistry.nearest(), k=10, from random positions
+
+Each result is the best of several timeit runs, in seconds per call (per
+1,000 calls for the geodesy functions, per 100 queries for nearest). A fixed pure-Python calibration loop
+is timed alongside, and comparisons against the baseline JSON file use each
+result relative to that loop, which cancels out most of the difference
+between a quiet and a busy (or faster and slower) machine. Any benchmark
+slower than the baseline by more than the threshold is timed again (see
+--retries), so a moment of noise on a shared machine doesn't fail the run;
+if it is still slow it is reported and the script exits with status 1.
+
+Usage: python3 dev/benchmarks/micro.py [--sizes 184 1000 10000 100000]
+       [--baseline dev/benchmarks/baseline.json] [--threshold 0.25]
+       [--retries 2] [--save] [--only NAME ...]
+
+Calibration makes baselines roughly portable, but not exactly: regenerate
+one with --save on the machine that runs the check.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+sys.path.insert(0, ROOT)
+
+from app import build_legs  # noqa: E402
+from geodesy import calculate_bearing, calculate_distance  # noqa: E402
+from marks import MarkRegistry, get_available_zones, get_marks_by_zone, load_gpx_marks  # noqa: E402
+
+DEFAULT_SIZES = [184, 1000, 10000, 100000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+GEODESY_CALLS = 1000
+COURSE_MARKS = 40
+
+def write_synthetic_gpx(path, count, seed=0):
+    """Write ``count`` waypoints spread over the Solent, zones 1-9"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\n")
+        f.write('<ns0:gpx xmlns:ns0="http://www.topografix.com/GPX/1/1" version="1.1" creator="benchmark">\n')
+        for i in range(count):
+            lat = rng.uniform(50.55, 50.85)
+            lon = rng.uniform(-1.95, -0.95)
+            f.write(f'  <ns0:wpt lat="{lat:.6f}" lon="{lon:.6f}">\n'
+                    f'    <ns0:name>{i % 9 + 1}{i:06d}</ns0:name>\n'
+                    f'    <ns0:sym>{"RGY"[i % 3]}</ns0:sym>\n'
+                    f'    <ns0:desc>Synthetic mark {i}</ns0:desc>\n'
+                    f'  </ns0:wpt>\n')
+        f.write('</ns0:gpx>\n')
+
+def benchmarks(path):
+    """(name, callable) pairs for one synthetic dataset"""
+    marks = load_gpx_marks(path)
+    rng = random.Random(1)
+    pairs = [(rng.choice(marks), rng.choice(marks)) for _ in range(GEODESY_CALLS)]
+
+    registry = MarkRegistry(marks)
+    course_marks = []
+    for mark in rng.sample(marks, COURSE_MARKS):
+        mark = dict(mark)
+        mark['rounding'] = 'P'
+        course_marks.append(mark)
+
+    positions = [(rng.uniform(50.55, 50.85), rng.uniform(-1.95, -0.95)) for _ in range(100)]
+
+    def nearest():
+        for lat, lon in positions:
+            registry.nearest(lat, lon, 10)
+
+    def bearings():
+        for mark1, mark2 in pairs:
+            calculate_bearing(mark1, mark2)
+
+    def distances():
+        for mark1, mark2 in pairs:
+            calculate_distance(mark1, mark2)
+
+    return [
+        ('load_gpx_marks', lambda: load_gpx_marks(path)),
+        ('get_available_zones', lambda: get_available_zones(marks)),
+        ('get_marks_by_zone', lambda: get_marks_by_zone(marks, ['2', '7'])),
+        ('calculate_bearing', bearings),
+        ('calculate_distance', distances),
+        ('build_legs', lambda: build_legs(course_marks, registry)),
+        ('nearest', nearest),
+    ]
+
+def calibration_loop():
+    """Fixed pure-Python workload used to normalise timings across runs"""
+    total = 0.0
+    for i in range(20000):
+        total += math.sin(i) * math.cos(i)
+    return total
+
+def best_time(func, repeat):
+    """Best seconds per call over ``repeat`` runs of at least 0.2 s each"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def run(sizes, repeat, only=None, quiet=False):
+    """Return (results, calibration seconds)"""
+    results = {}
+    calibration = best_time(calibration_loop, repeat)
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f'synthetic-{size}.gpx')
+            write_synthetic_gpx(path, size)
+            for name, func in benchmarks(path):
+                if only and name not in only:
+                    continue
+                key = f'{name}[{size}]'
+                results[key] = best_time(func, repeat)
+                if not quiet:
+                    print(f'{key:<32} {results[key] * 1000:>12.4f} ms', flush=True)
+    # Keep the quieter of the two calibration measurements
+    calibration = min(calibration, best_time(calibration_loop, repeat))
+    return results, calibration
+
+def compare(results, calibration, baseline, baseline_calibration, threshold):
+    """Benchmarks slower than the baseline by more than ``threshold``, as (key, ratio)
+
+    Ratios are of calibration-relative times.
+    """
+    regressions = []
+    for key, seconds in results.items():
+        reference = baseline.get(key)
+        if reference:
+            ratio = (seconds / calibration) / (reference / baseline_calibration)
+            if ratio > 1 + threshold:
+                regressions.append((key, ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=5, help='timeit runs per benchmark (best is kept)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown over the baseline, as a fraction (0.25 = 25%%)')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='times to re-measure an apparent regression before failing')
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--only', nargs='+', help='benchmark names to run')
+    args = parser.parse_args()
+
+    results, calibration = run(args.sizes, args.repeat, args.only)
+    print(f"{'calibration':<32} {calibration * 1000:>12.4f} ms")
+
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'calibration': calibration,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --save to create one')
+        return
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, calibration, baseline['results'], baseline['calibration'],
+                          args.threshold)
+    for _ in range(args.retries):
+        if not regressions:
+            break
+        # Keep the best of the original and repeated measurements
+        for key, _ in regressions:
+            name, size = key[:-1].split('[')
+            again, again_calibration = run([int(size)], args.repeat, [name], quiet=True)
+            if again[key] / again_calibration < results[key] / calibration:
+                results[key] = again[key] * calibration / again_calibration
+        regressions = compare(results, calibration, baseline['results'], baseline['calibration'],
+                              args.threshold)
+    if regressions:
+        print(f'\nSlower than baseline by more than {args.threshold:.0%}:')
+        for key, ratio in regressions:
+            print(f'  {key:<32} {ratio:.2f}x')
+        sys.exit(1)
+    print(f'\nNo regressions beyond {args.threshold:.0%} against {args.baseline}')
+
+if __name__ == "__main__":
+    main()
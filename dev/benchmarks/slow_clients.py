@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Compare the sync and async (ASGI) serving modes under slow connections.
+
+Starts Gunicorn locally with the chosen config, opens a number of "slow"
+clients that trickle their request headers a few bytes at a time (like a
+phone on marina Wi-Fi), and meanwhile measures throughput and latency of
+normal clients requesting /marks. Reports requests/s, p50/p95/p99 latency
+and errors for each mode.
+
+Usage: python3 dev/benchmarks/slow_clients.py [--modes sync asgi] [--slow 30]
+       [--fast 8] [--duration 10]
+
+The async mode needs requirements-asgi.txt installed.
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+MODES = {
+    'sync': ('gunicorn.conf.py', 'app:app'),
+    'asgi': ('gunicorn-asgi.conf.py', 'asgi:application'),
+}
+
+SLOW_REQUEST = b'GET /marks?zones=2 HTTP/1.1\r\nHost: localhost\r\nUser-Agent: slow-client\r\n\r\n'
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(mode, port, workers):
+    config, target = MODES[mode]
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', config, '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--access-logfile', '/dev/null', '--error-logfile', '-',
+         '--log-level', 'warning',
+         # Worker recycling would drop the benchmark's keep-alive connections
+         '--max-requests', '0', target],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+def slow_client(port, byte_interval, stop):
+    """Trickle one request a byte at a time, then read the response; repeat"""
+    while not stop.is_set():
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=60) as sock:
+                for i in range(len(SLOW_REQUEST)):
+                    if stop.is_set():
+                        return
+                    sock.sendall(SLOW_REQUEST[i:i + 1])
+                    time.sleep(byte_interval)
+                while not stop.is_set() and sock.recv(65536):
+                    pass
+        except OSError:
+            time.sleep(0.1)
+
+def fast_client(port, stop, latencies, errors):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            connection.request('GET', '/marks?zones=2')
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+            else:
+                latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.close()
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def run(mode, args):
+    port = free_port()
+    process = start_server(mode, port, args.workers)
+    stop = threading.Event()
+    latencies, errors = [], []
+    try:
+        slow = [threading.Thread(target=slow_client, args=(port, args.byte_interval, stop), daemon=True)
+                for _ in range(args.slow)]
+        for thread in slow:
+            thread.start()
+        time.sleep(1)  # let the slow clients occupy their connections
+
+        fast = [threading.Thread(target=fast_client, args=(port, stop, latencies, errors), daemon=True)
+                for _ in range(args.fast)]
+        for thread in fast:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in fast + slow:
+            thread.join(timeout=35)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'rps': len(latencies) / args.duration,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'errors': len(errors),
+        'error_kinds': sorted(set(map(str, errors))),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['sync', 'asgi'])
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--slow', type=int, default=30, help='number of slow clients')
+    parser.add_argument('--byte-interval', type=float, default=0.1,
+                        help='seconds between bytes sent by slow clients')
+    parser.add_argument('--fast', type=int, default=8, help='number of normal clients')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to measure')
+    args = parser.parse_args()
+
+    print(f"{'mode':<6} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for mode in args.modes:
+        r = run(mode, args)
+        print(f"{r['mode']:<6} {r['requests']:>9} {r['rps']:>9.1f} {r['p50_ms']:>9.1f} "
+              f"{r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['errors']:>7} {r['error_kinds']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Report the startup cost and memory of the all-pairs bearing/distance matrix
+for the real mark dataset and for synthetic datasets of increasing size.
+
+Usage: python3 dev/scripts/pair_matrix_report.py [size ...]
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from geodesy import PairMatrix  # noqa: E402
+from marks import load_gpx_marks  # noqa: E402
+
+DEFAULT_SIZES = [184, 500, 1000, 2000]
+
+def synthetic_marks(count, seed=2025):
+    """Random marks scattered over the Solent area"""
+    rng = random.Random(seed)
+    return [{
+        'name': f'{i % 10}{i:05d}',
+        'lat': rng.uniform(50.55, 50.85),
+        'lon': rng.uniform(-2.0, -0.9),
+    } for i in range(count)]
+
+def print_report(label, report):
+    print(f"{label:>12} {report['marks']:>7} {report['pairs']:>11} "
+          f"{report['build_seconds']:>10.3f} {report['bytes'] / 1024 / 1024:>9.2f}")
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+
+    print(f"{'dataset':>12} {'marks':>7} {'pairs':>11} {'build (s)':>10} {'MiB':>9}")
+    print_report('2025scra', PairMatrix(load_gpx_marks()).report())
+    for size in sizes:
+        print_report('synthetic', PairMatrix(synthetic_marks(size)).report())
+
+if __name__ == "__main__":
+    main()
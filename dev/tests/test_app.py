@@ -100,6 +100,15 @@ def test_calculate_route_invalid_marks(client):
     data = response.get_json()
     assert 'error' in data
 
+def test_calculate_route_non_string_marks(client):
+    """Test that mark names that aren't strings are simply not found"""
+    marks = load_gpx_marks()
+    for route, names in (('/calculate', ('mark1', 'mark2')), ('/lookup/calculate', ('from_mark', 'to_mark'))):
+        for bad in ([marks[0]['name']], {'name': marks[0]['name']}):
+            response = client.post(route, json={names[0]: bad, names[1]: marks[1]['name']})
+            assert response.status_code == 400
+            assert response.get_json()['error'] == 'One or both marks not found'
+
 def test_calculate_route_missing_data(client):
     """Test calculation with missing data"""
     response = client.post('/calculate', json={})
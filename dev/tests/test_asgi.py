@@ -0,0 +1,64 @@
+import asyncio
+import json
+from app import app
+from asgi import WSGIAdapter, application
+
+def call(scope, body=b'', adapter=application):
+    """Drive the ASGI app for one request, returning (status, headers, body)"""
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(adapter(scope, receive, send))
+    start, response_body = sent
+    return start['status'], dict(start['headers']), response_body['body']
+
+def http_scope(method, path, query=b'', headers=()):
+    return {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query,
+        'root_path': '', 'scheme': 'http', 'http_version': '1.1',
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+        'headers': list(headers),
+    }
+
+def test_asgi_get_matches_wsgi():
+    """Test that a GET through the ASGI adapter returns what the WSGI app does"""
+    status, headers, body = call(http_scope('GET', '/marks', b'zones=2'))
+    expected = app.test_client().get('/marks?zones=2')
+    assert status == 200
+    assert body == expected.data
+    assert headers[b'etag'] == expected.headers['ETag'].encode('latin-1')
+
+def test_asgi_post_json():
+    """Test that request bodies and headers reach the app"""
+    payload = json.dumps({'from_mark': '2A', 'to_mark': '2B'}).encode('utf-8')
+    status, _, body = call(http_scope('POST', '/lookup/calculate',
+                                      headers=[(b'content-type', b'application/json')]), payload)
+    assert status == 200
+    assert json.loads(body) == app.test_client().post(
+        '/lookup/calculate', json={'from_mark': '2A', 'to_mark': '2B'}).get_json()
+
+def test_asgi_rejects_oversized_body():
+    """Test that oversized bodies are refused before reaching the app"""
+    adapter = WSGIAdapter(app, max_body_size=10)
+    status, _, _ = call(http_scope('POST', '/lookup/calculate'), b'x' * 11, adapter)
+    assert status == 413
+
+def test_asgi_lifespan():
+    """Test that the adapter completes the lifespan protocol"""
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(WSGIAdapter(app)({'type': 'lifespan'}, receive, send))
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
@@ -0,0 +1,192 @@
+import math
+import os
+import re
+import numpy as np
+import pytest
+import app as app_module
+from app import app
+from boat_polars import PolarStore, leg_speeds, leg_times, parse_polar
+
+# Synthetic table in the usual .pol layout, not any real boat's polar
+POLAR_TEXT = """\
+# Example polar for tests
+twa/tws\t6\t10\t16
+0\t0\t0\t0
+40\t4.0\t5.5\t6.2
+60\t5.0\t6.5\t7.2
+90\t5.5\t7.0\t8.0
+120\t5.0\t7.0\t8.6
+150\t3.8\t6.0\t8.0
+180\t3.0\t5.0\t7.0
+"""
+
+@pytest.fixture
+def polars(tmp_path, monkeypatch):
+    """A polar store in a temporary directory, installed in the app"""
+    store = PolarStore(str(tmp_path / 'polars'))
+    monkeypatch.setattr(app_module, 'POLARS', store)
+    return store
+
+@pytest.fixture
+def client(polars):
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def test_parse_polar():
+    """Test parsing a table and its best VMG angles"""
+    polar = parse_polar(POLAR_TEXT)
+    summary = polar.summary()
+    assert summary['twa'] == [0, 40, 60, 90, 120, 150, 180]
+    assert summary['tws'] == [6, 10, 16]
+    assert summary['beat_angles'] == [40, 40, 40]
+    assert len(summary['run_angles']) == 3
+    assert all(120 <= angle <= 180 for angle in summary['run_angles'])
+
+    # Commas and semicolons separate values too
+    assert parse_polar(POLAR_TEXT.replace('\t', ';')).summary() == summary
+
+@pytest.mark.parametrize('text, error', [
+    ('twa 6\n40 4\n', 'A polar needs a header row and at least two wind angle rows'),
+    ('twa 6\n40 x\n120 4\n', 'Polar values must be numbers'),
+    ('twa 6 8\n40 4\n120 4 5\n', 'Every wind angle row needs one boat speed per wind speed'),
+    ('twa 6\n120 4\n40 4\n', 'Wind angles must increase within 0..180, either side of 90'),
+    ('twa 6\n40 4\n80 4\n', 'Wind angles must increase within 0..180, either side of 90'),
+    ('twa 8 6\n40 4 4\n120 4 4\n', 'Wind speeds must increase within 0..60 knots'),
+    ('twa 6\n40 -1\n120 4\n', 'Boat speeds must be non-negative numbers'),
+])
+def test_parse_polar_errors(text, error):
+    """Test that malformed tables are rejected"""
+    with pytest.raises(ValueError, match=f'^{re.escape(error)}$'):
+        parse_polar(text)
+
+def test_leg_speeds():
+    """Test table speeds, tacking and gybing, and wind speeds off the table"""
+    polar = parse_polar(POLAR_TEXT)
+    speeds = leg_speeds(polar, [90, 60, 75, 120], [10, 10, 10, 13])
+    assert speeds.tolist() == pytest.approx([7.0, 6.5, 6.75, 7.8])
+
+    # Dead upwind is two tacks at the best beat angle
+    beat_vmg = 5.5 * math.cos(math.radians(40))
+    assert leg_speeds(polar, [0, 20], [10, 10]).tolist() == pytest.approx(
+        [beat_vmg, beat_vmg / math.cos(math.radians(20))])
+    run_angle = polar.summary()['run_angles'][1]
+    assert leg_speeds(polar, [180], [10])[0] > 5.0
+    assert leg_speeds(polar, [run_angle], [10])[0] == pytest.approx(polar.boat_speeds[int(run_angle), 20])
+
+    # Speed falls to zero with the wind below 6 knots and holds above 16
+    assert leg_speeds(polar, [90, 90, 90], [0, 3, 30]).tolist() == pytest.approx([0, 2.75, 8.0])
+
+def test_leg_times():
+    """Test the shape and units of batched leg times"""
+    polar = parse_polar(POLAR_TEXT)
+    times = leg_times([polar, polar], [[90, 0, 45], [0, 90, 45]], [10, 0], [7.0, 1.0, 0.0])
+    assert times.shape == (2, 2, 2, 3)
+    assert times[0, 0, 0, 0] == pytest.approx(3600)
+    assert times[1, 1, 0, 1] == pytest.approx(3600 / 7)
+    # No wind, no progress, except over a zero-length leg
+    assert np.isinf(times[:, :, 1, :2]).all()
+    assert (times[..., 2] == 0).all()
+
+def test_polar_store_shared_by_directory(polars):
+    """Test that a table stored by one store can be loaded by another"""
+    polar_id, polar = polars.add(POLAR_TEXT)
+    assert polars.add(POLAR_TEXT)[0] == polar_id
+    assert polars.get(polar_id) is polar
+
+    other = PolarStore(polars.directory)
+    assert np.array_equal(other.get(polar_id).grid, polar.grid)
+    for missing in ('0123456789abcdef', '../../etc/passwd', polar_id.upper()):
+        with pytest.raises(KeyError):
+            other.get(missing)
+
+def test_polar_store_keeps_newest_tables(tmp_path):
+    """Test that storing past max_stored deletes the least recently uploaded tables"""
+    store = PolarStore(str(tmp_path / 'polars'), max_stored=2)
+    texts = [POLAR_TEXT.replace('Example', f'Example {n}') for n in range(3)]
+    first, _ = store.add(texts[0])
+    second, _ = store.add(texts[1])
+    # Uploaded long ago, then again now
+    os.utime(store._path(first), (0, 0))
+    os.utime(store._path(second), (1, 1))
+    store.add(texts[0])
+    third, _ = store.add(texts[2])
+
+    assert sorted(os.listdir(store.directory)) == sorted([f'{first}.pol', f'{third}.pol'])
+    with pytest.raises(KeyError):
+        PolarStore(store.directory).get(second)
+    # Stored again on a fresh upload
+    assert store.add(texts[1])[0] == second
+    assert os.path.exists(store._path(second))
+
+def test_upload_and_get_polar(client):
+    """Test uploading a polar and reading its summary back"""
+    response = client.post('/polars', data=POLAR_TEXT, content_type='text/plain')
+    assert response.status_code == 201
+    uploaded = response.get_json()
+    assert uploaded['tws'] == [6, 10, 16]
+
+    assert client.get(f"/polars/{uploaded['id']}").get_json() == uploaded
+    assert client.get('/polars/0123456789abcdef').status_code == 404
+
+    response = client.post('/polars', data='twa 6\n40 x\n', content_type='text/plain')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'A polar needs a header row and at least two wind angle rows'}
+
+def test_course_times(client, polars):
+    """Test estimated leg and course times for several boats and winds"""
+    polar_id, polar = polars.add(POLAR_TEXT)
+    slower_id, slower = polars.add(POLAR_TEXT.replace('\n180\t3.0\t5.0\t7.0', '\n180\t2.0\t4.0\t6.0'))
+    course = ['1A', '3SQ', '1B', '1A']
+    response = client.post('/course/times', json={
+        'course': course, 'polars': [polar_id, slower_id],
+        'wind_directions': [0, 225.5], 'wind_speeds': [0, 12]})
+    assert response.status_code == 200
+    result = response.get_json()
+
+    legs = client.post('/course', json={'course': course}).get_json()['legs']
+    assert result['legs'] == legs
+    assert [boat['polar'] for boat in result['boats']] == [polar_id, slower_id]
+
+    bearings = [leg['bearing'] for leg in legs]
+    for boat, boat_polar in zip(result['boats'], (polar, slower)):
+        for d, direction in enumerate(result['wind_directions']):
+            angles = [abs((b - direction + 180) % 360 - 180) for b in bearings]
+            speeds = leg_speeds(boat_polar, angles, [12] * len(legs))
+            expected = [leg['distance'] / speed * 3600 for leg, speed in zip(legs, speeds)]
+            assert boat['leg_seconds'][d][1] == [round(t) for t in expected]
+            assert boat['total_seconds'][d][1] == round(sum(expected))
+            # No wind
+            assert boat['leg_seconds'][d][0] == [None] * len(legs)
+            assert boat['total_seconds'][d][0] is None
+
+def test_course_times_default_directions(client, polars):
+    """Test that every whole-degree wind direction is evaluated by default"""
+    polar_id, _ = polars.add(POLAR_TEXT)
+    result = client.post('/course/times', json={
+        'course': ['1A', '3SQ'], 'polars': [polar_id], 'wind_speeds': [10]}).get_json()
+    assert result['wind_directions'] == list(range(360))
+    assert len(result['boats'][0]['total_seconds']) == 360
+
+@pytest.mark.parametrize('body, error', [
+    ({'course': ['1A', '3SQ'], 'polars': [], 'wind_speeds': [10]},
+     'polars must be a non-empty list of polar ids'),
+    ({'course': ['1A', '3SQ'], 'polars': ['0123456789abcdef'], 'wind_speeds': [10]},
+     'Polar 0123456789abcdef not found'),
+    ({'course': ['1A', '3SQ'], 'polars': 'ID', 'wind_speeds': [-1]},
+     'wind_speeds must be a non-empty list of non-negative numbers'),
+    ({'course': ['1A', '3SQ'], 'polars': 'ID', 'wind_speeds': [10], 'wind_directions': ['N']},
+     'wind_directions must be a non-empty list of numbers'),
+    ({'course': ['1A', 'NOPE'], 'polars': 'ID', 'wind_speeds': [10]}, 'Mark NOPE not found'),
+    ({'course': ['1A', '3SQ'], 'polars': 'ID', 'wind_speeds': list(range(30)) * 100},
+     'At most 500000 boat x direction x speed x leg times per request'),
+])
+def test_course_times_errors(client, polars, body, error):
+    """Test that invalid time requests are rejected"""
+    polar_id, _ = polars.add(POLAR_TEXT)
+    if body['polars'] == 'ID':
+        body = dict(body, polars=[polar_id])
+    response = client.post('/course/times', json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
@@ -0,0 +1,87 @@
+import pytest
+import app as app_module
+from app import app
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    app_module.COURSE_RESPONSES.clear()
+    with app.test_client() as client:
+        yield client
+
+COURSE = [{'name': '1A', 'rounding': 'P'}, {'name': '1B', 'rounding': 'S'}, {'name': '1C', 'rounding': 'P'}]
+
+def test_repeat_course_served_from_cache(client, monkeypatch):
+    """Test that a repeated course returns the cached payload without recomputing legs"""
+    first = client.post('/course', json={'course': COURSE})
+    assert first.status_code == 200
+    assert len(first.get_json()['legs']) == 2
+
+    def fail(*args, **kwargs):
+        raise AssertionError('legs recomputed')
+    monkeypatch.setattr(app_module, 'build_legs', fail)
+
+    second = client.post('/course', json={'course': COURSE})
+    assert second.status_code == 200
+    assert second.mimetype == 'application/json'
+    assert second.data == first.data
+
+def test_course_key_includes_rounding_and_order(client):
+    """Test that courses differing in rounding or order are cached separately"""
+    port = client.post('/course', json={'course': COURSE}).get_json()
+    starboard = [dict(item, rounding='S') for item in COURSE]
+    assert client.post('/course', json={'course': starboard}).get_json() != port
+
+    reversed_course = client.post('/course', json={'course': COURSE[::-1]}).get_json()
+    assert reversed_course['legs'][0]['from']['name'] == '1C'
+    assert len(app_module.COURSE_RESPONSES) == 3
+
+def test_plain_name_list_shares_default_rounding_key(client):
+    """Test that a list of names caches under the same key as explicit starboard roundings"""
+    by_name = client.post('/course', json={'course': ['1A', '1B']})
+    explicit = client.post('/course', json={'course': [{'name': '1A', 'rounding': 'S'},
+                                                       {'name': '1B', 'rounding': 'S'}]})
+    assert by_name.data == explicit.data
+    assert app_module.COURSE_RESPONSES.stats()['hits'] >= 1
+
+def test_non_string_values_not_cached(client):
+    """Test that courses with non-string roundings are answered but never cached"""
+    course = [{'name': '1A', 'rounding': 1}, {'name': '1B', 'rounding': True}]
+    response = client.post('/course', json={'course': course})
+    legs = response.get_json()['legs']
+    assert legs[0]['from']['rounding'] == 1
+    assert legs[0]['to']['rounding'] is True
+    assert len(app_module.COURSE_RESPONSES) == 0
+
+def test_errors_not_cached(client):
+    """Test that unknown marks still give an error and leave the cache empty"""
+    response = client.post('/course', json={'course': [{'name': '1A'}, {'name': 'NOPE'}]})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Mark NOPE not found'}
+    assert len(app_module.COURSE_RESPONSES) == 0
+
+def test_cache_stats_and_eviction(client, monkeypatch):
+    """Test that hits, misses and evictions are counted and reported in /metrics"""
+    monkeypatch.setattr(app_module.COURSE_RESPONSES, 'maxsize', 1)
+    stats_before = app_module.COURSE_RESPONSES.stats()
+    client.post('/course', json={'course': COURSE})
+    client.post('/course', json={'course': COURSE})
+    client.post('/course', json={'course': COURSE[::-1]})
+    stats = app_module.COURSE_RESPONSES.stats()
+    assert stats['hits'] - stats_before['hits'] == 1
+    assert stats['misses'] - stats_before['misses'] == 2
+    assert stats['evictions'] - stats_before['evictions'] == 1
+    assert stats['size'] == 1
+
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'solent_cache_events_total{cache="course",event="eviction"}' in metrics
+
+def test_cache_emptied_on_dataset_change(client, monkeypatch):
+    """Test that cached courses are dropped when the dataset version changes"""
+    client.post('/course', json={'course': COURSE})
+    assert len(app_module.COURSE_RESPONSES) == 1
+    monkeypatch.setattr(app_module.REGISTRY, 'version', 'another-version')
+    client.post('/course', json={'course': COURSE})
+    assert app_module.COURSE_RESPONSES.version == 'another-version'
+    assert len(app_module.COURSE_RESPONSES) == 1
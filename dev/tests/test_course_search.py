@@ -0,0 +1,111 @@
+import itertools
+import random
+import pytest
+import app as app_module
+from app import app
+from course_search import CourseSearch
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def random_distances(n, seed):
+    """Symmetric integer distances between random points on a plane"""
+    rng = random.Random(seed)
+    points = [(rng.uniform(0, 300), rng.uniform(0, 300)) for _ in range(n)]
+    return [[round(((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5) for bx, by in points] for ax, ay in points]
+
+def brute_force(distances, start, finish, target, min_leg, max_leg, min_legs, max_legs):
+    """Every valid course's error, by enumeration"""
+    errors = []
+    for legs in range(min_legs, max_legs + 1):
+        for middle in itertools.product(range(len(distances)), repeat=legs - 1):
+            path = (start,) + middle + (finish,)
+            lengths = [distances[a][b] for a, b in zip(path, path[1:])]
+            if all(a != b for a, b in zip(path, path[1:])) and all(min_leg <= d <= max_leg for d in lengths):
+                errors.append(abs(sum(lengths) - target))
+    return sorted(errors)
+
+@pytest.mark.parametrize('seed, start, finish, target', [(0, 0, 0, 500), (1, 0, 3, 333), (2, 2, 2, 1500)])
+def test_search_matches_brute_force(seed, start, finish, target):
+    """Test that a completed search finds the best courses there are"""
+    distances = random_distances(8, seed)
+    search = CourseSearch(distances, start, finish, target, 20, 250, min_legs=2, max_legs=5, top=4)
+    found = search.run(10)
+    assert search.complete
+    assert [abs(length - target) for length, _ in found] == \
+        brute_force(distances, start, finish, target, 20, 250, 2, 5)[:4]
+
+    for length, path in found:
+        assert path[0] == start and path[-1] == finish
+        assert 2 <= len(path) - 1 <= 5
+        lengths = [distances[a][b] for a, b in zip(path, path[1:])]
+        assert sum(lengths) == length
+        assert all(a != b for a, b in zip(path, path[1:]))
+        assert all(20 <= d <= 250 for d in lengths)
+
+def test_ties_prefer_fewer_legs():
+    """Test that equally close courses with fewer legs rank first"""
+    distances = [[0, 5, 5], [5, 0, 5], [5, 5, 0]]
+    found = CourseSearch(distances, 0, 0, 10, 1, 10, min_legs=2, max_legs=4, top=3).run(1)
+    assert [len(path) - 1 for _, path in found] == [2, 2, 3]
+    assert all(length == 10 or length == 15 for length, _ in found)
+
+def test_search_stops_at_budget():
+    """Test that a search too big for its budget stops and returns what it has"""
+    search = CourseSearch(random_distances(60, 3), 0, 0, 10 ** 6, 1, 10 ** 6, min_legs=2, max_legs=12, top=3)
+    found = search.run(0.01)
+    assert not search.complete
+    assert len(found) == 3
+
+def test_course_search_endpoint(client):
+    """Test searching zone 2 for a course from and back to 2L"""
+    response = client.post('/course/search', json={'start': '2L', 'target': 8, 'min_leg': 0.5, 'max_leg': 3,
+                                                   'top': 3})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['complete']
+    assert len(result['courses']) == 3
+
+    for course in result['courses']:
+        assert course['marks'][0] == course['marks'][-1] == '2L'
+        assert all(name.startswith('2') for name in course['marks'])
+        legs = course['legs']
+        assert [leg['from']['name'] for leg in legs] + [legs[-1]['to']['name']] == course['marks']
+        assert all(0.5 <= leg['distance'] <= 3 for leg in legs)
+        assert sum(leg['distance'] for leg in legs) == pytest.approx(course['distance'])
+        assert course['deviation'] == pytest.approx(abs(course['distance'] - 8))
+        assert 'error' not in course
+        # Same legs as /course gives for the marks
+        assert client.post('/course', json={'course': course['marks']}).get_json()['legs'] == legs
+
+def test_course_search_finish_zones_and_geodesy(client):
+    """Test a separate finish, other zones and the WGS-84 mode"""
+    result = client.post('/course/search', json={
+        'start': '2L', 'finish': '3SQ', 'target': 12, 'zones': ['2', '3'], 'max_legs': 4,
+        'geodesy': 'wgs84'}).get_json()
+    for course in result['courses']:
+        assert course['marks'][0] == '2L' and course['marks'][-1] == '3SQ'
+        assert len(course['legs']) <= 4
+        for leg in course['legs']:
+            assert leg['distance'] == app_module.REGISTRY.measure(leg['from']['name'], leg['to']['name'], 'wgs84')[1]
+
+@pytest.mark.parametrize('changes, error', [
+    ({'start': 'NOPE'}, 'Mark NOPE not found'),
+    ({'finish': 7}, 'Mark 7 not found'),
+    ({'target': 0}, 'target must be a positive distance in nm'),
+    ({'min_leg': 3, 'max_leg': 1}, 'Need numeric 0 <= min_leg <= max_leg'),
+    ({'max_legs': 11}, 'Need 1 <= min_legs <= max_legs <= 10'),
+    ({'min_legs': 2.5}, 'min_legs, max_legs and top must be integers'),
+    ({'top': 21}, 'top must be between 1 and 20'),
+    ({'zones': '2'}, 'zones must be a list of zone strings'),
+    ({'geodesy': 'flat'}, 'geodesy must be one of spherical, wgs84'),
+])
+def test_course_search_errors(client, changes, error):
+    """Test that invalid searches are rejected"""
+    response = client.post('/course/search', json=dict({'start': '2L', 'target': 8}, **changes))
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
@@ -0,0 +1,45 @@
+import math
+import random
+import numpy as np
+from app import REGISTRY, calculate_bearing, calculate_distance
+from geodesy import EARTH_RADIUS_NM, GeodesyEngine, batch_bearings, batch_distances
+
+def random_points(count, seed):
+    rng = random.Random(seed)
+    return [{'lat': rng.uniform(-80, 80), 'lon': rng.uniform(-180, 180)} for _ in range(count)]
+
+def test_engine_matches_scalar_functions_exactly():
+    """Test that vectorised results equal the scalar functions for every pair"""
+    points = random_points(150, seed=4) + [dict(m) for m in REGISTRY.marks[:50]]
+    engine = GeodesyEngine.from_marks(points)
+    n = len(points)
+    rows, cols = np.divmod(np.arange(n * n), n)
+    bearings, distances = engine.pairs(rows, cols)
+    for k in range(n * n):
+        mark1, mark2 = points[rows[k]], points[cols[k]]
+        assert bearings[k] == calculate_bearing(mark1, mark2)
+        assert distances[k] == calculate_distance(mark1, mark2)
+
+def test_engine_rounding_boundaries_use_scalar_result():
+    """Test that results landing on a rounding boundary match the scalar rounding"""
+    # Along the equator these land (to within float error) on half hundredths
+    # of a nautical mile, exactly where numpy and libm could round apart
+    points = [{'lat': 0.0, 'lon': 0.0}]
+    for hundredths in (3000.5, 1234.5, 7.5):
+        points.append({'lat': 0.0, 'lon': math.degrees(hundredths / 100 / EARTH_RADIUS_NM)})
+    engine = GeodesyEngine.from_marks(points)
+    for i, mark1 in enumerate(points):
+        for j, mark2 in enumerate(points):
+            assert engine.bearings([i], [j])[0] == calculate_bearing(mark1, mark2)
+            assert engine.distances([i], [j])[0] == calculate_distance(mark1, mark2)
+
+def test_batch_functions_take_coordinate_arrays():
+    """Test the coordinate-array helpers against the scalar functions"""
+    froms = random_points(200, seed=7)
+    tos = random_points(200, seed=8)
+    bearings = batch_bearings([p['lat'] for p in froms], [p['lon'] for p in froms],
+                              [p['lat'] for p in tos], [p['lon'] for p in tos])
+    distances = batch_distances([p['lat'] for p in froms], [p['lon'] for p in froms],
+                                [p['lat'] for p in tos], [p['lon'] for p in tos])
+    assert list(bearings) == [calculate_bearing(a, b) for a, b in zip(froms, tos)]
+    assert list(distances) == [calculate_distance(a, b) for a, b in zip(froms, tos)]
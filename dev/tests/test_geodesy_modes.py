@@ -0,0 +1,138 @@
+import math
+import numpy as np
+import pytest
+import app as app_module
+from app import app
+from geodesy import GeodesyEngine, PairMatrix, vincenty_inverse
+from marks import MarkRegistry, load_gpx_marks
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    app_module.COURSE_RESPONSES.clear()
+    with app.test_client() as client:
+        yield client
+
+def dms(degrees, minutes, seconds):
+    return math.copysign(abs(degrees) + minutes / 60 + seconds / 3600, degrees)
+
+def test_vincenty_reference_solution():
+    """Test Vincenty's inverse against the Flinders Peak to Buninyong reference"""
+    lat1, lon1 = dms(-37, 57, 3.72030), dms(144, 25, 29.52440)
+    lat2, lon2 = dms(-37, 39, 10.15610), dms(143, 55, 35.38390)
+    bearings, distances = vincenty_inverse(*np.radians([[lat1], [lon1], [lat2], [lon2]]))
+    assert distances[0] * 1852 == pytest.approx(54972.271, abs=0.001)
+    assert bearings[0] == pytest.approx(dms(306, 52, 5.37), abs=1e-5)
+
+def test_vincenty_degenerate_pairs():
+    """Test coincident, equatorial and nearly antipodal pairs"""
+    lat1 = np.radians([50.7, 0.0, 0.0, 0.5])
+    lon1 = np.radians([-1.3, 0.0, 0.0, 0.0])
+    lat2 = np.radians([50.7, 0.0, 0.0, -0.5])
+    lon2 = np.radians([-1.3, 1.0, 179.9, 179.7])
+    bearings, distances = vincenty_inverse(lat1, lon1, lat2, lon2)
+    assert distances[0] == 0
+    # One degree of longitude along the equator is a * pi / 180 metres
+    assert distances[1] * 1852 == pytest.approx(6378137.0 * math.pi / 180, rel=1e-9)
+    assert bearings[1] == pytest.approx(90)
+    assert np.all(np.isfinite(bearings)) and np.all(np.isfinite(distances))
+    assert np.all(distances[2:] > 10700)
+
+def test_engine_wgs84_matches_vincenty():
+    """Test that engine results in wgs84 mode are the rounded Vincenty values"""
+    marks = load_gpx_marks()[:40]
+    engine = GeodesyEngine.from_marks(marks)
+    rows, cols = np.meshgrid(np.arange(40), np.arange(40), indexing='ij')
+    lats = np.radians([m['lat'] for m in marks])
+    lons = np.radians([m['lon'] for m in marks])
+    raw_bearings, raw_distances = vincenty_inverse(lats[rows], lons[rows], lats[cols], lons[cols])
+
+    bearings, distances = engine.pairs(rows, cols, 'wgs84')
+    assert np.array_equal(bearings, np.rint(raw_bearings))
+    assert np.array_equal(engine.distance_hundredths(rows, cols, 'wgs84'), np.rint(raw_distances * 100))
+    assert np.allclose(distances, np.rint(raw_distances * 100) / 100)
+    assert np.array_equal(engine.bearings(rows, cols, 'wgs84'), bearings)
+
+def test_registry_modes_agree():
+    """Test that matrix and on-demand measurements agree in each mode"""
+    marks = load_gpx_marks()[:60]
+    spherical = MarkRegistry(marks)
+    wgs84 = MarkRegistry(marks, geodesy_mode='wgs84')
+    assert wgs84.pair_matrix.mode == 'wgs84'
+    names = [m['name'] for m in marks]
+    pairs = [(a, b) for a in names[:10] for b in names[-10:]]
+
+    for a, b in pairs:
+        assert spherical.measure(a, b, 'wgs84') == wgs84.measure(a, b)
+        assert wgs84.measure(a, b, 'spherical') == spherical.measure(a, b)
+    assert spherical.measure_many(pairs, 'wgs84') == wgs84.measure_many(pairs)
+    assert wgs84.measure_many(pairs, 'spherical') == spherical.measure_many(pairs)
+
+def test_registry_rejects_unknown_mode():
+    """Test that an unknown deployment geodesy mode fails at load"""
+    with pytest.raises(ValueError):
+        MarkRegistry([], geodesy_mode='flat')
+
+def test_pair_matrix_report_mode():
+    """Test that the pair matrix reports the mode it was built for"""
+    marks = load_gpx_marks()[:5]
+    assert PairMatrix(marks, mode='wgs84').report()['mode'] == 'wgs84'
+
+@pytest.mark.parametrize('path, body', [
+    ('/lookup/calculate', {'from_mark': '1A', 'to_mark': '3SQ'}),
+    ('/calculate', {'mark1': '1A', 'mark2': '3SQ'}),
+])
+def test_endpoints_accept_geodesy(client, path, body):
+    """Test that POST endpoints measure in the requested geodesy mode"""
+    spherical = client.post(path, json=body).get_json()
+    wgs84 = client.post(path, json=dict(body, geodesy='wgs84')).get_json()
+    assert spherical == client.post(path, json=dict(body, geodesy='spherical')).get_json()
+    assert (wgs84['bearing'], wgs84['distance']) == app_module.REGISTRY.measure('1A', '3SQ', 'wgs84')
+    assert wgs84['distance'] != spherical['distance']
+
+    response = client.post(path, json=dict(body, geodesy='flat'))
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'geodesy must be one of spherical, wgs84'}
+
+def test_batch_and_nearest_accept_geodesy(client):
+    """Test the geodesy option on batch lookups and nearest marks"""
+    pairs = [{'from_mark': '1A', 'to_mark': '3SQ'}]
+    result = client.post('/lookup/calculate/batch', json={'pairs': pairs, 'geodesy': 'wgs84'}).get_json()
+    assert (result['results'][0]['bearing'], result['results'][0]['distance']) == \
+        app_module.REGISTRY.measure('1A', '3SQ', 'wgs84')
+    assert client.post('/lookup/calculate/batch', json={'pairs': pairs, 'geodesy': 1}).status_code == 400
+
+    spherical = client.get('/marks/nearest?lat=50.6&lon=-1.5&k=3').get_json()['marks']
+    wgs84 = client.get('/marks/nearest?lat=50.6&lon=-1.5&k=3&geodesy=wgs84').get_json()['marks']
+    assert [m['name'] for m in wgs84] == [m['name'] for m in spherical]
+    assert [m['distance'] for m in wgs84] != [m['distance'] for m in spherical]
+    assert client.get('/marks/nearest?lat=50.6&lon=-1.5&geodesy=flat').status_code == 400
+
+def test_course_cache_separates_modes(client):
+    """Test that cached courses are keyed on the geodesy mode"""
+    course = ['1A', '3SQ', '1B']
+    spherical = client.post('/course', json={'course': course}).get_json()
+    wgs84 = client.post('/course', json={'course': course, 'geodesy': 'wgs84'}).get_json()
+    assert wgs84 != spherical
+    assert wgs84['legs'][0]['distance'] == app_module.REGISTRY.measure('1A', '3SQ', 'wgs84')[1]
+    assert len(app_module.COURSE_RESPONSES) == 2
+
+def test_course_legs_measured_in_one_call(client, monkeypatch):
+    """Test that a course's legs come from one measure_many() call, exactly as measure() gives them"""
+    registry = app_module.REGISTRY
+    course = [mark['name'] for mark in registry.marks[:12]]
+    expected = [registry.measure(a, b, 'wgs84') for a, b in zip(course, course[1:])]
+    calls = []
+    measure_many = registry.measure_many
+
+    def counted(pairs, mode=None):
+        calls.append(pairs)
+        return measure_many(pairs, mode)
+    monkeypatch.setattr(registry, 'measure_many', counted)
+    monkeypatch.setattr(registry, 'measure', None)
+    app_module.COURSE_RESPONSES.clear()
+
+    legs = client.post('/course', json={'course': course, 'geodesy': 'wgs84'}).get_json()['legs']
+    assert [(leg['bearing'], leg['distance']) for leg in legs] == expected
+    assert len(calls) == 1
@@ -0,0 +1,67 @@
+import tracemalloc
+import xml.etree.ElementTree as ET
+from marks import iter_gpx_marks, load_gpx_marks
+
+GPX_HEADER = ("<?xml version='1.0' encoding='UTF-8'?>\n"
+              '<ns0:gpx xmlns:ns0="http://www.topografix.com/GPX/1/1" version="1.1">\n')
+GPX_FOOTER = '</ns0:gpx>\n'
+
+def write_gpx(path, waypoints):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(GPX_HEADER)
+        for wpt in waypoints:
+            f.write(wpt)
+        f.write(GPX_FOOTER)
+    return path
+
+def dom_marks(path):
+    """Reference implementation: the original full-DOM loader"""
+    ns = {'gpx': 'http://www.topografix.com/GPX/1/1'}
+    marks = []
+    for wpt in ET.parse(path).getroot().findall('.//gpx:wpt', ns):
+        if wpt.get('lat') is None or wpt.get('lon') is None:
+            continue
+        texts = {}
+        for key, tag in (('name', 'gpx:name'), ('description', 'gpx:desc'), ('symbol', 'gpx:sym')):
+            elem = wpt.find(tag, ns)
+            texts[key] = elem.text.strip() if elem is not None and elem.text is not None else ''
+        marks.append({**texts, 'lat': float(wpt.get('lat')), 'lon': float(wpt.get('lon'))})
+    return marks
+
+def test_streaming_loader_matches_dom_loader():
+    """Test that the streaming loader reads 2025scra.gpx exactly like the DOM loader"""
+    assert load_gpx_marks() == dom_marks('2025scra.gpx')
+
+def test_streaming_loader_trimming_rules(tmp_path):
+    """Test name/desc/sym trimming and skipping of waypoints without coordinates"""
+    path = write_gpx(tmp_path / 'marks.gpx', [
+        '<ns0:wpt lat="50.1" lon="-1.2"><ns0:name> 2A </ns0:name>'
+        '<ns0:sym>R</ns0:sym><ns0:desc>\n  Ryde  \n</ns0:desc></ns0:wpt>\n',
+        '<ns0:wpt lat="50.2"><ns0:name>2B</ns0:name></ns0:wpt>\n',
+        '<ns0:wpt lat="50.3" lon="-1.3"><ns0:name>2C</ns0:name><ns0:desc/></ns0:wpt>\n',
+    ])
+    marks = list(iter_gpx_marks(path))
+    assert marks == dom_marks(path)
+    assert marks == [
+        {'name': '2A', 'description': 'Ryde', 'symbol': 'R', 'lat': 50.1, 'lon': -1.2},
+        {'name': '2C', 'description': '', 'symbol': '', 'lat': 50.3, 'lon': -1.3},
+    ]
+
+def test_streaming_loader_memory_stays_flat(tmp_path):
+    """Test that peak memory doesn't grow with the number of waypoints"""
+    def peak_for(count):
+        path = write_gpx(tmp_path / f'{count}.gpx', (
+            f'<ns0:wpt lat="50.{i:06d}" lon="-1.{i:06d}"><ns0:name>{i % 10}{i:06d}</ns0:name>'
+            f'<ns0:sym>Y</ns0:sym><ns0:desc>Synthetic mark {i}</ns0:desc></ns0:wpt>\n'
+            for i in range(count)))
+        tracemalloc.start()
+        try:
+            for _ in iter_gpx_marks(path):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    small = peak_for(1000)
+    large = peak_for(20000)
+    assert large < small * 2
@@ -0,0 +1,90 @@
+import pytest
+from app import app, REGISTRY, calculate_bearing, calculate_distance
+from marks import MarkRegistry
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def test_batch_returns_results_in_order(client):
+    """Test that each pair gets its bearing and distance, in request order"""
+    marks = REGISTRY.marks
+    pairs = [{'from_mark': marks[i]['name'], 'to_mark': marks[j]['name']}
+             for i, j in [(0, 1), (5, 2), (3, 3), (1, 0)]]
+    response = client.post('/lookup/calculate/batch', json={'pairs': pairs})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert len(results) == len(pairs)
+    for pair, result in zip(pairs, results):
+        mark1 = REGISTRY.get(pair['from_mark'])
+        mark2 = REGISTRY.get(pair['to_mark'])
+        assert result['from_mark'] == pair['from_mark']
+        assert result['to_mark'] == pair['to_mark']
+        assert result['bearing'] == calculate_bearing(mark1, mark2)
+        assert result['distance'] == calculate_distance(mark1, mark2)
+
+def test_batch_reports_per_item_errors(client):
+    """Test that unknown or missing marks fail only their own item"""
+    name = REGISTRY.marks[0]['name']
+    pairs = [
+        {'from_mark': name, 'to_mark': 'InvalidMark'},
+        {'from_mark': name},
+        {'from_mark': name, 'to_mark': REGISTRY.marks[1]['name']},
+    ]
+    response = client.post('/lookup/calculate/batch', json={'pairs': pairs})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0]['error'] == 'One or both marks not found'
+    assert results[1]['error'] == 'Both from_mark and to_mark are required'
+    assert 'error' not in results[2]
+    assert 'bearing' in results[2]
+
+def test_batch_non_string_names_fail_their_own_item(client):
+    """Test that a name that isn't a string fails only its own item"""
+    name = REGISTRY.marks[0]['name']
+    pairs = [
+        {'from_mark': [name], 'to_mark': name},
+        {'from_mark': name, 'to_mark': {'name': name}},
+        {'from_mark': name, 'to_mark': REGISTRY.marks[1]['name']},
+    ]
+    response = client.post('/lookup/calculate/batch', json={'pairs': pairs})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0]['error'] == 'One or both marks not found'
+    assert results[1]['error'] == 'One or both marks not found'
+    assert 'bearing' in results[2]
+
+def test_batch_requires_pairs(client):
+    """Test that an empty or missing pair list is rejected"""
+    assert client.post('/lookup/calculate/batch', json={}).status_code == 400
+    assert client.post('/lookup/calculate/batch', json={'pairs': []}).status_code == 400
+    for body in ([1, 2], 'pairs', None):
+        response = client.post('/lookup/calculate/batch', json=body)
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'A non-empty list of pairs is required'}
+    response = client.post('/lookup/calculate/batch', data='not json', content_type='application/json')
+    assert response.status_code == 400
+
+def test_batch_size_limit(client):
+    """Test that batches over the configured maximum are rejected"""
+    name = REGISTRY.marks[0]['name']
+    original = app.config['LOOKUP_BATCH_MAX_PAIRS']
+    app.config['LOOKUP_BATCH_MAX_PAIRS'] = 2
+    try:
+        pairs = [{'from_mark': name, 'to_mark': name}] * 3
+        response = client.post('/lookup/calculate/batch', json={'pairs': pairs})
+        assert response.status_code == 413
+        assert 'error' in response.get_json()
+    finally:
+        app.config['LOOKUP_BATCH_MAX_PAIRS'] = original
+
+def test_measure_many_without_matrix():
+    """Test that registries without a pair matrix evaluate the batch with the engine"""
+    registry = MarkRegistry(REGISTRY.marks, pair_matrix_max_marks=0)
+    names = [(m1['name'], m2['name']) for m1 in REGISTRY.marks[:10] for m2 in REGISTRY.marks[:10]]
+    names.append(('InvalidMark', REGISTRY.marks[0]['name']))
+    assert registry.measure_many(names) == REGISTRY.measure_many(names)
+    assert registry.measure_many(names)[-1] is None
@@ -0,0 +1,41 @@
+import pytest
+import marks as marks_module
+from app import app, load_gpx_marks, REGISTRY
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def test_dataset_matches_gpx_file():
+    """Test that the shared dataset holds the same marks as a fresh GPX parse"""
+    assert [dict(m) for m in REGISTRY.marks] == load_gpx_marks()
+
+def test_dataset_is_read_only():
+    """Test that marks in the shared dataset cannot be modified in place"""
+    mark = REGISTRY.marks[0]
+    with pytest.raises(TypeError):
+        mark['name'] = 'changed'
+    with pytest.raises(TypeError):
+        mark.update({'lat': 0.0})
+
+    # Copies are ordinary dicts
+    copy = mark.copy()
+    copy['rounding'] = 'P'
+    assert 'rounding' not in mark
+
+def test_routes_do_not_reparse_gpx(client, monkeypatch):
+    """Test that requests are served from the dataset without touching the GPX file"""
+    def fail(*args, **kwargs):
+        raise AssertionError('GPX file parsed during a request')
+    monkeypatch.setattr(marks_module.ET, 'parse', fail)
+    monkeypatch.setattr(marks_module.ET, 'iterparse', fail)
+
+    assert client.get('/marks?zones=1').status_code == 200
+    assert client.get('/lookup').status_code == 200
+    assert client.get('/course').status_code == 200
+    response = client.post('/lookup/calculate',
+                           json={'from_mark': REGISTRY.marks[0]['name'], 'to_mark': REGISTRY.marks[1]['name']})
+    assert response.status_code == 200
@@ -0,0 +1,35 @@
+from app import REGISTRY, load_gpx_marks, get_available_zones, get_marks_by_zone
+from marks import MarkRegistry
+
+def test_registry_zones_match_available_zones():
+    """Test that the registry zone list matches the scanning helper"""
+    assert REGISTRY.zones == get_available_zones(load_gpx_marks())
+
+def test_registry_name_lookup():
+    """Test that every mark resolves by name to the same mark"""
+    for mark in load_gpx_marks():
+        assert mark['name'] in REGISTRY
+        assert REGISTRY.get(mark['name']) == mark
+    assert REGISTRY.get('InvalidMark') is None
+    assert 'InvalidMark' not in REGISTRY
+    for name in (['1A'], {'name': '1A'}, None, 1):
+        assert REGISTRY.get(name) is None
+        assert REGISTRY.position(name) is None
+        assert name not in REGISTRY
+
+def test_registry_zone_buckets_keep_file_order():
+    """Test that zone queries return the same marks, in the same order, as a scan"""
+    marks = load_gpx_marks()
+    for zones in (['2'], ['1', '2'], ['0', '2', '7'], REGISTRY.zones):
+        assert REGISTRY.marks_in_zones(zones) == get_marks_by_zone(marks, zones)
+    assert REGISTRY.marks_in_zones([]) == []
+    assert REGISTRY.marks_in_zones(['X']) == []
+
+def test_registry_first_duplicate_name_wins():
+    """Test that duplicate names resolve to the first mark, like the old linear scan"""
+    registry = MarkRegistry([
+        {'name': '1A', 'description': 'first', 'symbol': '', 'lat': 50.0, 'lon': -1.0},
+        {'name': '1A', 'description': 'second', 'symbol': '', 'lat': 50.1, 'lon': -1.1},
+    ])
+    assert len(registry) == 2
+    assert registry.get('1A')['description'] == 'first'
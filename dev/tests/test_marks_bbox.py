@@ -0,0 +1,84 @@
+import random
+import pytest
+import app as app_module
+from app import app
+from spatial import SpatialIndex
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def brute_force(lats, lons, south, west, north, east):
+    def lon_inside(lon):
+        return west <= lon <= east if west <= east else lon >= west or lon <= east
+    return [i for i, (lat, lon) in enumerate(zip(lats, lons))
+            if south <= lat <= north and lon_inside(lon)]
+
+@pytest.mark.parametrize('region', [
+    (50.55, 50.85, -1.95, -0.95),    # Solent
+    (-5.0, 5.0, 170.0, 190.0),       # across the antimeridian
+])
+def test_within_matches_brute_force(region):
+    """Test that bounding box queries return exactly the marks inside the box"""
+    rng = random.Random(3)
+    south, north, west, east = region
+    lats = [rng.uniform(south, north) for _ in range(3000)]
+    lons = [(rng.uniform(west, east) + 180) % 360 - 180 for _ in range(3000)]
+    index = SpatialIndex(lats, lons, leaf_size=8)
+
+    for _ in range(50):
+        box_south, box_north = sorted(rng.uniform(south, north) for _ in range(2))
+        box_west, box_east = ((rng.uniform(west, east) + 180) % 360 - 180 for _ in range(2))
+        assert index.within(box_south, box_west, box_north, box_east) == brute_force(
+            lats, lons, box_south, box_west, box_north, box_east)
+
+def test_within_edges():
+    """Test inclusive bounds, empty results and empty indexes"""
+    index = SpatialIndex([50.0, 51.0, 52.0], [-1.0, 0.0, 1.0])
+    assert index.within(50.0, -1.0, 51.0, 0.0) == [0, 1]
+    assert index.within(60.0, -1.0, 61.0, 0.0) == []
+    assert index.within(-90.0, 0.5, 90.0, -0.5) == [0, 2]
+    assert SpatialIndex([], []).within(-90, -180, 90, 180) == []
+
+def test_bbox_endpoint_compact_rows(client):
+    """Test that /marks/bbox returns the marks in the box as compact rows"""
+    response = client.get('/marks/bbox?south=50.7&west=-1.4&north=50.8&east=-1.2')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['fields'] == ['name', 'lat', 'lon', 'symbol', 'description']
+    assert data['version'] == app_module.REGISTRY.version
+    assert data['truncated'] is False
+
+    expected = [mark for mark in app_module.REGISTRY.marks
+                if 50.7 <= mark['lat'] <= 50.8 and -1.4 <= mark['lon'] <= -1.2]
+    assert expected
+    assert data['marks'] == [[mark[field] for field in data['fields']] for mark in expected]
+
+def test_bbox_endpoint_zones(client):
+    """Test that zones restrict the marks returned from the viewport"""
+    data = client.get('/marks/bbox?south=-90&west=-180&north=90&east=180&zones=2,3').get_json()
+    names = [row[0] for row in data['marks']]
+    assert names == [mark['name'] for mark in app_module.REGISTRY.marks_in_zones(['2', '3'])]
+
+def test_bbox_endpoint_truncates(client, monkeypatch):
+    """Test that large viewports are capped and flagged as truncated"""
+    monkeypatch.setitem(app.config, 'BBOX_MAX_MARKS', 10)
+    data = client.get('/marks/bbox?south=-90&west=-180&north=90&east=180').get_json()
+    assert len(data['marks']) == 10
+    assert data['truncated'] is True
+
+@pytest.mark.parametrize('query', [
+    'south=50.7&west=-1.4&north=50.8',
+    'south=a&west=-1.4&north=50.8&east=-1.2',
+    'south=50.9&west=-1.4&north=50.8&east=-1.2',
+    'south=-91&west=-1.4&north=50.8&east=-1.2',
+    'south=50.7&west=-1.4&north=50.8&east=200',
+])
+def test_bbox_endpoint_validation(client, query):
+    """Test that missing or invalid bounds are rejected"""
+    response = client.get(f'/marks/bbox?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,43 @@
+import re
+import pytest
+from app import app, REGISTRY
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def bundle_url(html):
+    match = re.search(r"const marksBundleUrl = '([^']+)'", html)
+    assert match, 'page does not reference the marks bundle'
+    return match.group(1)
+
+@pytest.mark.parametrize('path', ['/lookup', '/course'])
+def test_pages_reference_versioned_bundle(client, path):
+    """Test that pages load marks from the content-hashed bundle, not /marks"""
+    html = client.get(path).get_data(as_text=True)
+    assert bundle_url(html) == f'/static/marks.{REGISTRY.version}.json'
+    assert "fetch('/marks')" not in html
+    assert 'fetch(`/marks?zones=' not in html
+    assert 'marksInZones' in html
+
+def test_bundle_holds_all_marks(client):
+    """Test that the bundle has every mark and the zone list"""
+    response = client.get(f'/static/marks.{REGISTRY.version}.json')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data == client.get('/marks').get_json()
+    assert len(data['marks']) == len(REGISTRY)
+
+def test_bundle_is_immutable(client):
+    """Test that the bundle may be cached forever without revalidation"""
+    response = client.get(f'/static/marks.{REGISTRY.version}.json')
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 31536000
+    assert not response.cache_control.must_revalidate
+
+def test_bundle_unknown_version_not_found(client):
+    """Test that only the current dataset version is served"""
+    assert client.get('/static/marks.0123456789abcdef.json').status_code == 404
@@ -0,0 +1,125 @@
+import pytest
+from app import app, REGISTRY
+from marks import MarkRegistry
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def test_marks_sends_validators(client):
+    """Test that /marks carries a strong ETag, Last-Modified and Cache-Control"""
+    response = client.get('/marks?zones=1,2')
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert etag.startswith(REGISTRY.version)
+    assert not weak
+    assert response.last_modified == REGISTRY.last_modified
+    assert response.cache_control.public
+    assert response.cache_control.must_revalidate
+    assert response.cache_control.max_age == app.config['MARKS_MAX_AGE']
+
+def test_marks_etag_is_canonical_per_zone_set(client):
+    """Test that zone order and duplicates don't change the ETag, but the set does"""
+    etag = client.get('/marks?zones=2,1').headers['ETag']
+    assert client.get('/marks?zones=1,2,2').headers['ETag'] == etag
+    assert client.get('/marks?zones=1').headers['ETag'] != etag
+    assert client.get('/marks').headers['ETag'] != etag
+
+def test_marks_if_none_match_returns_304(client):
+    """Test that a matching If-None-Match gets an empty 304"""
+    etag = client.get('/marks?zones=3').headers['ETag']
+    response = client.get('/marks?zones=3', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    # Weakened by a compressing proxy still matches
+    response = client.get('/marks?zones=3', headers={'If-None-Match': 'W/' + etag})
+    assert response.status_code == 304
+
+    response = client.get('/marks?zones=3', headers={'If-None-Match': '"stale"'})
+    assert response.status_code == 200
+
+def test_marks_304_does_not_rebuild_evicted_payload(client, monkeypatch):
+    """Test that a revalidation after eviction is answered from the validators alone"""
+    import app as app_module
+    etag = client.get('/marks?zones=4', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    assert etag.endswith('-gz"')
+    app_module.MARKS_PAYLOADS.clear()
+
+    def fail(zone_key):
+        raise AssertionError('payload rebuilt for a 304')
+    monkeypatch.setattr(app_module, 'marks_payload', fail)
+
+    response = client.get('/marks?zones=4', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+def test_marks_if_modified_since(client):
+    """Test Last-Modified revalidation when no ETag is sent"""
+    last_modified = client.get('/marks').headers['Last-Modified']
+    response = client.get('/marks', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+    response = client.get('/marks', headers={'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'})
+    assert response.status_code == 200
+
+def test_registry_version_follows_content():
+    """Test that the dataset version changes with the marks and only with them"""
+    marks = [dict(m) for m in REGISTRY.marks]
+    assert MarkRegistry(marks).version == REGISTRY.version
+    marks[0]['description'] = 'Changed'
+    assert MarkRegistry(marks).version != REGISTRY.version
+
+def test_marks_precompressed_variants(client):
+    """Test that gzip and brotli clients get the matching precompressed body"""
+    import gzip
+    import json
+    plain = client.get('/marks?zones=2')
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+    assert 'Content-Encoding' not in plain.headers
+
+    response = client.get('/marks?zones=2', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == plain.data
+    assert response.headers['ETag'] != plain.headers['ETag']
+
+    # Each encoding revalidates against its own ETag
+    revalidated = client.get('/marks?zones=2', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+    brotli = pytest.importorskip('brotli')
+    response = client.get('/marks?zones=2', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.data)) == plain.get_json()
+
+def test_marks_payloads_are_cached_per_canonical_zone_set(client):
+    """Test that equivalent zone queries share one cached payload"""
+    import app as app_module
+    app_module.MARKS_PAYLOADS.clear()
+    client.get('/marks?zones=2,1')
+    client.get('/marks?zones=1,2,2')
+    client.get('/marks?zones=1,X,2')
+    assert len(app_module.MARKS_PAYLOADS) == 1
+    assert app_module.MARKS_PAYLOADS.get(('1', '2')) is not None
+
+def test_marks_payload_cache_is_bounded_and_versioned(client, monkeypatch):
+    """Test that the cache evicts past its size and empties on a new dataset"""
+    import app as app_module
+    monkeypatch.setattr(app_module.MARKS_PAYLOADS, 'maxsize', 2)
+    for zones in ('1', '2', '3'):
+        client.get(f'/marks?zones={zones}')
+    assert len(app_module.MARKS_PAYLOADS) == 2
+    assert app_module.MARKS_PAYLOADS.get(('1',)) is None
+
+    marks = [dict(m) for m in REGISTRY.marks]
+    marks[0]['description'] = 'Changed'
+    monkeypatch.setattr(app_module, 'REGISTRY', MarkRegistry(marks))
+    response = client.get('/marks?zones=1')
+    assert len(app_module.MARKS_PAYLOADS) == 1
+    assert response.get_json()['marks'][0]['description'] == 'Changed'
+    assert response.headers['ETag'].strip('"').startswith(app_module.REGISTRY.version)
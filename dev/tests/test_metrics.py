@@ -0,0 +1,101 @@
+import multiprocessing
+import re
+import pytest
+import app as app_module
+from app import app
+from metrics import MetricsRegistry
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def sample(text, name, **labels):
+    """Value of one sample in Prometheus text output"""
+    series = name
+    if labels:
+        series += '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+    match = re.search(rf'^{re.escape(series)} (\S+)$', text, re.MULTILINE)
+    assert match, f'{series} not found'
+    return float(match.group(1))
+
+def metrics_text(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    return response.get_data(as_text=True)
+
+def test_request_counts_by_route_and_status(client):
+    """Test that requests are counted per route and status class"""
+    before = metrics_text(client)
+    client.post('/lookup/calculate', json={'from_mark': '1A', 'to_mark': '1B'})
+    client.post('/lookup/calculate', json={'from_mark': 'NOPE', 'to_mark': '1B'})
+    client.get('/no-such-page')
+    after = metrics_text(client)
+
+    route = {'route': '/lookup/calculate', 'endpoint': 'lookup_calculate'}
+    for status, added in (('2xx', 1), ('4xx', 1), ('5xx', 0)):
+        name = 'solent_http_requests_total'
+        assert sample(after, name, **route, status=status) == sample(before, name, **route, status=status) + added
+
+    unmatched = {'route': '<unmatched>', 'endpoint': '', 'status': '4xx'}
+    assert (sample(after, 'solent_http_requests_total', **unmatched)
+            == sample(before, 'solent_http_requests_total', **unmatched) + 1)
+
+def test_latency_and_size_histograms(client):
+    """Test that latency and response size histograms are cumulative and consistent"""
+    client.get('/marks')
+    text = metrics_text(client)
+    route = {'route': '/marks', 'endpoint': 'get_marks'}
+
+    for name in ('solent_http_request_duration_seconds', 'solent_http_response_size_bytes'):
+        buckets = [float(value) for value in re.findall(
+            rf'^{name}_bucket{{route="/marks",endpoint="get_marks",le="[^"]+"}} (\S+)$', text, re.MULTILINE)]
+        assert buckets == sorted(buckets)
+        assert buckets[-1] == sample(text, f'{name}_count', **route) >= 1
+        assert sample(text, f'{name}_sum', **route) > 0
+
+def test_template_render_and_dataset_metrics(client):
+    """Test that template renders and dataset loading are timed"""
+    app_module.HTML_PAGES.clear()
+    client.get('/privacy')
+    text = metrics_text(client)
+
+    assert sample(text, 'solent_template_render_seconds_count', template='privacy.html') >= 1
+    assert sample(text, 'solent_dataset_marks') == len(app_module.REGISTRY)
+    assert sample(text, 'solent_dataset_load_seconds') > 0
+
+def _observe_in_child(registry):
+    registry.observe_request('route', 200, 0.002, 512)
+
+def test_metrics_shared_across_forked_workers():
+    """Test that requests recorded in forked workers show up in every process"""
+    registry = MetricsRegistry([('route', '/route')], [])
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_observe_in_child, args=(registry,)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    registry.observe_request('route', 503, 0.2, None)
+    text = registry.render()
+    route = {'route': '/route', 'endpoint': 'route'}
+    assert sample(text, 'solent_http_requests_total', **route, status='2xx') == 3
+    assert sample(text, 'solent_http_requests_total', **route, status='5xx') == 1
+    assert sample(text, 'solent_http_request_duration_seconds_bucket', **route, le='0.0025') == 3
+    assert sample(text, 'solent_http_request_duration_seconds_count', **route) == 4
+    # The 5xx response had no known size
+    assert sample(text, 'solent_http_response_size_bytes_count', **route) == 3
+
+def test_metrics_only_for_allowed_networks(client):
+    """Test that /metrics answers loopback and private addresses but not public ones"""
+    for address in ('127.0.0.1', '::1', '10.1.2.3', '172.18.0.5', '192.168.1.20'):
+        assert client.get('/metrics', environ_base={'REMOTE_ADDR': address}).status_code == 200
+    for address in ('203.0.113.7', '2001:db8::1', '172.32.0.1', ''):
+        response = client.get('/metrics', environ_base={'REMOTE_ADDR': address})
+        assert response.status_code == 403
+        assert 'solent_' not in response.get_data(as_text=True)
@@ -0,0 +1,106 @@
+import math
+import random
+import pytest
+import app as app_module
+from app import app
+from geodesy import calculate_bearing, calculate_distance
+from marks import MarkRegistry
+from spatial import SpatialIndex
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def central_angle(lat1, lon1, lat2, lon2):
+    """Unrounded haversine central angle, for brute-force comparison"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * math.asin(math.sqrt(min(1.0, a)))
+
+def brute_force(lats, lons, lat, lon, k):
+    angles = [central_angle(lat, lon, la, lo) for la, lo in zip(lats, lons)]
+    return sorted(range(len(lats)), key=lambda i: angles[i])[:k]
+
+@pytest.mark.parametrize('region', [
+    (50.55, 50.85, -1.95, -0.95),    # Solent
+    (-5.0, 5.0, 170.0, 190.0),       # across the antimeridian
+    (85.0, 90.0, -180.0, 180.0),     # around the pole
+])
+def test_index_matches_brute_force(region):
+    """Test that the k-d tree returns the same marks as a full haversine scan"""
+    rng = random.Random(7)
+    south, north, west, east = region
+    lats = [rng.uniform(south, north) for _ in range(3000)]
+    lons = [(rng.uniform(west, east) + 180) % 360 - 180 for _ in range(3000)]
+    index = SpatialIndex(lats, lons, leaf_size=8)
+
+    for _ in range(50):
+        lat = rng.uniform(south, north)
+        lon = (rng.uniform(west, east) + 180) % 360 - 180
+        k = rng.randint(1, 12)
+        found = index.nearest(lat, lon, k)
+        expected = brute_force(lats, lons, lat, lon, k)
+        # Same distances (the order of exact ties may differ)
+        assert [central_angle(lat, lon, lats[i], lons[i]) for i in found] == pytest.approx(
+            [central_angle(lat, lon, lats[i], lons[i]) for i in expected], abs=1e-12)
+
+def test_index_edge_cases():
+    """Test that k beyond the dataset, duplicates and empty indexes are handled"""
+    index = SpatialIndex([50.0, 50.0, 51.0], [-1.0, -1.0, -1.0])
+    assert index.nearest(50.0, -1.0, 10) == [0, 1, 2]
+    assert index.nearest(50.0, -1.0, 0) == []
+    assert SpatialIndex([], []).nearest(50.0, -1.0, 3) == []
+
+def test_registry_nearest_uses_project_conventions():
+    """Test that registry results carry calculate_bearing/calculate_distance values"""
+    registry = app_module.REGISTRY
+    position = {'lat': 50.76, 'lon': -1.29}
+    results = registry.nearest(position['lat'], position['lon'], 5)
+    assert len(results) == 5
+    distances = [distance for _, _, distance in results]
+    assert distances == sorted(distances)
+    for mark, bearing, distance in results:
+        assert bearing == calculate_bearing(position, mark)
+        assert distance == calculate_distance(position, mark)
+
+    nearest_mark = results[0][0]
+    closest = min(registry.marks, key=lambda m: central_angle(50.76, -1.29, m['lat'], m['lon']))
+    assert nearest_mark['name'] == closest['name']
+
+def test_registry_nearest_small_registry():
+    """Test nearest() on a registry without enough marks to fill k"""
+    registry = MarkRegistry([{'name': '1A', 'description': '', 'symbol': '', 'lat': 50.7, 'lon': -1.3}])
+    assert [mark['name'] for mark, _, _ in registry.nearest(50.0, -1.0, 5)] == ['1A']
+
+def test_nearest_endpoint(client):
+    """Test the /marks/nearest endpoint"""
+    response = client.get('/marks/nearest?lat=50.76&lon=-1.29&k=3')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['lat'] == 50.76 and data['lon'] == -1.29
+    assert len(data['marks']) == 3
+    first = data['marks'][0]
+    assert set(first) == {'name', 'description', 'symbol', 'lat', 'lon', 'bearing', 'distance'}
+    assert first['distance'] == calculate_distance({'lat': 50.76, 'lon': -1.29}, first)
+
+    assert len(client.get('/marks/nearest?lat=50.76&lon=-1.29').get_json()['marks']) == 5
+
+@pytest.mark.parametrize('query', [
+    'lon=-1.29',
+    'lat=north&lon=-1.29',
+    'lat=50.76&lon=-1.29&k=two',
+    'lat=95&lon=-1.29',
+    'lat=50.76&lon=-181',
+    'lat=nan&lon=-1.29',
+    'lat=50.76&lon=-1.29&k=0',
+    'lat=50.76&lon=-1.29&k=51',
+])
+def test_nearest_endpoint_validation(client, query):
+    """Test that bad positions and k values are rejected"""
+    response = client.get(f'/marks/nearest?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,53 @@
+import gzip
+import pytest
+import app as app_module
+from app import app
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+@pytest.mark.parametrize('path', ['/lookup', '/course'])
+def test_page_rendered_once(client, monkeypatch, path):
+    """Test that repeat page views are served without re-rendering the template"""
+    first = client.get(path)
+    assert first.status_code == 200
+
+    def fail(*args, **kwargs):
+        raise AssertionError('template rendered again')
+    monkeypatch.setattr(app_module, 'render_template', fail)
+
+    second = client.get(path)
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+
+@pytest.mark.parametrize('path', ['/lookup', '/course'])
+def test_page_revalidation_and_compression(client, path):
+    """Test ETag revalidation and precompressed variants of cached pages"""
+    response = client.get(path)
+    assert response.mimetype == 'text/html'
+    assert response.cache_control.must_revalidate
+
+    revalidated = client.get(path, headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+    compressed = client.get(path, headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == response.data
+
+def test_lookup_cache_keyed_on_umami_settings(client, monkeypatch):
+    """Test that changing the analytics settings renders a new page"""
+    monkeypatch.delenv('UMAMI_WEBSITE_ID', raising=False)
+    monkeypatch.delenv('UMAMI_SCRIPT_URL', raising=False)
+    without = client.get('/lookup')
+    assert b'data-website-id' not in without.data
+
+    monkeypatch.setenv('UMAMI_WEBSITE_ID', 'site-123')
+    monkeypatch.setenv('UMAMI_SCRIPT_URL', 'https://analytics.example.com/script.js')
+    with_umami = client.get('/lookup')
+    assert b'data-website-id="site-123"' in with_umami.data
+    assert with_umami.headers['ETag'] != without.headers['ETag']
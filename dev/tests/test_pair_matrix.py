@@ -0,0 +1,39 @@
+from app import REGISTRY, app, calculate_bearing, calculate_distance
+from marks import MarkRegistry
+
+def test_pair_matrix_matches_scalar_functions():
+    """Test that every precomputed pair equals the scalar calculation exactly"""
+    matrix = REGISTRY.pair_matrix
+    assert matrix is not None
+    marks = REGISTRY.marks
+    for i, mark1 in enumerate(marks):
+        for j, mark2 in enumerate(marks):
+            assert matrix.bearing(i, j) == calculate_bearing(mark1, mark2)
+            assert matrix.distance(i, j) == calculate_distance(mark1, mark2)
+
+def test_pair_matrix_report():
+    """Test that the matrix reports its size and build cost"""
+    report = REGISTRY.pair_matrix.report()
+    assert report['marks'] == len(REGISTRY)
+    assert report['pairs'] == len(REGISTRY) ** 2
+    assert report['bytes'] >= 6 * report['pairs']
+    assert report['build_seconds'] >= 0
+
+def test_registry_without_matrix_computes_on_demand():
+    """Test that registries over the size limit fall back to scalar calculation"""
+    registry = MarkRegistry(REGISTRY.marks, pair_matrix_max_marks=10)
+    assert registry.pair_matrix is None
+    first, second = REGISTRY.marks[0], REGISTRY.marks[-1]
+    assert registry.measure(first['name'], second['name']) == (
+        calculate_bearing(first, second), calculate_distance(first, second))
+
+def test_lookup_calculate_uses_matrix_values():
+    """Test that the lookup endpoint returns the same values as the scalar functions"""
+    app.config['TESTING'] = True
+    first, second = REGISTRY.marks[3], REGISTRY.marks[42]
+    with app.test_client() as client:
+        response = client.post('/lookup/calculate',
+                               json={'from_mark': first['name'], 'to_mark': second['name']})
+    data = response.get_json()
+    assert data['bearing'] == calculate_bearing(first, second)
+    assert data['distance'] == calculate_distance(first, second)
@@ -0,0 +1,91 @@
+import os
+import pstats
+import pytest
+from flask import Flask, jsonify, render_template_string
+from geodesy import calculate_distance
+from profiling import PROFILE_HEADER, RequestProfiler
+
+def make_app(profiler):
+    """Small app whose only route does some geodesy and renders a template"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    profiler.install(app)
+
+    @app.route('/work')
+    def work():
+        mark1 = {'lat': 50.7, 'lon': -1.3}
+        mark2 = {'lat': 50.8, 'lon': -1.2}
+        total = sum(calculate_distance(mark1, mark2) for _ in range(2000))
+        return jsonify({'total': total, 'html': render_template_string('{{ total }}', total=total)})
+
+    return app
+
+def spooled(directory):
+    return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+def test_disabled_profiler_registers_nothing(tmp_path):
+    """Test that a disabled profiler adds no request hooks and no-op blocks"""
+    profiler = RequestProfiler(str(tmp_path / 'spool'))
+    assert not profiler.enabled
+    app = make_app(profiler)
+    assert not app.before_request_funcs and not app.after_request_funcs
+
+    with profiler.profile_block('startup'):
+        pass
+    response = app.test_client().get('/work', headers={PROFILE_HEADER: ''})
+    assert 'X-Profile-Id' not in response.headers
+    assert spooled(str(tmp_path / 'spool')) == []
+
+def test_secret_header_profiles_request(tmp_path):
+    """Test that the secret header writes pstats and collapsed stacks for that request"""
+    directory = str(tmp_path / 'spool')
+    client = make_app(RequestProfiler(directory, secret='let-me-in')).test_client()
+
+    assert 'X-Profile-Id' not in client.get('/work').headers
+    assert 'X-Profile-Id' not in client.get('/work', headers={PROFILE_HEADER: 'wrong'}).headers
+
+    response = client.get('/work', headers={PROFILE_HEADER: 'let-me-in'})
+    profile_id = response.headers['X-Profile-Id']
+    assert profile_id.endswith('-work')
+    assert spooled(directory) == [f'{profile_id}.collapsed', f'{profile_id}.pstats']
+
+    stats = pstats.Stats(os.path.join(directory, f'{profile_id}.pstats'))
+    profiled = {function for _, _, function in stats.stats}
+    assert 'calculate_distance' in profiled
+    assert 'render_template_string' in profiled
+
+    with open(os.path.join(directory, f'{profile_id}.collapsed'), encoding='utf-8') as f:
+        for line in f:
+            stack, count = line.rsplit(' ', 1)
+            assert int(count) > 0
+            assert ';' in stack
+
+def test_sample_rate_and_spool_limit(tmp_path):
+    """Test that sampled requests are profiled until the spool is full"""
+    directory = str(tmp_path / 'spool')
+    client = make_app(RequestProfiler(directory, sample_rate=1.0, max_profiles=2)).test_client()
+
+    ids = [client.get('/work').headers.get('X-Profile-Id') for _ in range(3)]
+    assert ids[0] and ids[1] and ids[0] != ids[1]
+    assert ids[2] is None
+    assert len(spooled(directory)) == 4
+
+def test_profile_block(tmp_path):
+    """Test that profile_block profiles code outside a request"""
+    directory = str(tmp_path / 'spool')
+    profiler = RequestProfiler(directory, sample_rate=0.5)
+    with profiler.profile_block('dataset-load'):
+        sum(range(1000))
+    names = spooled(directory)
+    assert len(names) == 2
+    assert all(os.path.splitext(name)[0].endswith('-dataset-load') for name in names)
+
+@pytest.mark.parametrize('environ, enabled', [
+    ({}, False),
+    ({'PROFILE_SAMPLE_RATE': '0'}, False),
+    ({'PROFILE_SAMPLE_RATE': '0.01'}, True),
+    ({'PROFILE_SECRET': 'x'}, True),
+])
+def test_from_env(environ, enabled):
+    """Test that profiling is only enabled by a sample rate or a secret"""
+    assert RequestProfiler.from_env(environ).enabled is enabled
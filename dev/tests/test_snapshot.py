@@ -0,0 +1,71 @@
+import os
+import shutil
+import pytest
+from marks import load_gpx_marks
+from snapshot import MarkSnapshot, SnapshotError, compile_snapshot, load_marks
+
+@pytest.fixture
+def gpx_path(tmp_path):
+    """A private copy of the marks GPX file"""
+    path = tmp_path / 'marks.gpx'
+    shutil.copy('2025scra.gpx', path)
+    return str(path)
+
+def test_snapshot_round_trip(gpx_path):
+    """Test that a compiled snapshot reads back exactly the GPX marks"""
+    path = compile_snapshot(gpx_path)
+    snapshot = MarkSnapshot(path)
+    assert list(snapshot.iter_marks()) == load_gpx_marks(gpx_path)
+    assert len(snapshot) == len(load_gpx_marks(gpx_path))
+    assert snapshot.lats.tolist() == [m['lat'] for m in load_gpx_marks(gpx_path)]
+
+def test_snapshot_checksum_detects_corruption(gpx_path):
+    """Test that a damaged snapshot is rejected"""
+    path = compile_snapshot(gpx_path)
+    with open(path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    with pytest.raises(SnapshotError):
+        MarkSnapshot(path)
+
+def test_snapshot_rejects_other_files(tmp_path, gpx_path):
+    """Test that non-snapshot files are rejected"""
+    with pytest.raises(SnapshotError):
+        MarkSnapshot(gpx_path)
+    empty = tmp_path / 'empty.bin'
+    empty.write_bytes(b'')
+    with pytest.raises(SnapshotError):
+        MarkSnapshot(str(empty))
+
+def test_load_marks_compiles_missing_snapshot(gpx_path):
+    """Test that loading without a snapshot builds one"""
+    snapshot_path = gpx_path.replace('.gpx', '.marks.bin')
+    assert not os.path.exists(snapshot_path)
+    assert list(load_marks(gpx_path)) == load_gpx_marks(gpx_path)
+    assert os.path.exists(snapshot_path)
+
+def test_load_marks_rebuilds_when_gpx_changes(gpx_path):
+    """Test that a newer GPX file with different content triggers a rebuild"""
+    list(load_marks(gpx_path))
+    with open(gpx_path, encoding='utf-8') as f:
+        content = f.read()
+    with open(gpx_path, 'w', encoding='utf-8') as f:
+        f.write(content.replace('Peveril Ledge', 'Peveril Point'))
+    marks = list(load_marks(gpx_path))
+    assert marks[0]['description'] == 'Peveril Point'
+
+def test_load_marks_keeps_snapshot_when_gpx_only_touched(gpx_path):
+    """Test that touching the GPX file without changing it reuses the snapshot"""
+    snapshot_path = compile_snapshot(gpx_path)
+    built = os.stat(snapshot_path).st_mtime_ns
+    stat = os.stat(gpx_path)
+    os.utime(gpx_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert list(load_marks(gpx_path)) == load_gpx_marks(gpx_path)
+    assert os.stat(snapshot_path).st_mtime_ns == built
+
+def test_load_marks_falls_back_to_gpx_when_unwritable(gpx_path, tmp_path):
+    """Test that an unwritable snapshot location still yields the marks"""
+    snapshot_path = str(tmp_path / 'missing-dir' / 'marks.bin')
+    assert list(load_marks(gpx_path, snapshot_path)) == load_gpx_marks(gpx_path)
@@ -0,0 +1,105 @@
+import pytest
+import app as app_module
+from app import app
+from tides import EXAMPLE_TIDE_FILE, TideModel
+
+COURSE = ['2A', '3SQ', '2B', '2A']
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client for the Flask app, with the example diamonds loaded"""
+    monkeypatch.setattr(app_module, 'TIDES', TideModel.from_csv(EXAMPLE_TIDE_FILE))
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def test_sweep_matches_single_starts(client):
+    """Test that each swept start time matches timing that start alone"""
+    body = {'course': COURSE, 'high_water': '2025-06-01T13:30:00+01:00', 'springs': 1, 'boat_speed': 5,
+            'first_start': '2025-06-01T09:00:00+01:00', 'last_start': '2025-06-01T12:00:00+01:00',
+            'interval_minutes': 15}
+    response = client.post('/course/tide/sweep', json=body)
+    assert response.status_code == 200
+    result = response.get_json()
+    assert len(result['starts']) == len(result['total_seconds']) == len(result['worst_leg']) == 13
+    assert result['starts'][0] == '2025-06-01T09:00:00+01:00'
+    assert result['starts'][-1] == '2025-06-01T12:00:00+01:00'
+    assert result['synthetic'] is True
+
+    for k in (0, 5, 12):
+        single = client.post('/course/tide', json={
+            'course': COURSE, 'high_water': body['high_water'], 'springs': 1, 'boat_speed': 5,
+            'start': result['starts'][k]}).get_json()
+        assert result['total_seconds'][k] == single['total_seconds']
+
+        delays = [leg['seconds'] - leg['distance'] / 5 * 3600 for leg in single['legs']]
+        worst = max(range(len(delays)), key=lambda i: delays[i])
+        assert result['worst_leg'][k] == worst + 1
+        assert result['worst_leg_delay_seconds'][k] == pytest.approx(delays[worst], abs=1)
+
+    best = min(range(13), key=lambda k: result['total_seconds'][k])
+    assert result['best'] == {'start': result['starts'][best], 'total_seconds': result['total_seconds'][best]}
+    # The tide makes a difference across the window
+    assert max(result['total_seconds']) > min(result['total_seconds'])
+
+def test_sweep_defaults_to_tidal_cycle(client):
+    """Test the default window of six hours either side of high water every 5 minutes"""
+    result = client.post('/course/tide/sweep', json={
+        'course': COURSE, 'high_water': '2025-06-01T13:30:00', 'boat_speed': 6}).get_json()
+    assert len(result['starts']) == 12 * 12 + 1
+    assert result['starts'][0] == '2025-06-01T07:30:00'
+    assert result['starts'][-1] == '2025-06-01T19:30:00'
+
+def test_sweep_unsailable(client):
+    """Test starts whose course can't be sailed against the tide"""
+    result = client.post('/course/tide/sweep', json={
+        'course': COURSE, 'high_water': '2025-06-01T13:30:00', 'boat_speed': 0.1, 'springs': 1,
+        'interval_minutes': 60}).get_json()
+    assert None in result['total_seconds']
+    assert result['best'] is None or result['best']['total_seconds'] is not None
+
+@pytest.mark.parametrize('changes, error', [
+    ({'high_water': None}, 'high_water must be an ISO 8601 time'),
+    ({'first_start': '2025-06-01T09:00:00'},
+     'first_start and last_start must be ISO 8601 times, both with a UTC offset if high_water has one'),
+    ({'first_start': '2025-06-01T12:00:00+01:00', 'last_start': '2025-06-01T09:00:00+01:00'},
+     'last_start must not be before first_start'),
+    ({'interval_minutes': 0}, 'interval_minutes must be a number from 1/60 (one second) to 1440'),
+    # Rounds to a zero timedelta
+    ({'interval_minutes': 1e-9}, 'interval_minutes must be a number from 1/60 (one second) to 1440'),
+    # Overflows timedelta
+    ({'interval_minutes': 1e20}, 'interval_minutes must be a number from 1/60 (one second) to 1440'),
+    ({'interval_minutes': 0.5}, 'At most 1000 start times per sweep'),
+    ({'interval_minutes': 1 / 60}, 'At most 1000 start times per sweep'),
+    ({'boat_speed': -1}, 'Give a positive boat_speed, or a polar with the wind'),
+    ({'course': ['2A']}, 'At least two marks must be provided'),
+])
+def test_sweep_errors(client, changes, error):
+    """Test that invalid sweeps are rejected"""
+    body = {'course': COURSE, 'high_water': '2025-06-01T13:30:00+01:00', 'boat_speed': 6}
+    response = client.post('/course/tide/sweep', json=dict(body, **changes))
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+
+def test_sweep_interval_bounds(client):
+    """Test the shortest and longest intervals allowed"""
+    body = {'course': COURSE, 'high_water': '2025-06-01T13:30:00', 'boat_speed': 6}
+    result = client.post('/course/tide/sweep', json=dict(
+        body, first_start='2025-06-01T13:00:00', last_start='2025-06-01T13:00:10',
+        interval_minutes=1 / 60)).get_json()
+    assert len(result['starts']) == 11
+    result = client.post('/course/tide/sweep', json=dict(body, interval_minutes=24 * 60)).get_json()
+    assert result['starts'] == ['2025-06-01T07:30:00']
+
+def test_sweep_window_at_the_datetime_limits(client):
+    """Test that a default window past either end of the datetime range is rejected"""
+    body = {'course': COURSE, 'boat_speed': 6}
+    for high_water in ('0001-01-01T03:00', '9999-12-31T20:00'):
+        response = client.post('/course/tide/sweep', json=dict(body, high_water=high_water))
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'Start times must fall within the years 1 to 9999'}
+    # A window given explicitly can run right up to the limit
+    result = client.post('/course/tide/sweep', json=dict(
+        body, high_water='9999-12-31T20:00', first_start='9999-12-31T23:00',
+        last_start='9999-12-31T23:59:59', interval_minutes=30)).get_json()
+    assert result['starts'] == ['9999-12-31T23:00:00', '9999-12-31T23:30:00']
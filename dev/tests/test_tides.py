@@ -0,0 +1,211 @@
+import numpy as np
+import pytest
+import app as app_module
+from app import app
+from boat_polars import PolarStore, leg_speeds
+from tides import EXAMPLE_TIDE_FILE, TideModel
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client for the Flask app, with the example diamonds loaded"""
+    monkeypatch.setattr(app_module, 'TIDES', TideModel.from_csv(EXAMPLE_TIDE_FILE))
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def write_diamonds(path, rows):
+    """Write a diamonds CSV from (diamond, lat, lon, hour, set, spring, neap) rows"""
+    lines = ['# test data', 'diamond,lat,lon,hour,set,spring_rate,neap_rate']
+    lines += [','.join(str(value) for value in row) for row in rows]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+def uniform_model(tmp_path, direction, spring, neap=None):
+    """Two diamonds with the same stream at every hour"""
+    neap = spring if neap is None else neap
+    rows = [(name, lat, -1.3, hour, direction, spring, neap)
+            for name, lat in (('A', 50.7), ('B', 50.8)) for hour in (-6, 0, 6)]
+    return TideModel.from_csv(write_diamonds(tmp_path / 'diamonds.csv', rows))
+
+def test_example_diamonds_load():
+    """Test that the bundled (synthetic) diamonds load"""
+    with open(EXAMPLE_TIDE_FILE, encoding='utf-8') as f:
+        assert 'SYNTHETIC' in f.readline()
+    model = TideModel.from_csv(EXAMPLE_TIDE_FILE)
+    assert len(model) == 12
+    assert model.hours.tolist() == list(range(-6, 7))
+    assert model.springs.shape == model.neaps.shape == (12, 13, 2)
+    assert model.synthetic
+
+def test_malformed_diamonds(tmp_path):
+    """Test that bad rows and uneven hours are rejected"""
+    path = write_diamonds(tmp_path / 'bad.csv', [('A', 50.7, -1.3, 0, 'N', 1, 1)])
+    with pytest.raises(ValueError, match='Malformed tidal diamond row'):
+        TideModel.from_csv(path)
+    path = write_diamonds(tmp_path / 'uneven.csv', [('A', 50.7, -1.3, 0, 0, 1, 1),
+                                                    ('A', 50.7, -1.3, 1, 0, 1, 1),
+                                                    ('B', 50.8, -1.3, 0, 0, 1, 1)])
+    with pytest.raises(ValueError, match='Every tidal diamond must give the same hours'):
+        TideModel.from_csv(path)
+
+def test_spatial_and_spring_interpolation():
+    """Test exact values on diamonds, blending between them, and springs/neaps"""
+    model = TideModel.from_csv(EXAMPLE_TIDE_FILE)
+    tables = model.tables(model.lats[:2], model.lons[:2], springs=1.0)
+    assert np.allclose(tables, model.springs[:2])
+    assert np.allclose(model.tables(model.lats[:1], model.lons[:1], springs=0.0)[0], model.neaps[0])
+    middle = model.neaps[0] + 0.25 * (model.springs[0] - model.neaps[0])
+    assert np.allclose(model.tables(model.lats[:1], model.lons[:1], springs=0.25)[0], middle)
+
+    between = model.tables([(model.lats[0] + model.lats[1]) / 2], [(model.lons[0] + model.lons[1]) / 2])
+    low = np.minimum(model.tables(model.lats[:3], model.lons[:3]).min(axis=0), 0)
+    high = model.tables(model.lats[:3], model.lons[:3]).max(axis=0)
+    assert np.all((between[0] >= low - 1e-9) & (between[0] <= high + 1e-9))
+
+def test_tidal_hours_wrap():
+    """Test that times wrap to the nearest high water"""
+    model = TideModel.from_csv(EXAMPLE_TIDE_FILE)
+    assert model.tidal_hours([0, 5.5, -6.1, 7.0, 12.42, -6.3]).tolist() == pytest.approx(
+        [0, 5.5, -6.0, 7.0 - 12.42, 0, 6.0])
+
+def test_leg_times_with_streams(tmp_path):
+    """Test fair, foul and cross streams against the plain distance over speed"""
+    lats, lons = [50.70, 50.75, 50.70], [-1.3, -1.3, -1.3]
+    bearings, distances = [0, 180], [3.0, 3.0]
+
+    # A 1 knot north-going stream: fair on the first leg, foul on the second
+    plan = uniform_model(tmp_path, 0, 1.0).plan(lats, lons, bearings, distances)
+    assert np.allclose(plan.leg_times([5, 5], [0.0]), [[1800, 2700]])
+
+    # A 3 knot east-going stream: crab across it at sqrt(5² - 3²) = 4 knots
+    plan = uniform_model(tmp_path, 90, 3.0).plan(lats, lons, bearings, distances)
+    assert np.allclose(plan.leg_times([5, 5], [0.0]), [[2700, 2700]])
+
+    # A boat slower than the stream never gets round, nor to any later leg
+    times = plan.leg_times([2, 5], [0.0])
+    assert np.isinf(times).all()
+
+    # Springs and neaps
+    model = uniform_model(tmp_path, 0, 2.0, 0.0)
+    times = model.plan(lats, lons, bearings, distances, springs=0.5).leg_times([5, 5], [0.0])
+    assert np.allclose(times, [[1800, 2700]])
+
+def test_leg_times_vectorised_over_starts():
+    """Test that many start times at once match starting one at a time"""
+    model = TideModel.from_csv(EXAMPLE_TIDE_FILE)
+    registry = app_module.REGISTRY
+    names = ['2A', '3SQ', '2B', '2A']
+    marks = [registry.get(name) for name in names]
+    legs = [registry.measure(a, b) for a, b in zip(names, names[1:])]
+    plan = model.plan([m['lat'] for m in marks], [m['lon'] for m in marks],
+                      [b for b, _ in legs], [d for _, d in legs], springs=1.0)
+    starts = np.linspace(-6, 6, 25)
+    together = plan.leg_times([6, 5, 7], starts)
+    assert together.shape == (25, 3)
+    for k, start in enumerate(starts):
+        assert np.allclose(plan.leg_times([6, 5, 7], [start])[0], together[k])
+    # The stream matters
+    assert together.sum(axis=1).max() - together.sum(axis=1).min() > 60
+
+def test_course_tide_endpoint(client):
+    """Test tide-adjusted times for a course from a start time"""
+    course = ['2A', '3SQ', '2B']
+    response = client.post('/course/tide', json={
+        'course': course, 'start': '2025-06-01T10:00:00+01:00',
+        'high_water': '2025-06-01T13:30:00+01:00', 'springs': 1, 'boat_speed': 6})
+    assert response.status_code == 200
+    result = response.get_json()
+
+    legs = result['legs']
+    assert [leg['bearing'] for leg in legs] == [leg['bearing'] for leg in
+                                                client.post('/course', json={'course': course}).get_json()['legs']]
+    assert legs[0]['start_seconds'] == 0
+    assert legs[1]['start_seconds'] == legs[0]['seconds']
+    assert result['total_seconds'] == pytest.approx(sum(leg['seconds'] for leg in legs), abs=1)
+    for leg in legs:
+        assert leg['speed_made_good'] == pytest.approx(leg['distance'] / leg['seconds'] * 3600, abs=0.01)
+    assert result['finish'].endswith('+01:00')
+    # Served from the example diamonds, and says so
+    assert result['synthetic'] is True
+
+def test_course_tide_finish_past_year_9999(client):
+    """Test that a finish datetime can't represent has no finish time, like an unsailable course"""
+    response = client.post('/course/tide', json={
+        'course': ['2A', '3SQ'], 'start': '9999-12-31T23:00', 'high_water': '9999-12-31T22:00', 'boat_speed': 6})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['total_seconds'] > 3600
+    assert result['finish'] is None
+
+def test_tide_endpoints_need_tide_data(client, monkeypatch):
+    """Test that without tidal diamonds the tide endpoints are unavailable"""
+    monkeypatch.setattr(app_module, 'TIDES', None)
+    body = {'course': ['2A', '3SQ'], 'start': '2025-06-01T10:00:00', 'high_water': '2025-06-01T13:30:00',
+            'boat_speed': 6}
+    for path in ('/course/tide', '/course/tide/sweep'):
+        response = client.post(path, json=body)
+        assert response.status_code == 503
+        assert 'TIDE_FILE' in response.get_json()['error']
+
+def test_load_tides(tmp_path):
+    """Test that tide data is opt-in and a bad TIDE_FILE doesn't stop the app"""
+    assert app_module.load_tides(None) is None
+    assert app_module.load_tides(str(tmp_path / 'missing.csv')) is None
+    assert app_module.load_tides(write_diamonds(tmp_path / 'bad.csv', [('A', 50.7, -1.3, 'x', 0, 1, 1)])) is None
+    rows = [(name, lat, -1.3, hour, 90, 1, 1) for name, lat in (('A', 50.7), ('B', 50.8)) for hour in (-6, 0, 6)]
+    tides = app_module.load_tides(write_diamonds(tmp_path / 'diamonds.csv', rows))
+    assert len(tides) == 2
+    assert not tides.synthetic
+
+def test_course_tide_with_polar(client, tmp_path, monkeypatch):
+    """Test boat speeds from a polar and the wind"""
+    store = PolarStore(str(tmp_path / 'polars'))
+    monkeypatch.setattr(app_module, 'POLARS', store)
+    polar_id, polar = store.add('twa 10\n40 5\n90 6\n180 4\n')
+    body = {'course': ['2A', '3SQ'], 'start': '2025-06-01T12:00:00', 'high_water': '2025-06-01T12:00:00',
+            'polar': polar_id, 'wind_direction': 0, 'wind_speed': 10}
+    with_polar = client.post('/course/tide', json=body).get_json()
+    bearing = with_polar['legs'][0]['bearing']
+    speed = float(leg_speeds(polar, [abs((bearing + 180) % 360 - 180)], 10)[0])
+    with_speed = client.post('/course/tide', json=dict(
+        {k: v for k, v in body.items() if k not in ('polar', 'wind_direction', 'wind_speed')},
+        boat_speed=speed)).get_json()
+    assert with_polar['total_seconds'] == pytest.approx(with_speed['total_seconds'], abs=1)
+
+@pytest.mark.parametrize('changes, error', [
+    ({'start': 'soon'}, 'start and high_water must be ISO 8601 times, both with a UTC offset or both without'),
+    ({'high_water': '2025-06-01T13:30:00'},
+     'start and high_water must be ISO 8601 times, both with a UTC offset or both without'),
+    ({'springs': 2}, 'springs must be a number from 0 (neaps) to 1 (springs)'),
+    ({'boat_speed': 0}, 'Give a positive boat_speed, or a polar with the wind'),
+    ({'polar': '0123456789abcdef'}, 'Polar 0123456789abcdef not found'),
+    ({'course': ['2A', 'NOPE']}, 'Mark NOPE not found'),
+])
+def test_course_tide_errors(client, changes, error):
+    """Test that invalid tide requests are rejected"""
+    body = {'course': ['2A', '3SQ'], 'start': '2025-06-01T10:00:00+01:00',
+            'high_water': '2025-06-01T13:30:00+01:00', 'boat_speed': 6}
+    response = client.post('/course/tide', json=dict(body, **changes))
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+
+def test_segments_see_the_tide_when_they_are_sailed(tmp_path):
+    """Test that later segments of a long leg get a later tidal hour"""
+    # North-going 1 knot until HW, then south-going 3 knots
+    rows = [(name, lat, -1.3, hour, 0 if hour < 0 else 180, 1.0 if hour < 0 else 3.0,
+             1.0 if hour < 0 else 3.0)
+            for name, lat in (('A', 50.5), ('B', 51.0)) for hour in range(-6, 7)]
+    model = TideModel.from_csv(write_diamonds(tmp_path / 'turning.csv', rows))
+    plan = model.plan([50.5, 50.8333], [-1.3, -1.3], [0], [20.0])
+
+    seen = []
+    streams = plan.streams
+    plan.streams = lambda leg, segment, hours: seen.append(hours.tolist()) or streams(leg, segment, hours)
+    seconds = plan.leg_times([5], [-2.0])[0, 0]
+
+    assert seen[0] == [-2.0]
+    assert all(later > earlier for earlier, later in zip(seen, seen[1:]))
+    # The first segments ride the fair stream, the last ones stem the foul one
+    assert seen[-1][0] > 0
+    # Timing every segment at the start would give 20 nm at 6 knots, 12,000 s
+    assert seconds > 16000
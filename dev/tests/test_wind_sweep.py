@@ -0,0 +1,81 @@
+import pytest
+import app as app_module
+from app import app
+from wind import BEAT, REACH, RUN, true_wind_angles, wind_sweep
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def test_true_wind_angles():
+    """Test true wind angles either side of the wind and across north"""
+    angles = true_wind_angles([0, 90, 180, 350], [0, 10, 270])
+    assert angles.tolist() == [
+        [0, 90, 180, 10],
+        [10, 80, 170, 20],
+        [90, 180, 90, 80],
+    ]
+
+def test_wind_sweep_points_of_sail_and_totals():
+    """Test point of sail boundaries and per-direction distance totals"""
+    angles, codes, totals = wind_sweep([0, 45, 180], [1.5, 0.25, 2.0], [0, 30])
+    assert angles.shape == codes.shape == (2, 3)
+    # 0 and 45 degrees off the wind are beats, dead downwind is a run
+    assert codes[0].tolist() == [BEAT, BEAT, RUN]
+    assert codes[1].tolist() == [BEAT, BEAT, RUN]
+    assert totals.tolist() == [[1.75, 0.0, 2.0], [1.75, 0.0, 2.0]]
+
+    _, codes, totals = wind_sweep([0, 45, 180], [1.5, 0.25, 2.0], [60], beat_angle=40, run_angle=160)
+    assert codes.tolist() == [[REACH, BEAT, REACH]]
+    assert totals.tolist() == [[0.25, 3.5, 0.0]]
+
+def test_wind_sweep_endpoint(client):
+    """Test the sweep over all wind directions for a course"""
+    course = [{'name': '1A', 'rounding': 'P'}, {'name': '3SQ', 'rounding': 'S'}, '1B']
+    response = client.post('/course/wind-sweep', json={'course': course})
+    assert response.status_code == 200
+    result = response.get_json()
+
+    legs = client.post('/course', json={'course': course}).get_json()['legs']
+    assert result['legs'] == legs
+    assert result['wind_directions'] == list(range(360))
+    assert len(result['true_wind_angles']) == len(result['points_of_sail']) == 360
+
+    for direction in (0, 123, 359):
+        for k, leg in enumerate(legs):
+            angle = abs((leg['bearing'] - direction + 180) % 360 - 180)
+            assert result['true_wind_angles'][direction][k] == angle
+            expected = 'beat' if angle <= 45 else 'run' if angle >= 150 else 'reach'
+            assert result['points_of_sail'][direction][k] == expected
+        total = result['upwind'][direction] + result['reach'][direction] + result['downwind'][direction]
+        assert total == pytest.approx(sum(leg['distance'] for leg in legs))
+
+    # Sailing a leg dead upwind
+    upwind = legs[0]['bearing']
+    assert result['points_of_sail'][upwind][0] == 'beat'
+    assert result['upwind'][upwind] >= legs[0]['distance']
+
+def test_wind_sweep_geodesy_and_angles(client):
+    """Test the geodesy and point of sail options"""
+    course = ['1A', '3SQ']
+    result = client.post('/course/wind-sweep', json={
+        'course': course, 'geodesy': 'wgs84', 'beat_angle': 0, 'run_angle': 180}).get_json()
+    assert result['legs'][0]['distance'] == app_module.REGISTRY.measure('1A', '3SQ', 'wgs84')[1]
+    assert set(result['points_of_sail'][(result['legs'][0]['bearing'] + 90) % 360]) == {'reach'}
+
+@pytest.mark.parametrize('body, error', [
+    ({'course': ['1A']}, 'At least two marks must be provided'),
+    ({'course': ['1A', 'NOPE']}, 'Mark NOPE not found'),
+    ({'course': ['1A', '1B'], 'geodesy': 'flat'}, 'geodesy must be one of spherical, wgs84'),
+    ({'course': ['1A', '1B'], 'beat_angle': 90, 'run_angle': 60},
+     'Need numeric 0 <= beat_angle < run_angle <= 180'),
+    ({'course': ['1A', '1B'], 'run_angle': '150'}, 'Need numeric 0 <= beat_angle < run_angle <= 180'),
+])
+def test_wind_sweep_errors(client, body, error):
+    """Test that invalid sweeps are rejected"""
+    response = client.post('/course/wind-sweep', json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
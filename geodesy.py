@@ -0,0 +1,303 @@
+"""Bearing and distance calculations between marks"""
+import math
+import time
+from array import array
+
+import numpy as np
+
+# Earth's radius in nautical miles
+EARTH_RADIUS_NM = 3440.065
+
+# WGS-84 ellipsoid, for the 'wgs84' geodesy mode
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+METRES_PER_NM = 1852.0
+
+# 'spherical' is the haversine/great-circle model of calculate_bearing() and
+# calculate_distance(); 'wgs84' solves the inverse problem on the ellipsoid
+GEODESY_MODES = ('spherical', 'wgs84')
+
+def calculate_bearing(mark1, mark2):
+    """Calculate compass bearing from mark1 to mark2 in degrees"""
+    lat1 = math.radians(mark1['lat'])
+    lon1 = math.radians(mark1['lon'])
+    lat2 = math.radians(mark2['lat'])
+    lon2 = math.radians(mark2['lon'])
+
+    d_lon = lon2 - lon1
+
+    y = math.sin(d_lon) * math.cos(lat2)
+    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(d_lon)
+
+    bearing = math.degrees(math.atan2(y, x))
+
+    # Convert to compass bearing (0-360 degrees)
+    bearing = (bearing + 360) % 360
+
+    return round(bearing)
+
+def calculate_distance(mark1, mark2):
+    """Calculate distance between two marks in nautical miles"""
+    lat1 = math.radians(mark1['lat'])
+    lon1 = math.radians(mark1['lon'])
+    lat2 = math.radians(mark2['lat'])
+    lon2 = math.radians(mark2['lon'])
+
+    # Haversine formula
+    d_lat = lat2 - lat1
+    d_lon = lon2 - lon1
+
+    a = math.sin(d_lat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(d_lon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+
+    distance = EARTH_RADIUS_NM * c
+
+    return round(distance, 2)
+
+# Unrounded results closer than this to a rounding boundary are recomputed
+# with the scalar functions, since numpy's sin/cos/atan2 may differ from libm
+# in the last bit and must never flip a rounded result
+_ROUNDING_GUARD = 1e-6
+
+def _near_half(scaled):
+    """Mask of values whose fractional part is within the guard of .5"""
+    return np.abs(scaled - np.floor(scaled) - 0.5) < _ROUNDING_GUARD
+
+def vincenty_inverse(lat1, lon1, lat2, lon2, max_iterations=200):
+    """Initial bearings (degrees) and distances (nm) on the WGS-84 ellipsoid
+
+    Vincenty's inverse formula over arrays of coordinates in radians,
+    iterated until every pair has converged. The reduced latitudes'
+    sines and cosines may be passed precomputed as ``lat1``/``lat2`` tuples
+    of (sin U, cos U); GeodesyEngine does so. Nearly antipodal pairs, where
+    the iteration does not converge, fall back to the spherical result.
+    """
+    b = (1 - WGS84_F) * WGS84_A
+    sin_u1, cos_u1 = lat1 if isinstance(lat1, tuple) else _reduced_latitude(lat1)
+    sin_u2, cos_u2 = lat2 if isinstance(lat2, tuple) else _reduced_latitude(lat2)
+    big_l = (lon2 - lon1 + np.pi) % (2 * np.pi) - np.pi
+
+    lam = big_l
+    converged = np.zeros(np.shape(big_l), dtype=bool)
+    for _ in range(max_iterations):
+        sin_lam = np.sin(lam)
+        cos_lam = np.cos(lam)
+        sin_sigma = np.sqrt((cos_u2 * sin_lam) ** 2
+                            + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2)
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        # Coincident points have sin_sigma == 0 and a zero distance
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Equatorial lines have cos2_alpha == 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0,
+                                    cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+        c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        previous = lam
+        lam = big_l + (1 - c) * WGS84_F * sin_alpha * (
+            sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        converged = np.abs(lam - previous) < 1e-12
+        if converged.all():
+            break
+
+    u2 = cos2_alpha * (WGS84_A ** 2 - b ** 2) / b ** 2
+    big_a = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    big_b = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    distances = b * big_a * (sigma - delta_sigma) / METRES_PER_NM
+
+    alpha1 = np.arctan2(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+    bearings = (np.degrees(alpha1) + 360) % 360
+
+    if not converged.all():
+        # Only the angles are needed for the spherical fallback
+        fallback = ~converged
+        lat1_rad = np.arctan2(sin_u1, (1 - WGS84_F) * cos_u1)
+        lat2_rad = np.arctan2(sin_u2, (1 - WGS84_F) * cos_u2)
+        engine, i, j = GeodesyEngine.from_coordinates(
+            np.degrees(np.broadcast_to(lat1_rad, fallback.shape)[fallback]),
+            np.degrees(np.broadcast_to(lon1, fallback.shape)[fallback]),
+            np.degrees(np.broadcast_to(lat2_rad, fallback.shape)[fallback]),
+            np.degrees(np.broadcast_to(lon2, fallback.shape)[fallback]))
+        bearings = np.where(fallback, 0.0, bearings)
+        distances = np.where(fallback, 0.0, distances)
+        bearings[fallback] = engine.raw_bearings(i, j)
+        distances[fallback] = engine.raw_distances(i, j)
+    return bearings, distances
+
+def _reduced_latitude(lat):
+    """(sin U, cos U) of the reduced latitude on the WGS-84 ellipsoid"""
+    u = np.arctan((1 - WGS84_F) * np.tan(lat))
+    return np.sin(u), np.cos(u)
+
+class GeodesyEngine:
+    """Vectorised bearings and distances between points of a fixed set
+
+    The radians, sine and cosine of every point's latitude (and its longitude
+    in radians) are computed once. Queries take arrays of from/to point
+    indexes and evaluate the same formulas as calculate_bearing() and
+    calculate_distance() over all pairs in one go, with identical rounding.
+
+    Passing ``mode='wgs84'`` evaluates vincenty_inverse() instead (with the
+    reduced latitudes also computed once), rounded the same way.
+    """
+
+    def __init__(self, lats, lons):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.lat_rad = np.radians(self.lats)
+        self.lon_rad = np.radians(self.lons)
+        self.sin_lat = np.sin(self.lat_rad)
+        self.cos_lat = np.cos(self.lat_rad)
+        self.sin_reduced, self.cos_reduced = _reduced_latitude(self.lat_rad)
+
+    @classmethod
+    def from_marks(cls, marks):
+        """Build an engine over a sequence of mark dicts"""
+        return cls([m['lat'] for m in marks], [m['lon'] for m in marks])
+
+    @classmethod
+    def from_coordinates(cls, from_lats, from_lons, to_lats, to_lons):
+        """Build an engine over two coordinate arrays, returning it with the index arrays
+
+        The from points are indexes ``0..n-1`` and the to points ``n..2n-1``.
+        """
+        n = len(from_lats)
+        engine = cls(np.concatenate([np.asarray(from_lats, dtype=np.float64),
+                                     np.asarray(to_lats, dtype=np.float64)]),
+                     np.concatenate([np.asarray(from_lons, dtype=np.float64),
+                                     np.asarray(to_lons, dtype=np.float64)]))
+        return engine, np.arange(n), np.arange(n, 2 * n)
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _point(self, index):
+        return {'lat': float(self.lats[index]), 'lon': float(self.lons[index])}
+
+    def raw_bearings(self, i, j):
+        """Unrounded compass bearings (0-360 degrees) from points ``i`` to points ``j``"""
+        d_lon = self.lon_rad[j] - self.lon_rad[i]
+
+        y = np.sin(d_lon) * self.cos_lat[j]
+        x = self.cos_lat[i] * self.sin_lat[j] - self.sin_lat[i] * self.cos_lat[j] * np.cos(d_lon)
+
+        return (np.degrees(np.arctan2(y, x)) + 360) % 360
+
+    def raw_distances(self, i, j):
+        """Unrounded haversine distances in nautical miles from points ``i`` to points ``j``"""
+        d_lat = self.lat_rad[j] - self.lat_rad[i]
+        d_lon = self.lon_rad[j] - self.lon_rad[i]
+
+        a = np.sin(d_lat/2)**2 + self.cos_lat[i] * self.cos_lat[j] * np.sin(d_lon/2)**2
+        c = 2 * np.arcsin(np.sqrt(a))
+
+        return EARTH_RADIUS_NM * c
+
+    def raw_wgs84(self, i, j):
+        """Unrounded WGS-84 (bearings, distances) from points ``i`` to points ``j``"""
+        return vincenty_inverse((self.sin_reduced[i], self.cos_reduced[i]), self.lon_rad[i],
+                                (self.sin_reduced[j], self.cos_reduced[j]), self.lon_rad[j])
+
+    def bearings(self, i, j, mode='spherical'):
+        """Whole-degree bearings from points ``i`` to points ``j``, as calculate_bearing()"""
+        i, j = np.broadcast_arrays(np.asarray(i, dtype=np.intp), np.asarray(j, dtype=np.intp))
+        if mode == 'wgs84':
+            return np.rint(self.raw_wgs84(i, j)[0]).astype(np.int64)
+        raw = self.raw_bearings(i, j)
+        result = np.rint(raw).astype(np.int64)
+        for k in np.flatnonzero(_near_half(raw)):
+            result.flat[k] = calculate_bearing(self._point(i.flat[k]), self._point(j.flat[k]))
+        return result
+
+    def distances(self, i, j, mode='spherical'):
+        """Distances in nautical miles from points ``i`` to points ``j``, as calculate_distance()"""
+        return self.distance_hundredths(i, j, mode) / 100
+
+    def distance_hundredths(self, i, j, mode='spherical'):
+        """Distances as integer hundredths of a nautical mile"""
+        i, j = np.broadcast_arrays(np.asarray(i, dtype=np.intp), np.asarray(j, dtype=np.intp))
+        if mode == 'wgs84':
+            return np.rint(self.raw_wgs84(i, j)[1] * 100).astype(np.int64)
+        scaled = self.raw_distances(i, j) * 100
+        result = np.rint(scaled).astype(np.int64)
+        for k in np.flatnonzero(_near_half(scaled)):
+            distance = calculate_distance(self._point(i.flat[k]), self._point(j.flat[k]))
+            result.flat[k] = round(distance * 100)
+        return result
+
+    def pairs(self, i, j, mode='spherical'):
+        """Return (bearings, distances) arrays for points ``i`` to points ``j``"""
+        if mode == 'wgs84':
+            i, j = np.broadcast_arrays(np.asarray(i, dtype=np.intp), np.asarray(j, dtype=np.intp))
+            bearings, distances = self.raw_wgs84(i, j)
+            return np.rint(bearings).astype(np.int64), np.rint(distances * 100) / 100
+        return self.bearings(i, j), self.distances(i, j)
+
+def batch_bearings(from_lats, from_lons, to_lats, to_lons):
+    """calculate_bearing() over arrays of from/to coordinates"""
+    engine, i, j = GeodesyEngine.from_coordinates(from_lats, from_lons, to_lats, to_lons)
+    return engine.bearings(i, j)
+
+def batch_distances(from_lats, from_lons, to_lats, to_lons):
+    """calculate_distance() over arrays of from/to coordinates"""
+    engine, i, j = GeodesyEngine.from_coordinates(from_lats, from_lons, to_lats, to_lons)
+    return engine.distances(i, j)
+
+class PairMatrix:
+    """Precomputed bearing and distance for every ordered pair of marks
+
+    Built in row blocks with GeodesyEngine, then stored row-major in flat
+    typed arrays: whole-degree bearings as unsigned shorts and distances as
+    unsigned ints of hundredths of a nautical mile, i.e. exactly the rounded
+    values calculate_bearing() and calculate_distance() return (or, with
+    ``mode='wgs84'``, the rounded ellipsoidal values), in 6 bytes per pair.
+    Lookups return plain Python numbers.
+    """
+
+    # Rows evaluated per vectorised pass, bounding the temporary arrays
+    ROW_CHUNK = 256
+
+    def __init__(self, marks, engine=None, mode='spherical'):
+        start = time.perf_counter()
+        if engine is None:
+            engine = GeodesyEngine.from_marks(marks)
+        self.mode = mode
+        self.size = n = len(marks)
+        self.bearings = array('H')
+        self.distances = array('I')
+
+        columns = np.arange(n)
+        for first in range(0, n, self.ROW_CHUNK):
+            rows = np.arange(first, min(first + self.ROW_CHUNK, n))[:, None]
+            self.bearings.frombytes(engine.bearings(rows, columns, mode).astype(np.uint16).tobytes())
+            self.distances.frombytes(
+                engine.distance_hundredths(rows, columns, mode).astype(np.uint32).tobytes())
+
+        self.build_seconds = time.perf_counter() - start
+
+    def bearing(self, i, j):
+        """Bearing in whole degrees from mark ``i`` to mark ``j``"""
+        return self.bearings[i * self.size + j]
+
+    def distance(self, i, j):
+        """Distance in nautical miles from mark ``i`` to mark ``j``"""
+        return self.distances[i * self.size + j] / 100
+
+    def nbytes(self):
+        """Memory held by the matrix arrays"""
+        return (len(self.bearings) * self.bearings.itemsize
+                + len(self.distances) * self.distances.itemsize)
+
+    def report(self):
+        """Startup cost and memory footprint of the matrix"""
+        return {
+            'mode': self.mode,
+            'marks': self.size,
+            'pairs': self.size * self.size,
+            'build_seconds': round(self.build_seconds, 4),
+            'bytes': self.nbytes(),
+        }
@@ -0,0 +1,32 @@
+# Gunicorn configuration for the async (ASGI) serving mode
+# Run with: gunicorn --config gunicorn-asgi.conf.py asgi:application
+# Requires: pip install -r requirements-asgi.txt
+import gc
+
+bind = "127.0.0.1:8000"
+workers = 3
+# Uvicorn's event loop handles the sockets, so slow clients on poor
+# connections wait on the loop instead of tying up a worker
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 30
+keepalive = 5
+max_requests = 1000
+max_requests_jitter = 100
+preload_app = True
+
+# Logging
+accesslog = "-"
+errorlog = "-"
+loglevel = "info"
+
+# Note: Gunicorn's limit_request_* settings don't apply to Uvicorn workers;
+# h11 enforces its own request size limits
+
+# Graceful shutdown
+graceful_timeout = 30
+
+# Shared mark dataset
+def pre_fork(server, worker):
+    # Same as the sync config: freeze the preloaded dataset out of GC
+    # tracking so it stays shared copy-on-write across workers
+    gc.freeze()
@@ -1,5 +1,7 @@
 # Gunicorn configuration for Docker deployment
 # This binds to all interfaces (0.0.0.0) for Docker networking
+import gc
+
 bind = "0.0.0.0:8000"
 workers = 3
 worker_class = "sync"
@@ -23,3 +25,10 @@ limit_request_field_size = 8190
 # Graceful shutdown
 graceful_timeout = 30
 
+# Shared mark dataset
+def pre_fork(server, worker):
+    # The app (and its parsed mark dataset) is loaded once in the master via
+    # preload_app. Freezing moves those objects out of GC tracking so the
+    # workers' collections never write to their pages and they stay shared
+    # copy-on-write instead of being duplicated in each worker.
+    gc.freeze()
@@ -1,4 +1,6 @@
 # Gunicorn configuration for Solent Marks Calculator
+import gc
+
 bind = "127.0.0.1:8000"
 workers = 3
 worker_class = "sync"
@@ -17,4 +19,12 @@ loglevel = "info"
 # Security
 limit_request_line = 4094
 limit_request_fields = 100
-limit_request_field_size = 8190 
\ No newline at end of file
+limit_request_field_size = 8190 
+
+# Shared mark dataset
+def pre_fork(server, worker):
+    # The app (and its parsed mark dataset) is loaded once in the master via
+    # preload_app. Freezing moves those objects out of GC tracking so the
+    # workers' collections never write to their pages and they stay shared
+    # copy-on-write instead of being duplicated in each worker.
+    gc.freeze()
@@ -0,0 +1,287 @@
+"""Mark dataset loading and indexing"""
+import hashlib
+import heapq
+import json
+import os
+import time
+from datetime import datetime, timezone
+import xml.etree.ElementTree as ET
+import numpy as np
+from geodesy import (GEODESY_MODES, GeodesyEngine, PairMatrix, calculate_bearing,
+                     calculate_distance, vincenty_inverse)
+from spatial import SpatialIndex
+
+GPX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '2025scra.gpx')
+
+# The pair matrix costs 6 bytes per ordered pair (~250 KB for the SCRA marks,
+# ~23 MB at 2,000 marks) and O(n^2) build time at startup. Past this size
+# registries compute pairs on demand instead. See docs/PERFORMANCE.md.
+PAIR_MATRIX_MAX_MARKS = int(os.environ.get('PAIR_MATRIX_MAX_MARKS', '2000'))
+
+# Default geodesy for bearings and distances ('spherical' or 'wgs84'); the
+# pair matrix is built for this mode and requests may ask for the other
+GEODESY_MODE = os.environ.get('GEODESY_MODE', 'spherical')
+
+GPX_NS = 'http://www.topografix.com/GPX/1/1'
+_WPT_TAG = f'{{{GPX_NS}}}wpt'
+
+def _element_text(wpt, tag):
+    """Stripped text of a waypoint's child element, or '' if missing"""
+    elem = wpt.find(tag)
+    return elem.text.strip() if elem is not None and elem.text is not None else ''
+
+def iter_gpx_marks(path=GPX_FILE):
+    """Yield marks from a GPX file one waypoint at a time
+
+    Uses incremental parsing and discards each waypoint once it has been
+    read, so memory stays flat however many waypoints the file holds.
+    """
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+
+    for event, elem in context:
+        if event != 'end' or elem.tag != _WPT_TAG:
+            continue
+
+        lat_str = elem.get('lat')
+        lon_str = elem.get('lon')
+
+        if lat_str is not None and lon_str is not None:
+            mark = {
+                'name': _element_text(elem, f'{{{GPX_NS}}}name'),
+                'description': _element_text(elem, f'{{{GPX_NS}}}desc'),
+                'symbol': _element_text(elem, f'{{{GPX_NS}}}sym'),
+                'lat': float(lat_str),
+                'lon': float(lon_str)
+            }
+        else:
+            mark = None
+
+        # Drop the processed waypoint, and its now-empty shell from the tree
+        elem.clear()
+        root.clear()
+
+        if mark is not None:
+            yield mark
+
+def load_gpx_marks(path=GPX_FILE):
+    """Load marks from the GPX file"""
+    return list(iter_gpx_marks(path))
+
+def get_available_zones(marks):
+    """Get list of available zones (first character of mark names)"""
+    zones = set()
+    for mark in marks:
+        if mark['name']:
+            zones.add(mark['name'][0])
+    return sorted(list(zones))
+
+def get_marks_by_zone(marks, zones):
+    """Filter marks by zone (first character of mark name)"""
+    if not zones:
+        return []
+
+    filtered_marks = []
+    for mark in marks:
+        if mark['name'] and mark['name'][0] in zones:
+            filtered_marks.append(mark)
+    return filtered_marks
+
+class FrozenMark(dict):
+    """Read-only mark dict shared by every request (and every forked worker)"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('Marks in the shared dataset are read-only; copy() before modifying')
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = __ior__ = _readonly
+
+class MarkRegistry:
+    """Immutable mark dataset with its lookup indexes built once up front
+
+    ``marks`` keeps the GPX file order. Names resolve through a hash index
+    and zones (first character of the mark name) through per-zone buckets,
+    so request handlers never scan the full list. Bearings and distances
+    between marks come from a precomputed PairMatrix while the dataset has
+    at most ``pair_matrix_max_marks`` marks, and a SpatialIndex answers
+    nearest-mark and bounding box queries.
+
+    ``geodesy_mode`` (one of GEODESY_MODES) is the default model for
+    measurements and the one the pair matrix is built for. Measuring in the
+    other mode evaluates the engine on demand.
+
+    ``content_hash`` is the SHA-256 of the marks' canonical JSON and
+    ``version`` a short prefix of it, so anything derived from the dataset
+    (HTTP validators, cached payloads) changes exactly when the marks do.
+    ``last_modified`` is when the source data last changed (a Unix
+    timestamp, defaulting to the build time), as a whole-second UTC datetime.
+    """
+
+    def __init__(self, marks, pair_matrix_max_marks=PAIR_MATRIX_MAX_MARKS, last_modified=None,
+                 geodesy_mode=GEODESY_MODE):
+        if geodesy_mode not in GEODESY_MODES:
+            raise ValueError(f'Unknown geodesy mode {geodesy_mode!r}; expected one of {GEODESY_MODES}')
+        self.geodesy_mode = geodesy_mode
+        self.marks = tuple(FrozenMark(mark) for mark in marks)
+
+        canonical = json.dumps(self.marks, sort_keys=True, separators=(',', ':'))
+        self.content_hash = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+        self.version = self.content_hash[:16]
+        if last_modified is None:
+            last_modified = time.time()
+        self.last_modified = datetime.fromtimestamp(int(last_modified), tz=timezone.utc)
+
+        self._positions = {}
+        by_zone = {}
+        for position, mark in enumerate(self.marks):
+            name = mark['name']
+            # First occurrence wins, as with the old linear scans
+            self._positions.setdefault(name, position)
+            if name:
+                by_zone.setdefault(name[0], []).append(position)
+
+        self._zone_positions = {zone: tuple(positions) for zone, positions in by_zone.items()}
+        self.zones = sorted(self._zone_positions)
+
+        # Per-mark trig terms for batch calculations over the dataset
+        self.engine = GeodesyEngine.from_marks(self.marks)
+
+        self.spatial_index = SpatialIndex(self.engine.lats, self.engine.lons)
+
+        if len(self.marks) <= pair_matrix_max_marks:
+            self.pair_matrix = PairMatrix(self.marks, self.engine, geodesy_mode)
+        else:
+            self.pair_matrix = None
+
+    @classmethod
+    def from_gpx(cls, path=GPX_FILE, **kwargs):
+        """Build a registry from a GPX file"""
+        kwargs.setdefault('last_modified', os.path.getmtime(path))
+        return cls(iter_gpx_marks(path), **kwargs)
+
+    def __len__(self):
+        return len(self.marks)
+
+    def __iter__(self):
+        return iter(self.marks)
+
+    def __contains__(self, name):
+        return self.position(name) is not None
+
+    def get(self, name):
+        """Return the mark called ``name``, or None"""
+        position = self.position(name)
+        return self.marks[position] if position is not None else None
+
+    def position(self, name):
+        """Return the dataset position of the mark called ``name``, or None
+
+        Names come straight from request JSON, so one that isn't a string
+        (a list or object) is simply not found.
+        """
+        if not isinstance(name, str):
+            return None
+        return self._positions.get(name)
+
+    def marks_in_zones(self, zones):
+        """Marks whose zone is in ``zones``, in GPX file order"""
+        buckets = [self._zone_positions[zone] for zone in set(zones) if zone in self._zone_positions]
+        if not buckets:
+            return []
+        if len(buckets) == 1:
+            positions = buckets[0]
+        else:
+            positions = heapq.merge(*buckets)
+        return [self.marks[position] for position in positions]
+
+    def marks_in_bbox(self, south, west, north, east, zones=None):
+        """Marks inside a bounding box, optionally only from ``zones``, in GPX file order
+
+        A box with ``west`` greater than ``east`` crosses the antimeridian.
+        """
+        marks = [self.marks[index] for index in self.spatial_index.within(south, west, north, east)]
+        if zones is not None:
+            zones = set(zones)
+            marks = [mark for mark in marks if mark['name'] and mark['name'][0] in zones]
+        return marks
+
+    def measure(self, from_name, to_name, mode=None):
+        """Return (bearing, distance) from one named mark to another
+
+        Both marks must exist; raises KeyError otherwise. ``mode`` defaults
+        to the registry's geodesy mode.
+        """
+        mode = mode or self.geodesy_mode
+        i = self._positions[from_name]
+        j = self._positions[to_name]
+        if self.pair_matrix is not None and mode == self.pair_matrix.mode:
+            return self.pair_matrix.bearing(i, j), self.pair_matrix.distance(i, j)
+        if mode == 'spherical':
+            return (calculate_bearing(self.marks[i], self.marks[j]),
+                    calculate_distance(self.marks[i], self.marks[j]))
+        bearings, distances = self.engine.pairs([i], [j], mode)
+        return int(bearings[0]), float(distances[0])
+
+    def measure_many(self, pairs, mode=None):
+        """Return (bearing, distance) for each (from_name, to_name) pair
+
+        Pairs naming an unknown mark, or a name that isn't a string, give
+        None. Without a pair matrix for ``mode`` the known pairs are
+        evaluated in one vectorised engine call.
+        """
+        mode = mode or self.geodesy_mode
+        matrix = self.pair_matrix if self.pair_matrix is not None and self.pair_matrix.mode == mode else None
+        results = [None] * len(pairs)
+        found, rows, cols = [], [], []
+        for k, (from_name, to_name) in enumerate(pairs):
+            i = self.position(from_name)
+            j = self.position(to_name)
+            if i is None or j is None:
+                continue
+            if matrix is not None:
+                results[k] = (matrix.bearing(i, j), matrix.distance(i, j))
+            else:
+                found.append(k)
+                rows.append(i)
+                cols.append(j)
+
+        if found:
+            bearings, distances = self.engine.pairs(rows, cols, mode)
+            for k, bearing, distance in zip(found, bearings.tolist(), distances.tolist()):
+                results[k] = (bearing, distance)
+        return results
+
+    def distance_hundredths(self, positions, mode=None):
+        """Distances between the marks at ``positions``, as an integer matrix of hundredths of a nm
+
+        Row i, column j is the distance from mark ``positions[i]`` to mark
+        ``positions[j]``, exactly as measure() rounds it.
+        """
+        mode = mode or self.geodesy_mode
+        positions = np.asarray(positions, dtype=np.intp)
+        if self.pair_matrix is not None and mode == self.pair_matrix.mode:
+            matrix = np.frombuffer(self.pair_matrix.distances, dtype=np.uint32).reshape(len(self), len(self))
+            return matrix[np.ix_(positions, positions)].astype(np.int64)
+        return self.engine.distance_hundredths(positions[:, None], positions[None, :], mode)
+
+    def nearest(self, lat, lon, k, mode=None):
+        """The ``k`` marks nearest to a position, nearest first
+
+        Returns (mark, bearing, distance) tuples, with the bearing and
+        distance from the position to the mark as calculate_bearing() and
+        calculate_distance() give them (or their WGS-84 equivalents).
+        Marks are ranked by spherical distance in either mode.
+        """
+        mode = mode or self.geodesy_mode
+        indexes = self.spatial_index.nearest(lat, lon, k)
+        marks = [self.marks[index] for index in indexes]
+        if mode == 'wgs84' and marks:
+            bearings, distances = vincenty_inverse(
+                np.radians(np.full(len(indexes), lat)), np.radians(np.full(len(indexes), lon)),
+                self.engine.lat_rad[indexes], self.engine.lon_rad[indexes])
+            return [(mark, int(bearing), distance / 100) for mark, bearing, distance in zip(
+                marks, np.rint(bearings).tolist(), np.rint(distances * 100).tolist())]
+
+        position = {'lat': lat, 'lon': lon}
+        return [(mark, calculate_bearing(position, mark), calculate_distance(position, mark))
+                for mark in marks]
@@ -0,0 +1,177 @@
+"""In-process metrics shared by all Gunicorn workers, in Prometheus text format
+
+Counters and histograms live in one shared-memory array of doubles that is
+allocated when the app is imported. With preload_app = True that happens in
+the Gunicorn master, so every forked worker (including ones restarted after
+max_requests) updates the same array and /metrics reports totals for the
+whole server, whichever worker answers. Without preloading each process
+would only see its own requests.
+
+The layout is fixed when the registry is built: one block per route (status
+class counters, then latency and response-size histograms), one block per
+template (render-time histogram), hit/miss/eviction counters per named
+cache, then the gauges.
+"""
+import bisect
+import multiprocessing
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+CACHE_EVENTS = ('hit', 'miss', 'eviction')
+
+# Label for requests that matched no route (404s, bad methods)
+UNMATCHED_ROUTE = '<unmatched>'
+
+PREFIX = 'solent'
+
+GAUGES = {
+    'dataset_load_seconds': 'Time taken to load and index the mark dataset',
+    'dataset_marks': 'Marks in the loaded dataset',
+    'pair_matrix_build_seconds': 'Time taken to build the all-pairs bearing/distance matrix',
+}
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class _Histogram:
+    """Offsets of one histogram (per-bucket counts, +Inf, sum) in the shared array"""
+
+    def __init__(self, start, buckets):
+        self.start = start
+        self.buckets = buckets
+        # Bucket counts (len(buckets) + 1 for +Inf), then the sum
+        self.size = len(buckets) + 2
+
+    def observe(self, values, value):
+        values[self.start + bisect.bisect_left(self.buckets, value)] += 1
+        values[self.start + len(self.buckets) + 1] += value
+
+    def render(self, values, name, labels):
+        lines = []
+        cumulative = 0
+        for i, bound in enumerate(self.buckets + (float('inf'),)):
+            cumulative += values[self.start + i]
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative:g}')
+        lines.append(f'{name}_sum{{{labels}}} {values[self.start + len(self.buckets) + 1]!r}')
+        lines.append(f'{name}_count{{{labels}}} {cumulative:g}')
+        return lines
+
+class MetricsRegistry:
+    """Fixed set of request, template and dataset metrics in shared memory"""
+
+    def __init__(self, routes, templates, caches=()):
+        offset = 0
+        self._routes = {}
+        for endpoint, rule in list(routes) + [(None, UNMATCHED_ROUTE)]:
+            statuses = offset
+            offset += len(STATUS_CLASSES)
+            latency = _Histogram(offset, LATENCY_BUCKETS)
+            offset += latency.size
+            size = _Histogram(offset, SIZE_BUCKETS)
+            offset += size.size
+            self._routes[endpoint] = (rule, statuses, latency, size)
+
+        self._templates = {}
+        for template in templates:
+            histogram = _Histogram(offset, LATENCY_BUCKETS)
+            offset += histogram.size
+            self._templates[template] = histogram
+
+        self._caches = {}
+        for cache in caches:
+            self._caches[cache] = offset
+            offset += len(CACHE_EVENTS)
+
+        self._gauges = {}
+        for name in GAUGES:
+            self._gauges[name] = offset
+            offset += 1
+
+        self._lock = multiprocessing.Lock()
+        self._values = multiprocessing.RawArray('d', offset)
+
+    @classmethod
+    def for_app(cls, app, caches=()):
+        """Registry with a block for every route and template of a Flask app"""
+        routes = sorted({(rule.endpoint, rule.rule) for rule in app.url_map.iter_rules()})
+        return cls(routes, sorted(app.jinja_env.list_templates()), caches)
+
+    def observe_request(self, endpoint, status, seconds, size):
+        """Record one finished request; ``size`` may be None if unknown"""
+        rule, statuses, latency, size_histogram = self._routes.get(endpoint, self._routes[None])
+        status_class = min(max(status // 100, 1), 5) - 1
+        with self._lock:
+            self._values[statuses + status_class] += 1
+            latency.observe(self._values, seconds)
+            if size is not None:
+                size_histogram.observe(self._values, size)
+
+    def observe_render(self, template, seconds):
+        histogram = self._templates.get(template)
+        if histogram is not None:
+            with self._lock:
+                histogram.observe(self._values, seconds)
+
+    def cache_event_counter(self, cache):
+        """Callback counting a named cache's 'hit'/'miss'/'eviction' events"""
+        start = self._caches[cache]
+
+        def count(event):
+            with self._lock:
+                self._values[start + CACHE_EVENTS.index(event)] += 1
+        return count
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._values[self._gauges[name]] = value
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            values = self._values[:]
+
+        requests = f'{PREFIX}_http_requests_total'
+        duration = f'{PREFIX}_http_request_duration_seconds'
+        size = f'{PREFIX}_http_response_size_bytes'
+        render = f'{PREFIX}_template_render_seconds'
+
+        lines = [f'# HELP {requests} Requests handled, by route and status class',
+                 f'# TYPE {requests} counter']
+        for endpoint, (rule, statuses, _, _) in self._routes.items():
+            labels = self._route_labels(endpoint, rule)
+            for i, status_class in enumerate(STATUS_CLASSES):
+                lines.append(f'{requests}{{{labels},status="{status_class}"}} {values[statuses + i]:g}')
+
+        lines += [f'# HELP {duration} Request handling time, by route',
+                  f'# TYPE {duration} histogram']
+        for endpoint, (rule, _, latency, _) in self._routes.items():
+            lines += latency.render(values, duration, self._route_labels(endpoint, rule))
+
+        lines += [f'# HELP {size} Response body size, by route',
+                  f'# TYPE {size} histogram']
+        for endpoint, (rule, _, _, size_histogram) in self._routes.items():
+            lines += size_histogram.render(values, size, self._route_labels(endpoint, rule))
+
+        lines += [f'# HELP {render} Jinja template render time, by template',
+                  f'# TYPE {render} histogram']
+        for template, histogram in self._templates.items():
+            lines += histogram.render(values, render, f'template="{_escape(template)}"')
+
+        cache_events = f'{PREFIX}_cache_events_total'
+        lines += [f'# HELP {cache_events} In-process cache lookups and evictions, by cache and event',
+                  f'# TYPE {cache_events} counter']
+        for cache, start in self._caches.items():
+            for i, event in enumerate(CACHE_EVENTS):
+                lines.append(f'{cache_events}{{cache="{_escape(cache)}",event="{event}"}} {values[start + i]:g}')
+
+        for name, help_text in GAUGES.items():
+            lines += [f'# HELP {PREFIX}_{name} {help_text}',
+                      f'# TYPE {PREFIX}_{name} gauge',
+                      f'{PREFIX}_{name} {values[self._gauges[name]]!r}']
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _route_labels(endpoint, rule):
+        return f'route="{_escape(rule)}",endpoint="{_escape(endpoint or "")}"'
@@ -0,0 +1,178 @@
+"""Opt-in per-request profiling, written to a spool directory
+
+Off unless PROFILE_SAMPLE_RATE is above zero or PROFILE_SECRET is set; when
+off, install() registers nothing and profile_block() is a null context, so
+requests pay nothing. When on, a request is profiled if it wins the sampling
+draw or sends ``X-Profile: <PROFILE_SECRET>``. Each profile is written as
+
+    <id>.pstats     cProfile statistics (``python -m pstats``, snakeviz, ...)
+    <id>.collapsed  sampled stacks, one ``frame;frame;... count`` line per
+                    distinct stack, ready for flamegraph.pl or speedscope
+
+and the response carries the id in an ``X-Profile-Id`` header. Loading the
+mark dataset at startup is profiled the same way (id ``...-dataset-load``),
+which covers GPX/snapshot parsing and the pair matrix build; geodesy and
+Jinja rendering show up in the profiles of the requests that run them.
+"""
+import contextlib
+import cProfile
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+PROFILE_HEADER = 'X-Profile'
+
+# Seconds between stack samples of a profiled request
+SAMPLE_INTERVAL = 0.001
+
+def _frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+class StackSampler:
+    """Collapsed-stack sampler for one thread, run from a background thread"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            # A sample taken while stop() was joining would show the profiler itself
+            if labels and not self._stop.is_set():
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.stacks.items()))
+
+class Profile:
+    """cProfile plus a stack sampler over the calling thread"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), interval)
+
+    def start(self):
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.sampler.stop()
+
+    def write(self, directory, profile_id):
+        """Write ``<profile_id>.pstats`` and ``<profile_id>.collapsed`` into ``directory``"""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, profile_id)
+        self.profiler.dump_stats(base + '.pstats')
+        with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+            f.write(self.sampler.collapsed())
+        return base
+
+class RequestProfiler:
+    """Decides which requests to profile and spools their profiles
+
+    ``sample_rate`` is the fraction of requests profiled at random and
+    ``secret`` the value of the X-Profile header that forces a profile.
+    Once ``max_profiles`` profiles are in the spool no more are written.
+    """
+
+    def __init__(self, directory, sample_rate=0.0, secret=None, max_profiles=200,
+                 interval=SAMPLE_INTERVAL):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.secret = secret or None
+        self.max_profiles = max_profiles
+        self.interval = interval
+        self._count = 0
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """Profiler configured from PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_SECRET and PROFILE_MAX"""
+        return cls(environ.get('PROFILE_DIR', '/tmp/solent-profiles'),
+                   sample_rate=float(environ.get('PROFILE_SAMPLE_RATE', '0')),
+                   secret=environ.get('PROFILE_SECRET'),
+                   max_profiles=int(environ.get('PROFILE_MAX', '200')))
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or self.secret is not None
+
+    def wants(self, headers):
+        """Whether a request with these headers should be profiled"""
+        if self.secret is not None:
+            supplied = headers.get(PROFILE_HEADER)
+            if supplied is not None and hmac.compare_digest(supplied.encode('utf-8'),
+                                                           self.secret.encode('utf-8')):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _spool_full(self):
+        try:
+            spooled = sum(name.endswith('.pstats') for name in os.listdir(self.directory))
+        except FileNotFoundError:
+            return False
+        return spooled >= self.max_profiles
+
+    def _profile_id(self, label):
+        self._count += 1
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime())
+        return f'{stamp}-{os.getpid()}-{self._count}-{label}'
+
+    def profile_block(self, label):
+        """Context manager profiling the enclosed code, or a no-op when disabled"""
+        if not self.enabled or self._spool_full():
+            return contextlib.nullcontext()
+        return self._profiled(label)
+
+    @contextlib.contextmanager
+    def _profiled(self, label):
+        profile = Profile(self.interval)
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            profile.write(self.directory, self._profile_id(label))
+
+    def install(self, app):
+        """Register request hooks on a Flask app, only if profiling is enabled"""
+        if not self.enabled:
+            return
+
+        @app.before_request
+        def start_request_profile():
+            if self.wants(request.headers) and not self._spool_full():
+                g.request_profile = Profile(self.interval)
+                g.request_profile.start()
+
+        @app.after_request
+        def finish_request_profile(response):
+            profile = g.pop('request_profile', None)
+            if profile is not None:
+                profile.stop()
+                endpoint = request.endpoint or 'unmatched'
+                profile_id = self._profile_id(endpoint)
+                profile.write(self.directory, profile_id)
+                response.headers['X-Profile-Id'] = profile_id
+            return response
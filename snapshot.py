@@ -0,0 +1,199 @@
+"""Compiled binary snapshots of the mark dataset
+
+Parsing XML is the slowest part of a worker's cold start. A snapshot holds
+the same marks in a form that can be memory-mapped and read without parsing:
+
+    header   magic, format version, mark count, string table size,
+             source GPX size, mtime and SHA-256, payload SHA-256
+    payload  latitudes   float64[count]
+             longitudes  float64[count]
+             offsets     uint32[3 * count + 1]  name/description/symbol
+                                                 spans in the string table
+             strings     UTF-8 string table
+
+All values are little-endian. Build one ahead of time with
+``python snapshot.py [GPX_FILE]``; load_marks() rebuilds it automatically
+when the GPX file has changed.
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from marks import GPX_FILE, iter_gpx_marks
+
+MAGIC = b'SMKSNAP\0'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<8sIIQQq32s32s')
+
+_STRING_FIELDS = ('name', 'description', 'symbol')
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, corrupt or from another format version"""
+
+def snapshot_path_for(gpx_path):
+    """Default snapshot location next to a GPX file"""
+    return os.path.splitext(gpx_path)[0] + '.marks.bin'
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+def compile_snapshot(gpx_path=GPX_FILE, snapshot_path=None):
+    """Compile a GPX file into a snapshot, returning the snapshot path
+
+    The file is written to a temporary name and renamed into place, so
+    readers never see a partial snapshot.
+    """
+    if snapshot_path is None:
+        snapshot_path = snapshot_path_for(gpx_path)
+
+    # Record the source before parsing so a GPX edited mid-compile looks stale
+    source_stat = os.stat(gpx_path)
+    source_hash = _file_sha256(gpx_path)
+
+    lats, lons, offsets = [], [], [0]
+    strings = bytearray()
+    for mark in iter_gpx_marks(gpx_path):
+        lats.append(mark['lat'])
+        lons.append(mark['lon'])
+        for field in _STRING_FIELDS:
+            strings += mark[field].encode('utf-8')
+            offsets.append(len(strings))
+
+    payload = b''.join([
+        np.asarray(lats, dtype='<f8').tobytes(),
+        np.asarray(lons, dtype='<f8').tobytes(),
+        np.asarray(offsets, dtype='<u4').tobytes(),
+        bytes(strings),
+    ])
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(lats), len(strings),
+                          source_stat.st_size, source_stat.st_mtime_ns,
+                          source_hash, hashlib.sha256(payload).digest())
+
+    directory = os.path.dirname(os.path.abspath(snapshot_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.marks-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(payload)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, snapshot_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return snapshot_path
+
+class MarkSnapshot:
+    """A memory-mapped, checksum-verified snapshot file
+
+    ``lats`` and ``lons`` are read-only numpy views straight onto the mapped
+    file; strings are decoded from the string table as marks are read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError(f'{path}: empty snapshot file')
+
+        if len(self._map) < _HEADER.size:
+            raise SnapshotError(f'{path}: truncated header')
+        (magic, version, count, strings_size, self.source_size, self.source_mtime_ns,
+         self.source_sha256, payload_sha256) = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise SnapshotError(f'{path}: not a mark snapshot')
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f'{path}: format version {version}, expected {FORMAT_VERSION}')
+
+        payload = memoryview(self._map)[_HEADER.size:]
+        expected_size = 16 * count + 4 * (3 * count + 1) + strings_size
+        if len(payload) != expected_size:
+            raise SnapshotError(f'{path}: payload is {len(payload)} bytes, expected {expected_size}')
+        if hashlib.sha256(payload).digest() != payload_sha256:
+            raise SnapshotError(f'{path}: checksum mismatch')
+
+        self.count = count
+        self.lats = np.frombuffer(self._map, dtype='<f8', count=count, offset=_HEADER.size)
+        self.lons = np.frombuffer(self._map, dtype='<f8', count=count,
+                                  offset=_HEADER.size + 8 * count)
+        self._offsets = np.frombuffer(self._map, dtype='<u4', count=3 * count + 1,
+                                      offset=_HEADER.size + 16 * count)
+        self._strings_start = _HEADER.size + 16 * count + 4 * (3 * count + 1)
+
+    def __len__(self):
+        return self.count
+
+    def is_current_for(self, gpx_path):
+        """Whether this snapshot was compiled from the current contents of ``gpx_path``"""
+        stat = os.stat(gpx_path)
+        if stat.st_size != self.source_size:
+            return False
+        if stat.st_mtime_ns == self.source_mtime_ns:
+            return True
+        # Touched, copied or replaced since compiling: only stale if the
+        # content actually changed
+        return _file_sha256(gpx_path) == self.source_sha256
+
+    def iter_marks(self):
+        """Yield the snapshot's marks as dicts, in GPX file order"""
+        offsets = self._offsets.tolist()
+        start = self._strings_start
+        data = self._map
+        for i, (lat, lon) in enumerate(zip(self.lats.tolist(), self.lons.tolist())):
+            spans = offsets[3 * i:3 * i + 4]
+            name, description, symbol = (
+                data[start + spans[k]:start + spans[k + 1]].decode('utf-8') for k in range(3))
+            yield {
+                'name': name,
+                'description': description,
+                'symbol': symbol,
+                'lat': lat,
+                'lon': lon
+            }
+
+def load_marks(gpx_path=GPX_FILE, snapshot_path=None):
+    """Return the marks of a GPX file, via its snapshot when that is current
+
+    A missing, corrupt or stale snapshot is recompiled from the GPX file.
+    If the snapshot can't be written (e.g. a read-only directory) the marks
+    are streamed straight from the GPX file instead.
+    """
+    if snapshot_path is None:
+        snapshot_path = snapshot_path_for(gpx_path)
+
+    try:
+        snapshot = MarkSnapshot(snapshot_path)
+        if snapshot.is_current_for(gpx_path):
+            return snapshot.iter_marks()
+    except (OSError, SnapshotError):
+        pass
+
+    try:
+        compile_snapshot(gpx_path, snapshot_path)
+        return MarkSnapshot(snapshot_path).iter_marks()
+    except (OSError, SnapshotError):
+        return iter_gpx_marks(gpx_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile a GPX file into a binary mark snapshot')
+    parser.add_argument('gpx', nargs='?', default=GPX_FILE, help='source GPX file')
+    parser.add_argument('-o', '--output', help='snapshot path (default: next to the GPX file)')
+    args = parser.parse_args()
+
+    path = compile_snapshot(args.gpx, args.output)
+    snapshot = MarkSnapshot(path)
+    print(f'{path}: {len(snapshot)} marks, {os.path.getsize(path)} bytes')
+
+if __name__ == '__main__':
+    main()
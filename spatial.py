@@ -0,0 +1,171 @@
+"""Spatial index for nearest-mark queries"""
+import heapq
+import math
+
+import numpy as np
+
+class SpatialIndex:
+    """k-d tree over points on the unit sphere
+
+    Each point is stored as a 3D unit vector. The straight-line (chord)
+    distance between two unit vectors, 2 sin(c/2), grows with the central
+    angle c, so the nearest points by chord are exactly the nearest points by
+    haversine distance, and the tree never has to deal with the antimeridian
+    or the poles. The tree splits on the widest axis at the median until
+    leaves hold at most ``leaf_size`` points. Leaf points are stored
+    contiguously so a leaf is scanned with one vectorised operation.
+
+    Nodes also record the latitude/longitude range of their points, which
+    lets within() answer map-viewport (bounding box) queries from the same
+    tree.
+    """
+
+    def __init__(self, lats, lons, leaf_size=32):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        points = unit_vectors(np.radians(lats), np.radians(lons))
+        self.size = len(points)
+        self.leaf_size = leaf_size
+
+        order = np.arange(self.size)
+        # Per node: point range, child ids (-1 for leaves) and bounding box
+        self._start, self._end, self._left, self._right = [], [], [], []
+        self._lower, self._upper = [], []
+        self._lat_range, self._lon_range = [], []
+        if self.size:
+            stack = [(self._add_node(points, lats, lons, order, 0, self.size), 0, self.size)]
+            while stack:
+                node, start, end = stack.pop()
+                if end - start <= leaf_size:
+                    continue
+                block = points[order[start:end]]
+                axis = int(np.argmax(block.max(axis=0) - block.min(axis=0)))
+                middle = (end - start) // 2
+                partition = np.argpartition(block[:, axis], middle)
+                order[start:end] = order[start:end][partition]
+                left = self._add_node(points, lats, lons, order, start, start + middle)
+                right = self._add_node(points, lats, lons, order, start + middle, end)
+                self._left[node], self._right[node] = left, right
+                stack.append((left, start, start + middle))
+                stack.append((right, start + middle, end))
+
+        self.order = order
+        self.points = np.ascontiguousarray(points[order])
+        self.lats = lats[order]
+        self.lons = lons[order]
+        # Plain tuples: cheaper than numpy for three-element arithmetic
+        self._lower = [tuple(bound.tolist()) for bound in self._lower]
+        self._upper = [tuple(bound.tolist()) for bound in self._upper]
+
+    def _add_node(self, points, lats, lons, order, start, end):
+        members = order[start:end]
+        block = points[members]
+        self._start.append(start)
+        self._end.append(end)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._lower.append(block.min(axis=0))
+        self._upper.append(block.max(axis=0))
+        self._lat_range.append((float(lats[members].min()), float(lats[members].max())))
+        self._lon_range.append((float(lons[members].min()), float(lons[members].max())))
+        return len(self._start) - 1
+
+    def __len__(self):
+        return self.size
+
+    def _box_distance_sq(self, node, query):
+        total = 0.0
+        for q, low, high in zip(query, self._lower[node], self._upper[node]):
+            if q < low:
+                total += (low - q) ** 2
+            elif q > high:
+                total += (q - high) ** 2
+        return total
+
+    def nearest(self, lat, lon, k):
+        """Positions of the ``k`` points nearest to (lat, lon), nearest first
+
+        Points at exactly the same distance come in position order.
+        """
+        k = min(k, self.size)
+        if k <= 0:
+            return []
+        query = unit_vectors(math.radians(lat), math.radians(lon))
+        query_tuple = tuple(query.tolist())
+
+        # Max-heap (negated) of the best (distance, position) found so far
+        best = []
+        frontier = [(0.0, 0)]
+        while frontier:
+            bound, node = heapq.heappop(frontier)
+            if len(best) == k and bound > -best[0][0]:
+                break
+            left = self._left[node]
+            if left < 0:
+                start, end = self._start[node], self._end[node]
+                offsets = self.points[start:end] - query
+                distances = np.einsum('ij,ij->i', offsets, offsets)
+                candidates = np.arange(start, end)
+                if len(best) == k:
+                    # Only points that could displace the current worst
+                    keep = distances <= -best[0][0]
+                    distances, candidates = distances[keep], candidates[keep]
+                for distance, position in zip(distances.tolist(), self.order[candidates].tolist()):
+                    entry = (-distance, -position)
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+            else:
+                for child in (left, self._right[node]):
+                    heapq.heappush(frontier, (self._box_distance_sq(child, query_tuple), child))
+
+        return [-position for _, position in sorted(best, reverse=True)]
+
+    def within(self, south, west, north, east):
+        """Positions of the points inside a bounding box, in position order
+
+        Bounds are inclusive degrees. A box with ``west`` greater than
+        ``east`` crosses the antimeridian.
+        """
+        if not self.size or south > north:
+            return []
+        if west <= east:
+            lon_spans = [(west, east)]
+        else:
+            lon_spans = [(west, 180.0), (-180.0, east)]
+
+        found = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            lat_low, lat_high = self._lat_range[node]
+            if lat_high < south or lat_low > north:
+                continue
+            lon_low, lon_high = self._lon_range[node]
+            if not any(lon_high >= low and lon_low <= high for low, high in lon_spans):
+                continue
+            start, end = self._start[node], self._end[node]
+            contained = (south <= lat_low and lat_high <= north
+                         and any(low <= lon_low and lon_high <= high for low, high in lon_spans))
+            if contained:
+                found.append(self.order[start:end])
+            elif self._left[node] < 0:
+                lats, lons = self.lats[start:end], self.lons[start:end]
+                inside = (lats >= south) & (lats <= north)
+                lon_inside = np.zeros(end - start, dtype=bool)
+                for low, high in lon_spans:
+                    lon_inside |= (lons >= low) & (lons <= high)
+                found.append(self.order[start:end][inside & lon_inside])
+            else:
+                stack.append(self._left[node])
+                stack.append(self._right[node])
+
+        if not found:
+            return []
+        return np.sort(np.concatenate(found)).tolist()
+
+def unit_vectors(lat, lon):
+    """Unit vectors (x, y, z) for latitudes and longitudes in radians"""
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
@@ -0,0 +1,201 @@
+"""Tidal streams from tidal diamonds, and tide-adjusted leg times
+
+Diamonds are read from a CSV file of one row per diamond per hour relative
+to HW Portsmouth: ``diamond,lat,lon,hour,set,spring_rate,neap_rate``, with
+the set (degrees true the stream flows towards) and spring and neap rates
+in knots. Lines starting with ``#`` are ignored. Every diamond must give
+the same evenly spaced hours. A file with a comment line starting
+``# SYNTHETIC`` is made-up data, and its model is flagged ``synthetic``.
+
+A course is planned once (TideModel.plan()): each leg is split into
+segments, and the stream at each segment's midpoint is interpolated
+spatially from the nearest diamonds (inverse distance weighting) for every
+tabulated hour. Timing a course then only interpolates those per-segment
+tables in time, over arrays of start times at once.
+"""
+import csv
+import math
+import os
+
+import numpy as np
+
+# Tidal stream data is opt-in: there is none unless TIDE_FILE names a file
+TIDE_FILE = os.environ.get('TIDE_FILE') or None
+
+# Synthetic diamonds for tests and demonstrations; not for navigation
+EXAMPLE_TIDE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tidal-diamonds.example.csv')
+
+# Mean period of the semi-diurnal tide; times further than half of it from
+# high water are taken relative to the neighbouring high water
+TIDAL_PERIOD_HOURS = 12.42
+
+# Diamonds blended at each point, and segments each leg is split into
+IDW_NEIGHBOURS = 3
+SEGMENTS_PER_LEG = 4
+
+class TideModel:
+    """Stream vectors at a set of tidal diamonds, by hour relative to HW Portsmouth
+
+    ``springs`` and ``neaps`` are arrays of shape (diamonds, hours, 2) of
+    east and north stream components in knots.
+    """
+
+    def __init__(self, names, lats, lons, hours, springs, neaps, synthetic=False):
+        self.names = list(names)
+        self.synthetic = synthetic
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.hours = np.asarray(hours, dtype=np.float64)
+        self.springs = np.asarray(springs, dtype=np.float64)
+        self.neaps = np.asarray(neaps, dtype=np.float64)
+        steps = np.diff(self.hours)
+        if len(self.hours) < 2 or not np.allclose(steps, steps[0]) or steps[0] <= 0:
+            raise ValueError('Tidal hours must be evenly spaced and increasing')
+        self.hour_step = float(steps[0])
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Load diamonds from a CSV file; raises ValueError if it is malformed"""
+        with open(path, encoding='utf-8', newline='') as f:
+            lines = f.readlines()
+        synthetic = any(line.startswith('# SYNTHETIC') for line in lines)
+        try:
+            rows = list(csv.DictReader(line for line in lines if not line.startswith('#')))
+        except csv.Error as e:
+            raise ValueError(f'Malformed tidal diamonds file {path}: {e}') from None
+
+        diamonds = {}
+        for row in rows:
+            try:
+                name = row['diamond']
+                position = (float(row['lat']), float(row['lon']))
+                hour = float(row['hour'])
+                direction = math.radians(float(row['set']))
+                rates = float(row['spring_rate']), float(row['neap_rate'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f'Malformed tidal diamond row: {row}') from None
+            _, by_hour = diamonds.setdefault(name, (position, {}))
+            by_hour[hour] = [(rate * math.sin(direction), rate * math.cos(direction)) for rate in rates]
+
+        if not diamonds:
+            raise ValueError(f'No tidal diamonds in {path}')
+        hours = sorted(next(iter(diamonds.values()))[1])
+        if any(sorted(by_hour) != hours for _, by_hour in diamonds.values()):
+            raise ValueError('Every tidal diamond must give the same hours')
+
+        names = list(diamonds)
+        vectors = np.array([[diamonds[name][1][hour] for hour in hours] for name in names])
+        return cls(names, [diamonds[name][0][0] for name in names], [diamonds[name][0][1] for name in names],
+                   hours, vectors[:, :, 0], vectors[:, :, 1], synthetic)
+
+    def tables(self, lats, lons, springs=0.5):
+        """Stream vectors at each point for every tabulated hour, shape (points, hours, 2)
+
+        ``springs`` runs from 0 (neaps) to 1 (springs). Each point blends the
+        IDW_NEIGHBOURS nearest diamonds by inverse square distance; a point
+        on a diamond takes its values exactly.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        # Local flat-earth distances are plenty over a few miles
+        scale = np.cos(np.radians(self.lats.mean()))
+        d_lat = lats[:, None] - self.lats[None, :]
+        d_lon = (lons[:, None] - self.lons[None, :]) * scale
+        squared = d_lat ** 2 + d_lon ** 2
+
+        k = min(IDW_NEIGHBOURS, len(self))
+        nearest = np.argpartition(squared, k - 1, axis=1)[:, :k]
+        nearest_squared = np.take_along_axis(squared, nearest, axis=1)
+        with np.errstate(divide='ignore'):
+            weights = 1 / nearest_squared
+        exact = nearest_squared == 0
+        weights = np.where(exact.any(axis=1, keepdims=True), exact.astype(np.float64), weights)
+        weights /= weights.sum(axis=1, keepdims=True)
+
+        vectors = self.neaps + springs * (self.springs - self.neaps)
+        return np.einsum('pk,pkhc->phc', weights, vectors[nearest])
+
+    def tidal_hours(self, hours):
+        """Hours relative to the nearest high water, within the tabulated range"""
+        half = TIDAL_PERIOD_HOURS / 2
+        wrapped = (np.asarray(hours, dtype=np.float64) + half) % TIDAL_PERIOD_HOURS - half
+        return np.clip(wrapped, self.hours[0], self.hours[-1])
+
+    def plan(self, lats, lons, bearings, distances, springs=0.5, segments=SEGMENTS_PER_LEG):
+        """Precompute a course's tidal geometry: see TidalCourse
+
+        ``lats``/``lons`` are the course's marks, and ``bearings`` and
+        ``distances`` (nm) its legs.
+        """
+        return TidalCourse(self, lats, lons, bearings, distances, springs, segments)
+
+class TidalCourse:
+    """A course's legs split into segments, each with its stream table"""
+
+    def __init__(self, model, lats, lons, bearings, distances, springs, segments):
+        self.model = model
+        self.segments = segments
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        fractions = (np.arange(segments) + 0.5) / segments
+        # Segment midpoints, leg by leg; straight lines in lat/lon are close
+        # enough to the great circle over a leg
+        mid_lats = lats[:-1, None] + (lats[1:, None] - lats[:-1, None]) * fractions
+        mid_lons = lons[:-1, None] + (lons[1:, None] - lons[:-1, None]) * fractions
+        self.tables = model.tables(mid_lats.ravel(), mid_lons.ravel(), springs).reshape(
+            len(lats) - 1, segments, len(model.hours), 2)
+
+        radians = np.radians(np.asarray(bearings, dtype=np.float64))
+        self.along = np.stack([np.sin(radians), np.cos(radians)], axis=-1)
+        self.across = np.stack([np.cos(radians), -np.sin(radians)], axis=-1)
+        self.segment_lengths = np.asarray(distances, dtype=np.float64) / segments
+
+    def __len__(self):
+        return len(self.segment_lengths)
+
+    def streams(self, leg, segment, tidal_hours):
+        """Stream vectors over a segment at each tidal hour, shape (times, 2)"""
+        model = self.model
+        position = (tidal_hours - model.hours[0]) / model.hour_step
+        first = np.minimum(position.astype(np.intp), len(model.hours) - 2)
+        fraction = (position - first)[:, None]
+        table = self.tables[leg, segment]
+        return table[first] * (1 - fraction) + table[first + 1] * fraction
+
+    def leg_times(self, speeds, start_hours):
+        """Seconds each leg takes from each start, shape (starts, legs)
+
+        ``speeds`` are boat speeds through the water along each leg (knots),
+        of shape (legs,) or (starts, legs); ``start_hours`` are start times
+        in hours relative to a HW Portsmouth. The boat steers to hold the
+        leg's track across the stream. Legs it can't make good against the
+        stream, and every leg after one, take infinitely long.
+        """
+        start_hours = np.asarray(start_hours, dtype=np.float64)
+        speeds = np.broadcast_to(np.asarray(speeds, dtype=np.float64), start_hours.shape + (len(self),))
+        times = np.zeros(start_hours.shape + (len(self),))
+        clock = np.zeros(start_hours.shape)
+        for leg in range(len(self)):
+            speed_sq = speeds[..., leg] ** 2
+            started = np.isfinite(clock)
+            for segment in range(self.segments):
+                # Each segment starts when the previous one ends
+                elapsed = clock + times[..., leg]
+                hours = self.model.tidal_hours(start_hours + np.where(np.isfinite(elapsed), elapsed, 0.0))
+                stream = self.streams(leg, segment, hours.ravel()).reshape(hours.shape + (2,))
+                along = stream @ self.along[leg]
+                across = stream @ self.across[leg]
+                # Crabbing to cancel the cross-track stream leaves sqrt(V² - c²) along the track
+                through_water = np.sqrt(np.maximum(speed_sq - across ** 2, 0.0))
+                made_good = np.where(through_water > 0, through_water + along, 0.0)
+                with np.errstate(divide='ignore'):
+                    hours_taken = np.where(made_good > 0, self.segment_lengths[leg] / made_good, np.inf)
+                if self.segment_lengths[leg] == 0:
+                    hours_taken = np.zeros_like(hours_taken)
+                times[..., leg] += hours_taken
+            times[..., leg] = np.where(started, times[..., leg], np.inf)
+            clock = clock + times[..., leg]
+        return times * 3600
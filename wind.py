@@ -0,0 +1,43 @@
+"""True wind angles and points of sail for course legs"""
+import numpy as np
+
+# Points of sail, in the order of their codes in wind_sweep() results
+POINTS_OF_SAIL = ('beat', 'reach', 'run')
+BEAT, REACH, RUN = range(len(POINTS_OF_SAIL))
+
+# A leg with a true wind angle up to BEAT_ANGLE can't be laid and is beaten;
+# one from RUN_ANGLE up is a run; anything between is a reach
+BEAT_ANGLE = 45
+RUN_ANGLE = 150
+
+def true_wind_angles(bearings, wind_directions):
+    """True wind angles (0-180 degrees) of each leg bearing for each wind direction
+
+    Wind directions are where the wind blows from, as forecasts give them.
+    Returns an array of shape (len(wind_directions), len(bearings)).
+    """
+    bearings = np.asarray(bearings, dtype=np.float64)
+    wind_directions = np.asarray(wind_directions, dtype=np.float64)
+    return np.abs((bearings[None, :] - wind_directions[:, None] + 180) % 360 - 180)
+
+def points_of_sail(angles, beat_angle=BEAT_ANGLE, run_angle=RUN_ANGLE):
+    """Point of sail code (BEAT, REACH or RUN) for each true wind angle"""
+    return np.where(angles <= beat_angle, BEAT, np.where(angles >= run_angle, RUN, REACH))
+
+def wind_sweep(bearings, distances, wind_directions=None, beat_angle=BEAT_ANGLE, run_angle=RUN_ANGLE):
+    """Sail a course's legs in every wind direction at once
+
+    Returns (angles, codes, totals): the true wind angle and point of sail
+    code of every leg, each of shape (directions, legs), and the distance
+    sailed on each point of sail, of shape (directions, 3) in POINTS_OF_SAIL
+    order and rounded to hundredths like leg distances. Wind directions
+    default to every whole degree 0-359.
+    """
+    if wind_directions is None:
+        wind_directions = np.arange(360)
+    distances = np.asarray(distances, dtype=np.float64)
+    angles = true_wind_angles(bearings, wind_directions)
+    codes = points_of_sail(angles, beat_angle, run_angle)
+    totals = np.stack([np.where(codes == code, distances, 0.0).sum(axis=1)
+                       for code in range(len(POINTS_OF_SAIL))], axis=1)
+    return angles, codes, np.round(totals, 2)